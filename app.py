@@ -25,7 +25,8 @@ from config import Config
 # Assuming these services/utils/database modules exist and are correctly imported
 from services.pdf_service import extract_pdf_text
 from services.ai_service import query_openrouter
-from services.utils import allowed_file, generate_report_id
+from services.job_queue import init_job_workers
+from services.utils import allowed_file, generate_report_id, SpooledRequest
 from services.database import db, migrate_json_to_db # Assuming db and migrate_json_to_db are used elsewhere
 from blueprints.analysis import analysis_bp
 # Import auth blueprint
@@ -56,6 +57,8 @@ def create_app(config_class=Config):
     """Create and configure the Flask application"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # Buffer uploads in memory (spilling to a temp file only when large)
+    app.request_class = SpooledRequest
 
     # Initialize extensions with the app instance *inside* create_app
     # This is generally the recommended pattern in Flask applications
@@ -78,6 +81,12 @@ def create_app(config_class=Config):
 
     app.config['APPLICATION_ROOT'] = effective_app_root # Ensure config reflects effective root
 
+    # Start the background job workers so jobs left queued by a previous
+    # run are picked up. The isolated PDF extraction workers start on the
+    # first upload: they re-import this module, so starting them here
+    # would recurse into their own bootstrap.
+    init_job_workers(app)
+
 
     # Register blueprints with relative paths
     # Flask will prefix these with APPLICATION_ROOT automatically
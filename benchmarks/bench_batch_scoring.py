@@ -0,0 +1,66 @@
+"""
+Batch CV-vs-JD scoring benchmark.
+
+Compares ranking a pool of synthetic CVs against a few job descriptions
+with get_batch_match_scores (one sparse matrix product) against calling
+get_keyword_match_score for every pair.
+
+Usage:
+    python benchmarks/bench_batch_scoring.py [--cvs 500] [--jds 5] [--method bm25]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from services.ai_service import get_batch_match_scores, get_keyword_match_score
+from corpus import WORDS, CV_SECTIONS, JD_SECTIONS
+
+def _paragraph(rng, sentences):
+    return " ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))).capitalize() + "."
+                    for _ in range(sentences))
+
+def build_cv_text(rng):
+    return "\n".join(f"{header}\n{_paragraph(rng, rng.randint(3, 8))}" for header in rng.sample(CV_SECTIONS, 6))
+
+def build_jd_text(rng):
+    return "\n".join(f"{header}\n- {_paragraph(rng, 1)}\n- {_paragraph(rng, 1)}" for header in JD_SECTIONS)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cvs', type=int, default=500)
+    parser.add_argument('--jds', type=int, default=5)
+    parser.add_argument('--method', default='bm25', choices=['bm25', 'tfidf'])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    cvs = [build_cv_text(rng) for _ in range(args.cvs)]
+    jds = [build_jd_text(rng) for _ in range(args.jds)]
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.logger.disabled = True
+    with app.app_context():
+        start = time.perf_counter()
+        scores = get_batch_match_scores(cvs, jds, method=args.method)
+        batch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for jd in jds:
+            for cv in cvs:
+                get_keyword_match_score(cv, jd)
+        pairwise_time = time.perf_counter() - start
+
+    pairs = args.cvs * args.jds
+    print(f"{args.cvs} CVs x {args.jds} JDs ({pairs} pairs), method {args.method}")
+    print(f"batch matrix    {batch_time * 1000:10.1f} ms  {pairs / batch_time:12.0f} pairs/s")
+    print(f"pairwise loop   {pairwise_time * 1000:10.1f} ms  {pairs / pairwise_time:12.0f} pairs/s")
+    print(f"score range     {scores.min():.1f} - {scores.max():.1f}")
+
+if __name__ == '__main__':
+    main()
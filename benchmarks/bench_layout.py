@@ -0,0 +1,104 @@
+"""
+Benchmark the single-pass layout extractor against the original one.
+
+Compares, on a generated multi-page CV:
+  * legacy:  span-by-span `text +=` concatenation, then extract_cv_sections
+             regex scan over the flat text (with a fresh DocumentProfile
+             each repeat)
+  * layout:  extract_pdf_layout (list builder + font metadata in one pass),
+             then extract_cv_sections_from_layout
+
+Usage:
+    python benchmarks/bench_layout.py [pages] [repeats]
+"""
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+from flask import Flask
+from services.pdf_service import (extract_cv_sections, extract_pdf_layout,
+                                  extract_cv_sections_from_layout, DocumentProfile)
+
+SECTIONS = [
+    ("PROFESSIONAL SUMMARY", "Backend engineer with ten years of experience building APIs."),
+    ("WORK EXPERIENCE", "Senior Developer, Acme Corp - led migration of services to Kubernetes."),
+    ("EDUCATION", "MSc Computer Science, University of Somewhere."),
+    ("SKILLS", "Python, Flask, SQL, Docker, Kubernetes, AWS, Terraform."),
+    ("PROJECTS", "Open source contributor to several data tooling projects."),
+    ("CERTIFICATIONS", "AWS Certified Solutions Architect."),
+    ("LANGUAGES", "English, French."),
+]
+
+def build_cv(pages):
+    """Generate a CV with bold, larger section headers on every page"""
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        y = 60
+        for header, body in SECTIONS:
+            page.insert_text((60, y), header, fontsize=13, fontname="hebo")
+            y += 18
+            for _ in range(4):
+                page.insert_text((60, y), body, fontsize=10, fontname="helv")
+                y += 13
+            y += 8
+    return doc.tobytes()
+
+def legacy_extract(data):
+    """The original preserve_layout implementation, kept for comparison"""
+    doc = fitz.open(stream=data, filetype="pdf")
+    text = ""
+    for page_num in range(len(doc)):
+        page = doc.load_page(page_num)
+        page_text = page.get_text("dict")
+        for block in page_text.get("blocks", []):
+            if "lines" in block:
+                for line in block["lines"]:
+                    if "spans" in line:
+                        for span in line["spans"]:
+                            text += span.get("text", "") + " "
+                    text += "\n"
+            text += "\n"
+    doc.close()
+    # A fresh profile per call, so the regex scan is timed rather than the
+    # per-text profile memo
+    return text, extract_cv_sections(DocumentProfile(text))
+
+def layout_extract(data):
+    layout = extract_pdf_layout(data, parallel=False)
+    return layout['text'], extract_cv_sections_from_layout(layout)
+
+def timed(func, data, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(data)
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    data = build_cv(pages)
+
+    app = Flask(__name__)
+    app.logger.disabled = True
+    with app.app_context():
+        (legacy_text, legacy_sections), legacy_times = timed(legacy_extract, data, repeats)
+        (layout_text, layout_sections), layout_times = timed(layout_extract, data, repeats)
+
+    assert legacy_text == layout_text, "layout extractor must produce identical text"
+
+    print(f"{pages} pages, {len(layout_text)} chars, {repeats} repeats")
+    for name, times, sections in (("legacy", legacy_times, legacy_sections),
+                                  ("layout", layout_times, layout_sections)):
+        print(f"  {name:7s} median {statistics.median(times) * 1000:8.2f} ms  "
+              f"min {min(times) * 1000:8.2f} ms  sections: {sorted(sections)}")
+    print(f"  speedup {statistics.median(legacy_times) / statistics.median(layout_times):.2f}x")
+
+if __name__ == '__main__':
+    main()
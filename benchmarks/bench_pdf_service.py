@@ -0,0 +1,143 @@
+"""
+Performance suite for services/pdf_service.py.
+
+Runs extract_pdf_text, extract_cv_sections, extract_jd_requirements,
+extract_cv_metrics and detect_document_type over the synthetic corpus in
+benchmarks/corpus.py and reports, per function and document:
+
+  * throughput (calls/s)
+  * p50 / p99 latency (ms)
+  * peak Python heap allocated during one call (tracemalloc; memory held
+    by MuPDF itself is not included)
+
+The text parsers are called with a fresh DocumentProfile each time, so
+the numbers measure parsing rather than the per-text profile cache.
+
+Results are written as JSON so runs can be compared with --compare.
+
+Usage:
+    python benchmarks/bench_pdf_service.py [--repeats N] [--output FILE]
+        [--sandbox] [--compare BASELINE.json] [--threshold 0.1]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from services.pdf_service import (extract_pdf_text, extract_cv_sections, extract_jd_requirements,
+                                  extract_cv_metrics, detect_document_type, DocumentProfile)
+from corpus import generate_corpus
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def measure(func, arg, repeats):
+    """Time repeated calls and measure the peak heap of one extra call"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(samples)
+    return {
+        'calls': repeats,
+        'throughput_per_s': round(repeats / total, 2) if total else None,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'peak_heap_kb': round(peak / 1024, 1),
+    }
+
+def run_suite(repeats, sandbox=False):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['PDF_SANDBOX_ENABLED'] = sandbox
+    app.logger.disabled = True
+
+    results = []
+    with app.app_context():
+        for name, kind, pages, data in generate_corpus():
+            text = extract_pdf_text(data)
+            text_functions = [('extract_cv_metrics', extract_cv_metrics),
+                              ('detect_document_type', detect_document_type)]
+            if kind == 'cv':
+                text_functions.insert(0, ('extract_cv_sections', extract_cv_sections))
+            else:
+                text_functions.insert(0, ('extract_jd_requirements', extract_jd_requirements))
+
+            for func_name, func, arg in ([('extract_pdf_text', extract_pdf_text, data)] +
+                                         [(n, lambda t, f=f: f(DocumentProfile(t)), text)
+                                          for n, f in text_functions]):
+                row = {'function': func_name, 'document': name, 'kind': kind,
+                       'pages': pages, 'bytes': len(data), 'chars': len(text)}
+                row.update(measure(func, arg, repeats))
+                results.append(row)
+                print(f"{func_name:24s} {name:20s} p50 {row['p50_ms']:9.3f} ms  "
+                      f"p99 {row['p99_ms']:9.3f} ms  {row['throughput_per_s']:9.1f}/s  "
+                      f"heap {row['peak_heap_kb']:9.1f} KB")
+    return results
+
+def compare(results, baseline_path, threshold):
+    """Print p50 changes against a previous run; return the number of regressions"""
+    with open(baseline_path) as f:
+        baseline = {(row['function'], row['document']): row for row in json.load(f)['results']}
+    regressions = 0
+    for row in results:
+        old = baseline.get((row['function'], row['document']))
+        if not old or not old['p50_ms']:
+            continue
+        change = (row['p50_ms'] - old['p50_ms']) / old['p50_ms']
+        if change > threshold:
+            regressions += 1
+            print(f"REGRESSION {row['function']} on {row['document']}: "
+                  f"p50 {old['p50_ms']} -> {row['p50_ms']} ms ({change:+.0%})")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', help="JSON results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--sandbox', action='store_true', help="Extract through the isolated worker pool")
+    parser.add_argument('--compare', help="Baseline JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Relative p50 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args.repeats, sandbox=args.sandbox)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pdf_service_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeats': args.repeats,
+            'sandbox': args.sandbox,
+            'results': results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Synthetic CV / job description corpus for the pdf_service benchmarks.
+
+Documents are generated deterministically (fixed seed) with PyMuPDF in a
+range of sizes and layouts: single- and two-column CVs with many section
+types, and job descriptions with bulleted requirement sections.
+
+Usage:
+    python benchmarks/corpus.py [output_dir]
+"""
+import os
+import sys
+import random
+
+import fitz  # PyMuPDF
+
+PAGE_SIZES = (1, 2, 5, 10, 20, 50)
+
+CV_SECTIONS = [
+    "PROFESSIONAL SUMMARY", "WORK EXPERIENCE", "EDUCATION", "TECHNICAL SKILLS",
+    "PROJECTS", "CERTIFICATIONS", "LANGUAGES", "PUBLICATIONS", "AWARDS",
+    "VOLUNTEER", "INTERESTS", "REFERENCES",
+]
+
+JD_SECTIONS = [
+    "Job Description:", "Responsibilities:", "Requirements:", "Preferred Skills:",
+    "Education:", "Experience:", "We offer:",
+]
+
+WORDS = (
+    "python flask sql docker kubernetes aws terraform data pipeline api design "
+    "led team delivered migration platform reliability latency customers agile "
+    "stakeholders analytics reporting budget mentoring architecture cloud testing "
+    "automation security compliance integration microservices dashboards metrics"
+).split()
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _write_column(page, x, y, width, lines, rng):
+    """Write header/body lines into one column, returning the final y position"""
+    for kind, text in lines:
+        if kind == 'header':
+            y += 6
+            page.insert_text((x, y), text, fontsize=13, fontname="hebo")
+            y += 16
+        else:
+            # Wrap body text roughly to the column width
+            chars = max(20, int(width / 5))
+            for start in range(0, len(text), chars):
+                page.insert_text((x, y), text[start:start + chars], fontsize=9.5, fontname="helv")
+                y += 12
+    return y
+
+def _page_lines(rng, sections, bullets):
+    lines = []
+    for header in sections:
+        lines.append(('header', header))
+        for _ in range(rng.randint(2, 4)):
+            prefix = "- " if bullets else ""
+            lines.append(('body', prefix + _sentence(rng, rng.randint(8, 16))))
+    return lines
+
+def build_cv(pages, two_column=False, seed=0):
+    """Generate a CV of the given page count"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        if page_num == 0:
+            page.insert_text((50, 50), "Curriculum Vitae - Alex Example", fontsize=18, fontname="hebo")
+            page.insert_text((50, 68), "Email: alex@example.com  Phone: 0123 456 789", fontsize=9.5)
+        sections = rng.sample(CV_SECTIONS, 5)
+        if two_column:
+            _write_column(page, 50, 95, 230, _page_lines(rng, sections[:2], False), rng)
+            _write_column(page, 310, 95, 250, _page_lines(rng, sections[2:], False), rng)
+        else:
+            _write_column(page, 50, 95, 500, _page_lines(rng, sections, False), rng)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def build_jd(pages, seed=0):
+    """Generate a job description of the given page count"""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        if page_num == 0:
+            page.insert_text((50, 50), "Senior Backend Engineer - We are looking for", fontsize=16, fontname="hebo")
+        _write_column(page, 50, 80, 500, _page_lines(rng, JD_SECTIONS, True), rng)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def generate_corpus():
+    """
+    Build the full benchmark corpus in memory
+
+    Returns:
+        list: (name, kind, pages, pdf bytes) tuples, kind being 'cv' or 'jd'
+    """
+    corpus = []
+    for pages in PAGE_SIZES:
+        corpus.append((f"cv_{pages}p_single", 'cv', pages, build_cv(pages, two_column=False, seed=pages)))
+        corpus.append((f"cv_{pages}p_two_column", 'cv', pages, build_cv(pages, two_column=True, seed=pages)))
+        corpus.append((f"jd_{pages}p", 'jd', pages, build_jd(pages, seed=pages)))
+    return corpus
+
+def main():
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+    os.makedirs(out_dir, exist_ok=True)
+    for name, _, _, data in generate_corpus():
+        with open(os.path.join(out_dir, f"{name}.pdf"), 'wb') as f:
+            f.write(data)
+    print(f"Wrote corpus to {out_dir}")
+
+if __name__ == '__main__':
+    main()
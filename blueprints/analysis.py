@@ -1,15 +1,82 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session, send_file
-from werkzeug.utils import secure_filename
-import os
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, current_app, session, send_file,
+                   jsonify, Response, stream_with_context)
+from markupsafe import escape
+import json
 from datetime import datetime
-import uuid
-from services.pdf_service import extract_pdf_text
-from services.ai_service import query_openrouter
-from services.utils import allowed_file, generate_report_id
+from services.pdf_service import read_upload
+from services.analysis_pipeline import extract_documents, run_narrative, get_narrative, follow_narrative
+from services.job_queue import enqueue_job, get_job, register_job_handler
+from services.local_scoring import compute_match_scores
+from services.utils import allowed_file, render_narrative
 import io
 
 analysis_bp = Blueprint('analysis', __name__)
 
+# Stages of an analysis job, reported by the job status endpoint
+ANALYSIS_STAGES = ('extract', 'score', 'narrative')
+
+DEGREE_NAMES = {1: 'an associate degree or diploma', 2: "a bachelor's degree", 3: "a master's degree", 4: 'a doctorate'}
+
+def _html_list(items, limit=20):
+    return "<ul>" + "".join(f"<li>{escape(item)}</li>" for item in items[:limit]) + "</ul>"
+
+def _local_sections(scores):
+    """Report sections built from the local match scores, shown before the AI narrative arrives"""
+    stats = scores['stats']
+    keywords = scores['keywords']
+    labels = {'keyword_match': 'keywords', 'skill_match': 'skills',
+              'experience_match': 'experience', 'education_match': 'education'}
+    strongest = max(stats, key=stats.get)
+    weakest = min(stats, key=stats.get)
+    
+    summary = (f"<p>Your resume scores <strong>{scores['score']}%</strong> against this job description. "
+               f"Your strongest area is {labels[strongest]} ({stats[strongest]}%) and the weakest is "
+               f"{labels[weakest]} ({stats[weakest]}%).</p>")
+    
+    keyword_analysis = (f"<p>Your resume matches {len(keywords['matched'])} of {keywords['total']} "
+                        f"keywords from the job requirements ({stats['keyword_match']}%).</p>")
+    if keywords['matched']:
+        keyword_analysis += "<p>Found:</p>" + _html_list(keywords['matched'])
+    if keywords['missing']:
+        keyword_analysis += "<p>Missing:</p>" + _html_list(keywords['missing'])
+    
+    skills_gap = ""
+    if scores['skills']['missing']:
+        skills_gap += "<p>Required skills not found in your resume:</p>" + _html_list(scores['skills']['missing'], 15)
+    else:
+        skills_gap += "<p>No required skills are missing from your resume.</p>"
+    experience = scores['experience']
+    if experience['required_years']:
+        skills_gap += (f"<p>The role asks for {experience['required_years']} years of experience; "
+                       f"your resume shows about {experience['cv_years']}.</p>")
+    education = scores['education']
+    if education['required_level']:
+        skills_gap += f"<p>The role asks for {DEGREE_NAMES[education['required_level']]}"
+        skills_gap += (f"; your resume lists {DEGREE_NAMES[education['cv_level']]}.</p>" if education['cv_level']
+                       else "; no degree was found in your resume.</p>")
+    
+    sections_found = scores['sections_found']
+    ats_compatibility = (f"<p>{len(sections_found)} standard section headings were detected"
+                         + (": " + ", ".join(escape(name.title()) for name in sections_found) if sections_found else "")
+                         + f". Your resume is {scores['metrics']['word_count']} words long.</p>")
+    
+    recommendations = []
+    if keywords['missing']:
+        recommendations.append("Work these missing keywords into your summary, skills or experience: "
+                               + ", ".join(keywords['missing'][:5]) + ".")
+    for name in ('experience', 'education', 'skills'):
+        if name not in sections_found:
+            recommendations.append(f"Add a clearly titled {name.title()} section so ATS software can find it.")
+    
+    return {
+        'summary': summary,
+        'keyword_analysis': keyword_analysis,
+        'skills_gap': skills_gap,
+        'ats_compatibility': ats_compatibility,
+        'recommendations': _html_list(recommendations) if recommendations else '<p>No structural changes needed.</p>',
+        'improved_resume': '<p>See the optimized version of your resume.</p>'
+    }
+
 @analysis_bp.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
@@ -32,59 +99,25 @@ def upload():
             return redirect(request.url)
         
         try:
-            # Save resume file
-            resume_filename = secure_filename(resume_file.filename)
-            resume_path = os.path.join(current_app.config['UPLOAD_FOLDER'], resume_filename)
-            resume_file.save(resume_path)
-            
-            # Save job description file
-            job_filename = secure_filename(job_file.filename)
-            job_path = os.path.join(current_app.config['UPLOAD_FOLDER'], job_filename)
-            job_file.save(job_path)
-            
-            # Extract text from files
-            resume_text = extract_pdf_text(resume_path)
-            job_text = extract_pdf_text(job_path)
-            
-            # Generate a unique report ID
-            report_id = str(uuid.uuid4())
-            
-            # Process with AI service to generate analysis
-            analysis_result = query_openrouter(resume_text, job_text)
+            # Read both uploads from their request buffers; nothing is
+            # written to UPLOAD_FOLDER, so concurrent uploads of files with
+            # the same name cannot collide
+            resume_data = read_upload(resume_file)
+            job_data = read_upload(job_file)
             
-            # Create report object
-            report = {
-                'id': report_id,
-                'date': datetime.now().strftime('%d %b %Y, %H:%M'),
-                'job_title': 'Software Engineer',  # You would extract this from the job description
-                'score': 85,  # This would come from your analysis
-                'company': 'Tech Corp',  # You would extract this from the job description
-                'stats': {
-                    'keyword_match': 80,
-                    'skill_match': 85,
-                    'experience_match': 90,
-                    'education_match': 75
-                },
-                'sections': {
-                    'summary': '<p>Strong match for the position with excellent technical skills.</p>',
-                    'keyword_analysis': '<p>Your resume matches 80% of the required keywords.</p>',
-                    'skills_gap': '<p>Consider adding experience with Kubernetes.</p>',
-                    'ats_compatibility': '<p>Your resume is ATS-friendly.</p>',
-                    'recommendations': '<p>Highlight your cloud experience more prominently.</p>',
-                    'improved_resume': '<p>See the optimized version of your resume.</p>'
-                }
-            }
+            # The pipeline runs on the background job workers; the browser
+            # follows its progress and is sent to the report once it is ready
+            job_id = enqueue_job('analysis', {'lang': session.get('lang', 'en')},
+                                 files={'resume': resume_data, 'job': job_data}, stages=ANALYSIS_STAGES)
+            current_app.logger.info(f"Queued analysis job {job_id}")
+            # The cookie session only remembers the most recent jobs
+            jobs = session.get('jobs', []) + [job_id]
+            session['jobs'] = jobs[-current_app.config.get('SESSION_JOBS_LIMIT', 20):]
             
-            # Store the report in session for retrieval in the report view
-            # In a real application, you'd save this to a database instead
-            current_app.logger.info(f"Storing report {report_id} in session")
-            if 'reports' not in session:
-                session['reports'] = {}
-            session['reports'][report_id] = report
-            session.modified = True
-            
-            # Redirect to the report view
-            return redirect(url_for('analysis.view_report', report_id=report_id))
+            status_url = url_for('analysis.job_status', job_id=job_id)
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'job_id': job_id, 'status_url': status_url}), 202
+            return redirect(url_for('analysis.job_progress', job_id=job_id))
             
         except Exception as e:
             current_app.logger.error(f"Error processing files: {str(e)}")
@@ -96,12 +129,94 @@ def upload():
         'upload_header': 'Upload Documents for Analysis'
     })
 
+def _run_analysis_job(job):
+    """Extract, score and narrate an uploaded resume and job description"""
+    lang = job.payload.get('lang', 'en')
+    
+    # Extract and parse both documents concurrently (repeat documents
+    # come from the extraction cache; parsing stops once the prompt's
+    # character budget is met)
+    job.stage('extract', 'running')
+    documents = extract_documents(job.files['resume'], job.files['job'])
+    for name, label in (('resume', 'resume'), ('job', 'job description')):
+        # pdf_service reports an unreadable PDF as error text, not an exception
+        if documents[name]['text'].startswith("Error extracting text"):
+            job.stage('extract', 'error', document=name)
+            raise ValueError(f"Could not read the {label} PDF")
+    resume_text = documents['resume']['text']
+    job_text = documents['job']['text']
+    job.stage('extract', 'done',
+              cv_sections=len(documents['resume']['sections']),
+              jd_requirements=sum(len(items) for items in documents['job']['requirements'].values()))
+    
+    # Score locally first so the report can be shown right away; the
+    # LLM narrative is generated next and filled in by the report page
+    # when it arrives
+    job.stage('score', 'running')
+    scores = compute_match_scores(resume_text, job_text, cv_sections=documents['resume']['sections'])
+    report = {
+        'id': job.id,
+        'date': datetime.now().strftime('%d %b %Y, %H:%M'),
+        'job_title': 'Software Engineer',  # You would extract this from the job description
+        'score': scores['score'],
+        'company': 'Tech Corp',  # You would extract this from the job description
+        'stats': scores['stats'],
+        'keyword_counts': {
+            'required': scores['keywords']['total'],
+            'present': len(scores['keywords']['matched'])
+        },
+        'sections': _local_sections(scores)
+    }
+    job.set_result({'report': report})
+    job.stage('score', 'done', score=scores['score'], elapsed_ms=scores['elapsed_ms'])
+    
+    job.stage('narrative', 'running')
+    status, narrative = run_narrative(job.id, resume_text, job_text, lang=lang)
+    if narrative is not None:
+        # Stored with the job so other workers can serve it, and purged with it
+        job.set_result({'report': report, 'narrative': narrative})
+    job.stage('narrative', status)
+
+register_job_handler('analysis', _run_analysis_job)
+
+def _user_job(job_id):
+    """A job started from this session, or None"""
+    if job_id not in session.get('jobs', []):
+        return None
+    return get_job(job_id)
+
+def _user_report(report_id):
+    """Report of an analysis job started from this session, or None"""
+    job = _user_job(report_id)
+    if job is None:
+        return None
+    return (job['result'] or {}).get('report')
+
+@analysis_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Progress of an analysis job per stage, with the report URL once the report is ready"""
+    job = _user_job(job_id)
+    if job is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    response = {'job_id': job_id, 'status': job['status'], 'stages': job['stages'], 'error': job['error']}
+    report = (job['result'] or {}).get('report')
+    if report:
+        response['report_url'] = url_for('analysis.view_report', report_id=report['id'])
+    return jsonify(response)
+
+@analysis_bp.route('/jobs/<job_id>/progress')
+def job_progress(job_id):
+    """Page following an analysis job until its report is ready"""
+    if job_id not in session.get('jobs', []):
+        flash('Analysis not found', 'error')
+        return redirect(url_for('analysis.upload'))
+    return render_template('progress.html', job_id=job_id)
+
 @analysis_bp.route('/report/<report_id>')
 def view_report(report_id):
-    # In a real application, you would retrieve the report from your database
-    # For this example, we're retrieving from session
-    reports = session.get('reports', {})
-    report = reports.get(report_id)
+    # Reports live in their analysis job's row, not the cookie session
+    report = _user_report(report_id)
     
     if not report:
         flash('Report not found', 'error')
@@ -109,13 +224,49 @@ def view_report(report_id):
     
     return render_template('report.html', report=report)
 
+@analysis_bp.route('/report/<report_id>/narrative')
+def report_narrative(report_id):
+    """Status of a report's AI narrative, with the rendered HTML once it is ready"""
+    if _user_report(report_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    status, narrative = get_narrative(report_id)
+    response = {'status': status}
+    if status == 'done':
+        response['html'] = render_narrative(narrative)
+    return jsonify(response)
+
+@analysis_bp.route('/report/<report_id>/narrative/stream')
+def report_narrative_stream(report_id):
+    """Server-sent events relaying a report's AI narrative as it is generated"""
+    if _user_report(report_id) is None:
+        return jsonify({'status': 'not_found'}), 404
+    
+    heartbeat = current_app.config.get('NARRATIVE_STREAM_HEARTBEAT', 15)
+    
+    def events():
+        text = ""
+        for event, delta in follow_narrative(report_id, heartbeat):
+            if event == 'ping':
+                yield ": ping\n\n"
+            elif event == 'delta':
+                text += delta
+                yield f"data: {json.dumps({'text': delta})}\n\n"
+            elif event == 'done':
+                # The final event carries the server-rendered, sanitized narrative
+                yield f"event: done\ndata: {json.dumps({'html': render_narrative(text)})}\n\n"
+            else:
+                yield f"event: {event}\ndata: {{}}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @analysis_bp.route('/download_pdf/<report_id>')
 def download_pdf(report_id):
     """Generate and download a PDF version of the report"""
     try:
         # Get report data
-        reports = session.get('reports', {})
-        report = reports.get(report_id)
+        report = _user_report(report_id)
         
         if not report:
             flash('Report not found', 'error')
@@ -154,6 +305,15 @@ def download_pdf(report_id):
         {report['sections']['recommendations']}
         """
         
+        # Append the AI narrative if this worker has it
+        status, narrative = get_narrative(report_id)
+        if status == 'done':
+            pdf_content += f"""
+        Detailed Analysis
+        ----------------
+        {narrative}
+        """
+        
         # Create a BytesIO object for the file
         pdf_io = io.BytesIO()
         pdf_io.write(pdf_content.encode('utf-8'))
@@ -176,8 +336,7 @@ def download_improved_resume(report_id):
     """Download the improved resume"""
     try:
         # Get report data
-        reports = session.get('reports', {})
-        report = reports.get(report_id)
+        report = _user_report(report_id)
         
         if not report:
             flash('Report not found', 'error')
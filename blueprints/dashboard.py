@@ -2,10 +2,17 @@ from flask import Blueprint, render_template, current_app, jsonify, abort, sessi
 import os
 import json
 from datetime import datetime
+import time
+from services.ai_service import get_openrouter_breaker, get_openrouter_router, get_openrouter_ledger
 
 # Create the blueprint instance
 dashboard_bp = Blueprint('dashboard', __name__)
 
+def _require_admin():
+    """Abort unless the logged-in user is the configured administrator"""
+    if not session.get('user_email') or session['user_email'] != current_app.config.get('ADMIN_EMAIL'):
+        abort(403)
+
 @dashboard_bp.route('/')
 def index():
     """Dashboard main page showing report overview"""
@@ -77,4 +84,45 @@ def api_reports():
                 except Exception:
                     pass
     
-    return jsonify(reports)
\ No newline at end of file
+    return jsonify(reports)
+
+@dashboard_bp.route('/admin/circuit', methods=['GET'])
+def circuit_state():
+    """Admin endpoint: OpenRouter circuit breaker state and per-model health in this worker"""
+    _require_admin()
+    breaker = get_openrouter_breaker()
+    router = get_openrouter_router()
+    return jsonify({
+        'circuit': breaker.snapshot() if breaker else None,
+        'models': router.snapshot() if router else None,
+    })
+
+@dashboard_bp.route('/admin/circuit/reset', methods=['POST'])
+def reset_circuit():
+    """Admin endpoint: close the OpenRouter circuit by hand"""
+    _require_admin()
+    breaker = get_openrouter_breaker()
+    if breaker is None:
+        abort(404)
+    breaker.reset()
+    current_app.logger.warning(f"OpenRouter circuit reset by {session['user_email']}")
+    return jsonify({'circuit': breaker.snapshot()})
+
+@dashboard_bp.route('/admin/llm')
+def llm_calls():
+    """Admin view of the LLM call ledger: latency, tokens, cache and fallbacks"""
+    _require_admin()
+    ledger = get_openrouter_ledger()
+    if ledger is None:
+        abort(404)
+    hours = request.args.get('hours', 24, type=float)
+    # Include this worker's calls that are still buffered
+    ledger.flush()
+    summary = ledger.summary(since=time.time() - hours * 3600)
+    recent = ledger.recent(limit=request.args.get('limit', 50, type=int))
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'summary': summary, 'recent': recent})
+    for call in recent:
+        call['time'] = datetime.fromtimestamp(call['at']).strftime('%Y-%m-%d %H:%M:%S')
+    return render_template('dashboard/llm_calls.html', summary=summary, recent=recent, hours=hours,
+                           lang=session.get('lang', 'en'))
@@ -11,14 +11,84 @@ class Config:
     REPORTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     ALLOWED_EXTENSIONS = {'pdf'}
+    UPLOAD_SPOOL_MAX_MEMORY = 2 * 1024 * 1024  # Uploads above 2MB spill to a temp file
     
     # API configurations
     OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY', '')
     OPENROUTER_API_URL = 'https://openrouter.ai/api/v1/chat/completions'
     
+    # OpenRouter HTTP client: one pooled keep-alive session per worker process
+    OPENROUTER_POOL_CONNECTIONS = 4
+    OPENROUTER_POOL_MAXSIZE = 16  # Connections kept alive to the API host
+    OPENROUTER_CONNECT_TIMEOUT = 5
+    OPENROUTER_MAX_RETRIES = 3  # Retries on 429/5xx and dropped connections
+    OPENROUTER_BACKOFF_BASE = 0.5  # Seconds; the ceiling doubles per retry, with full jitter
+    OPENROUTER_BACKOFF_MAX = 8
+    OPENROUTER_ASYNC_CONCURRENCY = 32  # Async calls in flight at once per event loop
+    
+    # Coalesce identical OpenRouter requests in flight at the same time, in
+    # this process and across workers (through a small shared SQLite file)
+    SINGLE_FLIGHT_ENABLED = True
+    SINGLE_FLIGHT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'inflight.sqlite3')
+    SINGLE_FLIGHT_RESULT_TTL = 10  # Seconds a finished result stays readable by waiting workers
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.25  # Seconds between checks of another worker's request
+    
+    # Circuit breaker shared by all workers: while OpenRouter is failing or
+    # timing out, serve the fallback analysis at once instead of waiting out
+    # every call's deadline, and probe periodically for recovery
+    CIRCUIT_BREAKER_ENABLED = True
+    CIRCUIT_BREAKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'circuit.sqlite3')
+    CIRCUIT_BREAKER_WINDOW = 60  # Seconds of call outcomes considered
+    CIRCUIT_BREAKER_MIN_CALLS = 10  # Calls in the window before the circuit may open
+    CIRCUIT_BREAKER_ERROR_THRESHOLD = 0.5  # Share of failed calls (errors and timeouts)
+    CIRCUIT_BREAKER_TIMEOUT_THRESHOLD = 0.3  # Share of timed-out calls
+    CIRCUIT_BREAKER_OPEN_SECONDS = 30  # Cool-down before a probe call is let through
+    
+    # Ledger of LLM calls (model, tokens, latency, cache outcome, fallback
+    # reason), buffered in memory and written to a local SQLite file
+    LLM_LEDGER_ENABLED = True
+    LLM_LEDGER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'llm_calls.sqlite3')
+    LLM_LEDGER_FLUSH_INTERVAL = 5.0  # Seconds between writes
+    LLM_LEDGER_BATCH_SIZE = 200  # Buffered records that trigger an early write
+    LLM_LEDGER_RETENTION = 30 * 24 * 3600  # Seconds records are kept
+    
     # Default model configuration
     DEFAULT_MODEL = 'meta-llama/llama-3-8b-instruct'
     
+    # Model routing: use the first of DEFAULT_MODEL and FALLBACK_MODELS whose
+    # recent error rate is acceptable, and hedge to the next one when it has
+    # not answered within its recent p95 latency
+    MODEL_ROUTING_ENABLED = True
+    FALLBACK_MODELS = ['mistralai/mistral-7b-instruct']
+    MODEL_HEDGING_ENABLED = True
+    MODEL_ROUTER_WINDOW = 200  # Recent calls remembered per model and worker
+    MODEL_ROUTER_MAX_AGE = 300  # Seconds; a failing model is retried once its errors age out
+    MODEL_ROUTER_MIN_SAMPLES = 20  # Calls before a model's own p95 / error rate are trusted
+    MODEL_ROUTER_MAX_ERROR_RATE = 0.5
+    MODEL_HEDGE_DEFAULT_FRACTION = 0.5  # Share of a call's deadline waited before hedging while samples are scarce
+    MODEL_HEDGE_MIN_DELAY = 1.0
+    MODEL_HEDGE_WORKERS = 32  # Threads running routed calls per worker process
+    
+    # Prompt input limits in characters (also drive the PDF extraction budget)
+    # used when prompt packing is disabled
+    PROMPT_CV_MAX_CHARS = 5000
+    PROMPT_JD_MAX_CHARS = 3000
+    PROMPT_TEXT_MAX_CHARS = 7500
+    
+    # Mark the fixed instructions as cacheable for providers that need an
+    # explicit hint (Anthropic, Gemini); OpenAI-style providers cache
+    # identical prefixes automatically
+    PROMPT_CACHE_HINTS = False
+    
+    # Prompt packing: fit the most relevant CV sections and JD requirements
+    # into a per-model input token budget instead of slicing characters
+    PROMPT_PACKING_ENABLED = True
+    PROMPT_TOKEN_BUDGETS = {  # CV + JD payload, excluding the fixed instructions
+        'default': 1400,
+        'meta-llama/llama-3-8b-instruct': 1400,
+    }
+    PROMPT_JD_TOKEN_SHARE = 0.4  # Share of the budget reserved for the job description
+    
     # Session configuration
     SESSION_TYPE = 'filesystem'
     SESSION_PERMANENT = False
@@ -40,6 +110,16 @@ class Config:
     CACHE_TYPE = 'SimpleCache'
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
     
+    # AI result cache (content-addressed, shared by all workers, survives restarts)
+    AI_CACHE_ENABLED = True
+    AI_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ai_results.sqlite3')
+    AI_CACHE_MAX_BYTES = 128 * 1024 * 1024  # LRU eviction above 128MB
+    AI_CACHE_TTL = 30 * 24 * 3600  # Seconds; None keeps results until evicted
+    # Serve the result of nearly identical inputs (e.g. a CV resubmitted with a
+    # new phone number), matched by MinHash similarity of word 3-grams
+    AI_CACHE_NEAR_DUPLICATES = False
+    AI_CACHE_SIMILARITY_THRESHOLD = 0.9  # Least estimated Jaccard similarity, per document
+    
     # Security settings
     PASSWORD_SALT = os.getenv('PASSWORD_SALT', 'default-salt-change-in-production')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
@@ -89,13 +169,61 @@ class Config:
     # PDF processing settings
     PDF_EXTRACT_IMAGES = False
     PDF_OCR_ENABLED = False  # Enable if you add OCR capability
+    PDF_PARALLEL_EXTRACTION = True  # Extract large PDFs in a process pool
+    PDF_PARALLEL_PAGE_THRESHOLD = 20  # Below this page count extraction stays serial
+    PDF_PARALLEL_WORKERS = None  # None = os.cpu_count()
+    PDF_EXTRACTION_BUDGET_ENABLED = True  # Stop parsing pathologically long documents early
+    PDF_EXTRACTION_MAX_CHARS = 40000  # Characters extracted per document before parsing stops
+    PDF_EXTRACTION_MAX_PAGES = None  # Optional hard cap on pages read per document
+    
+    # Isolated extraction workers (started ahead of use, killed on timeout or memory cap)
+    PDF_SANDBOX_ENABLED = True
+    PDF_SANDBOX_WORKERS = 2
+    PDF_SANDBOX_TIMEOUT = 30  # Seconds per extraction job
+    PDF_SANDBOX_MAX_RSS_BYTES = 512 * 1024 * 1024
+    PDF_SANDBOX_MAX_JOBS_PER_WORKER = 50  # Recycle workers to bound leaks
+    
+    # Threads used to run analysis pipeline stages (e.g. CV and JD extraction) concurrently
+    ANALYSIS_EXECUTOR_WORKERS = 4
+    # Finished narratives kept in memory for report pages to pick up
+    NARRATIVE_STORE_SIZE = 512
+    # Stream narratives from the API as they are generated and relay them
+    # to the report page over server-sent events
+    NARRATIVE_STREAMING_ENABLED = True
+    NARRATIVE_STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments on idle streams
+    
+    # Background job queue for the upload pipeline (SQLite, shared by all workers)
+    JOB_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'jobs.sqlite3')
+    JOB_WORKERS = 8  # Job threads per process; each holds one analysis including its LLM call
+    JOB_POLL_INTERVAL = 2.0  # Seconds between checks for jobs queued by other processes
+    JOB_LEASE_SECONDS = 300  # A job silent for this long is assumed lost and retried
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETENTION_SECONDS = 7 * 24 * 3600  # Finished jobs are purged after a week
+    SESSION_JOBS_LIMIT = 20  # Job ids kept in the cookie session for status checks
+    
+    # Extraction cache (content-addressed, shared by all workers)
+    EXTRACTION_CACHE_ENABLED = True
+    EXTRACTION_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction.sqlite3')
+    EXTRACTION_CACHE_MAX_BYTES = 256 * 1024 * 1024  # LRU eviction above 256MB
+    
+    # Parsed document profiles kept in memory per worker (0 disables)
+    DOCUMENT_PROFILE_CACHE_SIZE = 256
+    
+    # Ranking function for batch CV-vs-JD scoring: 'bm25' or 'tfidf'
+    BATCH_SCORING_METHOD = 'bm25'
     
     # Application root path - prioritize environment variable
     APPLICATION_ROOT = os.environ.get('APPLICATION_ROOT', '/appop')
 
 # Prompt templates
+# The fixed instructions are sent as a system message that is identical on
+# every call (so upstream prompt caches can reuse it); only the inputs
+# template is filled with the CV and job description. Bump PROMPT_VERSION
+# whenever the instructions change.
+PROMPT_VERSION = "2"
+
 # English Version
-FULL_PROMPT_TEMPLATE_EN = dedent("""
+PROMPT_INSTRUCTIONS_EN = dedent("""
 **<Persona Definition:>**
 Act as an expert Career Coach and CV Analyst specializing in Applicant Tracking System (ATS) optimization. Your goal is to provide detailed, actionable feedback to maximize the candidate's chances of passing ATS screening and securing an interview.
 
@@ -103,12 +231,7 @@ Act as an expert Career Coach and CV Analyst specializing in Applicant Tracking
 Analyze the provided Candidate CV against the Job Description (JD) to identify alignment strengths, weaknesses, and critical gaps. Provide a strategic plan with concrete recommendations to significantly improve the CV's ATS compatibility score and overall effectiveness for this specific role.
 
 **<Inputs:>**
-
-*   **<Job Description (JD):>**
-    {jd_text}
-
-*   **<Candidate CV:>**
-    {cv_text}
+The Job Description (JD) and the Candidate CV are provided in the user message.
 
 **<Detailed Analysis & Recommendations Structure:>**
 
@@ -165,8 +288,16 @@ Analyze the provided Candidate CV against the Job Description (JD) to identify a
 *   Review your generated report to ensure it directly addresses the objective and provides a clear roadmap for CV improvement tailored to the specific JD and ATS optimization principles.
 """)
 
+PROMPT_INPUTS_TEMPLATE_EN = dedent("""
+**<Job Description (JD):>**
+{jd_text}
+
+**<Candidate CV:>**
+{cv_text}
+""")
+
 # French Version
-FULL_PROMPT_TEMPLATE_FR = dedent("""
+PROMPT_INSTRUCTIONS_FR = dedent("""
 **<Définition de la Persona :>**
 Agissez en tant que Coach de Carrière expert et Analyste de CV spécialisé dans l'optimisation pour les Applicant Tracking Systems (ATS). Votre objectif est de fournir un retour détaillé et exploitable pour maximiser les chances du candidat de passer le filtrage ATS et de décrocher un entretien.
 
@@ -174,12 +305,7 @@ Agissez en tant que Coach de Carrière expert et Analyste de CV spécialisé dan
 Analysez le CV du candidat fourni par rapport à la Description de Poste (DP) pour identifier les points forts de l'alignement, les faiblesses et les lacunes critiques. Fournissez un plan stratégique avec des recommandations concrètes pour améliorer significativement le score de compatibilité ATS du CV et son efficacité globale pour ce poste spécifique.
 
 **<Entrées :>**
-
-*   **<Description de Poste (DP) :>**
-    {jd_text}
-
-*   **<CV du Candidat :>**
-    {cv_text}
+La Description de Poste (DP) et le CV du candidat sont fournis dans le message de l'utilisateur.
 
 **<Structure d'Analyse Détaillée & Recommandations :>**
 
@@ -235,3 +361,11 @@ Analysez le CV du candidat fourni par rapport à la Description de Poste (DP) po
 **<Vérification Finale :>**
 *   Relisez votre rapport généré pour vous assurer qu'il répond directement à l'objectif et fournit une feuille de route claire pour l'amélioration du CV adaptée à la DP spécifique et aux principes d'optimisation ATS.
 """)
+
+PROMPT_INPUTS_TEMPLATE_FR = dedent("""
+**<Description de Poste (DP) :>**
+{jd_text}
+
+**<CV du Candidat :>**
+{cv_text}
+""")
@@ -0,0 +1,283 @@
+"""
+Persistent cache for AI analysis results.
+
+Results are keyed by a SHA-256 over the full normalized input texts, the
+analysis type and language, the model and the prompt version, and stored in
+a small SQLite file so every worker process shares them and they survive
+restarts. Each entry records what producing it cost (tokens, provider
+cost, latency) so the cache can report what it saved. The cache is bounded
+by total stored size and evicts least recently used entries first.
+
+Entries can also carry MinHash signatures of their inputs, indexed by LSH
+bucket, so a request whose inputs differ only slightly from a cached
+one (a changed phone number, a one-word edit) can be served the stored
+result as an approximate hit.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from services.near_duplicate import band_buckets, estimate_similarity, pack_signatures, unpack_signatures
+from services.sqlite_store import SQLiteStore, get_store
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Unicode-normalize text and collapse whitespace, so layout-only differences share a key"""
+    return WHITESPACE_RE.sub(" ", unicodedata.normalize('NFC', text)).strip()
+
+def make_cache_key(texts, prompt_type, lang, model, prompt_version):
+    """
+    Build the content-addressed key for an AI result
+
+    Args:
+        texts: Input texts in order (e.g. CV, then JD)
+        prompt_type: Type of analysis
+        lang: Language for analysis (en/fr)
+        model: Model the result comes from
+        prompt_version: Version of the prompt instructions
+
+    Returns:
+        str: Cache key
+    """
+    digest = hashlib.sha256()
+    for part in (prompt_type, lang, model, prompt_version):
+        digest.update(str(part).encode('utf-8') + b"\0")
+    for text in texts:
+        normalized = normalize_text(text).encode('utf-8')
+        # Length-prefix each text so the boundary between them is part of the key
+        digest.update(f"{len(normalized)}:".encode() + normalized)
+    return f"{prompt_type}:{lang}:{digest.hexdigest()}"
+
+def make_scope(prompt_type, lang, model, prompt_version):
+    """Identity of everything but the inputs; near-duplicates are only matched within a scope"""
+    return hashlib.sha256("\0".join(map(str, (prompt_type, lang, model, prompt_version))).encode('utf-8')).hexdigest()
+
+class AICache(SQLiteStore):
+    """
+    Disk-backed, size-bounded LRU cache of AI results with cost metadata
+
+    Args:
+        path (str): SQLite file
+        max_bytes (int): Total size of stored results before eviction
+        ttl (float): Seconds an entry stays valid, or None to keep it until evicted
+    """
+
+    def __init__(self, path, max_bytes=128 * 1024 * 1024, ttl=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    model TEXT,
+                    prompt_type TEXT,
+                    lang TEXT,
+                    prompt_version TEXT,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    cost REAL,
+                    latency_ms REAL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_cache_access ON ai_cache (last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache_signatures (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    signatures BLOB NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache_buckets (
+                    scope TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (scope, bucket, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_cache_buckets_key ON ai_cache_buckets (key)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO ai_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def _delete(self, conn, key):
+        conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+        conn.execute("DELETE FROM ai_cache_signatures WHERE key = ?", (key,))
+        conn.execute("DELETE FROM ai_cache_buckets WHERE key = ?", (key,))
+
+    def get(self, key):
+        """
+        Look up an AI result
+
+        Args:
+            key: Key from make_cache_key
+
+        Returns:
+            str or None: The cached result on a hit, None on a miss
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT content, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and row[1] < now - self.ttl:
+                self._delete(conn, key)
+                row = None
+            if row is None:
+                self._bump(conn, 'misses')
+                return None
+            conn.execute("UPDATE ai_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._bump(conn, 'hits')
+        return row[0]
+
+    def get_similar(self, scope, signatures, threshold):
+        """
+        Look up the result of the most similar cached inputs
+
+        Candidates share an LSH bucket with the first input's signature;
+        every input must then reach the threshold.
+
+        Args:
+            scope: Scope from make_scope
+            signatures: MinHash signature per input text, as passed to set()
+            threshold (float): Least estimated Jaccard similarity accepted
+
+        Returns:
+            tuple: (result, similarity) for the best match, or (None, None)
+        """
+        now = time.time()
+        buckets = band_buckets(signatures[0])
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT s.key, s.signatures, c.content FROM ai_cache_signatures s "
+                "JOIN ai_cache c ON c.key = s.key "
+                "WHERE s.key IN (SELECT key FROM ai_cache_buckets WHERE scope = ? AND bucket IN "
+                f"({', '.join('?' * len(buckets))})) AND c.created_at >= ?",
+                (scope, *buckets, now - self.ttl if self.ttl is not None else 0)
+            ).fetchall()
+            best = (None, None, None)
+            for key, data, content in rows:
+                stored = unpack_signatures(data)
+                if len(stored) != len(signatures):
+                    continue
+                similarity = min(estimate_similarity(a, b) for a, b in zip(signatures, stored))
+                if similarity >= threshold and (best[1] is None or similarity > best[1]):
+                    best = (content, similarity, key)
+            if best[0] is None:
+                self._bump(conn, 'near_misses')
+                return None, None
+            conn.execute("UPDATE ai_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, best[2]))
+            self._bump(conn, 'near_hits')
+        return best[0], best[1]
+
+    def set(self, key, content, model=None, prompt_type=None, lang=None, prompt_version=None,
+            prompt_tokens=None, completion_tokens=None, cost=None, latency_ms=None,
+            scope=None, signatures=None):
+        """
+        Store an AI result and evict old entries if over budget
+
+        Args:
+            key: Key from make_cache_key
+            content: Result text
+            model, prompt_type, lang, prompt_version: What produced the result
+            prompt_tokens, completion_tokens: Token usage reported by the provider
+            cost: Provider cost of the call, when reported
+            latency_ms: Time the call took
+            scope, signatures: make_scope value and MinHash signature per
+                               input text, to index the entry for get_similar
+        """
+        size = len(content.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, content, size, model, prompt_type, lang, prompt_version, "
+                "prompt_tokens, completion_tokens, cost, latency_ms, hits, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (key, content, size, model, prompt_type, lang, prompt_version,
+                 prompt_tokens, completion_tokens, cost, latency_ms, now, now)
+            )
+            if scope is not None and signatures:
+                conn.execute("INSERT OR REPLACE INTO ai_cache_signatures (key, scope, signatures) VALUES (?, ?, ?)",
+                             (key, scope, pack_signatures(signatures)))
+                conn.executemany("INSERT OR IGNORE INTO ai_cache_buckets (scope, bucket, key) VALUES (?, ?, ?)",
+                                 [(scope, bucket, key) for bucket in band_buckets(signatures[0])])
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM ai_cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(conn, key)
+            total -= size
+            evicted += 1
+        self._bump(conn, 'evictions', evicted)
+
+    def stats(self):
+        """
+        Return cache counters and what the cached entries have saved
+
+        Returns:
+            dict: hits, misses, near-duplicate hits and misses, evictions,
+                  entries, total stored bytes, and
+                  the tokens, provider cost and call time saved by hits on
+                  current entries
+        """
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM ai_cache_stats").fetchall())
+            entries, total, tokens, cost, latency = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "COALESCE(SUM(hits * (COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0))), 0), "
+                "COALESCE(SUM(hits * COALESCE(cost, 0)), 0), COALESCE(SUM(hits * COALESCE(latency_ms, 0)), 0) "
+                "FROM ai_cache"
+            ).fetchone()
+        return {
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'near_hits': counters.get('near_hits', 0),
+            'near_misses': counters.get('near_misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'size_bytes': total,
+            'max_bytes': self.max_bytes,
+            'tokens_saved': tokens,
+            'cost_saved': round(cost, 6),
+            'seconds_saved': round(latency / 1000, 1),
+        }
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM ai_cache")
+            conn.execute("DELETE FROM ai_cache_signatures")
+            conn.execute("DELETE FROM ai_cache_buckets")
+            conn.execute("DELETE FROM ai_cache_stats")
+
+def get_ai_cache(path, max_bytes, ttl=None):
+    """Return the process-wide AICache for a given file path"""
+    return get_store(AICache, path, path, max_bytes, ttl)
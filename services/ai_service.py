@@ -2,294 +2,1142 @@
 AI service module for interacting with OpenRouter API.
 """
 import os
-import requests
 import json
+import time
+import asyncio
 import hashlib
+from concurrent.futures import wait, FIRST_COMPLETED
+import numpy as np
+import httpx
+import requests
 from flask import current_app
-from config import Config, FULL_PROMPT_TEMPLATE_EN, FULL_PROMPT_TEMPLATE_FR
+from config import Config, PROMPT_VERSION
 from services.mock_ai_service import get_mock_analysis
-from services.pdf_service import extract_cv_sections, extract_jd_requirements
-from functools import lru_cache
-
-def get_cache_key(text, prompt_type, lang):
-    """Generate a cache key for AI requests"""
-    # Use a hash of the input to create a unique key
-    text_hash = hashlib.md5(text.encode()).hexdigest()
-    return f"ai_analysis:{prompt_type}:{lang}:{text_hash}"
+from services.pdf_service import extract_cv_sections, extract_jd_requirements, get_document_profile, DocumentProfile
+from services.keyword_matcher import KeywordMatcher, tokenize
+from services.batch_scoring import score_matrix
+from services.prompt_packer import pack_cv_and_jd, pack_text, prompt_token_budget, estimate_tokens
+from services.prompts import build_analysis_messages, message_text, record_prefix_usage
+from services.http_client import get_http_client, get_async_http_client, close_async_http_client, RETRY_STATUSES
+from services.single_flight import get_single_flight
+from services.ai_cache import get_ai_cache, make_cache_key, make_scope
+from services.near_duplicate import minhash_signature
+from services.model_router import get_model_router, get_hedge_executor
+from services.circuit_breaker import get_circuit_breaker
+from services.call_ledger import LLMCall, get_call_ledger
 
-def query_openrouter(text, prompt_type="ats_cv_analysis", lang="en"):
+def get_cache_key(text, prompt_type, lang, model=None):
     """
-    Query the OpenRouter API for AI analysis
+    Generate a cache key for AI requests
     
     Args:
-        text: Text to analyze
-        prompt_type: Type of analysis to perform
+        text: Text analyzed, or a tuple of texts (e.g. CV and JD)
+        prompt_type: Type of analysis
         lang: Language for analysis (en/fr)
+        model: Model answering (defaults to DEFAULT_MODEL)
         
     Returns:
-        str: Analysis result
+        str: SHA-256 key over the full normalized texts, model and prompt version
     """
+    texts = text if isinstance(text, tuple) else (text,)
+    model = model or current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct')
+    return "ai_analysis:" + make_cache_key(texts, prompt_type, lang, model, PROMPT_VERSION)
+
+def _get_result_cache():
+    """Return the shared AI result cache, or None when disabled or unavailable"""
+    if not current_app.config.get('AI_CACHE_ENABLED', False):
+        return None
     try:
-        current_app.logger.info(f"Performing {prompt_type} analysis on text ({len(text)} chars)")
-        
-        # Check for empty text
-        if not text or len(text) < 10:
-            current_app.logger.error("Text is too short for analysis")
-            return "Error: The provided text is too short for meaningful analysis."
-        
-        # Check if we should use mock service (based on config or environment)
-        use_mock = current_app.config.get('USE_MOCK_AI', False)
-        
-        if use_mock:
-            return get_mock_analysis(prompt_type, lang)
-            
-        # Check cache for existing result
-        cache = current_app.extensions.get('cache')
-        if cache:
-            cache_key = get_cache_key(text, prompt_type, lang)
-            cached_result = cache.get(cache_key)
-            if cached_result:
-                current_app.logger.info(f"Returning cached analysis result")
-                return cached_result
+        return get_ai_cache(
+            current_app.config['AI_CACHE_PATH'],
+            current_app.config.get('AI_CACHE_MAX_BYTES', 128 * 1024 * 1024),
+            ttl=current_app.config.get('AI_CACHE_TTL'),
+        )
+    except Exception as e:
+        current_app.logger.warning(f"AI result cache unavailable: {e}")
+        return None
+
+def _cached_result(cache, cache_key):
+    """Look up an AI result, treating cache errors as a miss"""
+    try:
+        return cache.get(cache_key)
+    except Exception as e:
+        current_app.logger.warning(f"AI result cache lookup failed: {e}")
+        return None
+
+def _near_duplicate_result(cache, texts, prompt_type, lang, model):
+    """
+    Look for the cached result of nearly identical inputs
+    
+    Args:
+        cache: AICache to search
+        texts (tuple): Input texts (e.g. CV and JD)
+        prompt_type, lang, model: Only results for the same analysis are considered
         
-        # Enhance analysis with document structure extraction if feature is enabled
-        structured_context = ""
-        if prompt_type == "ats_cv_analysis" and current_app.config.get('FEATURE_ADVANCED_CV_PARSING', False):
+    Returns:
+        tuple: (result, signatures) - result is None unless an approximate
+               hit was found; signatures index a new result for later
+               lookups (None when near-duplicate matching is off)
+    """
+    if not current_app.config.get('AI_CACHE_NEAR_DUPLICATES', False):
+        return None, None
+    try:
+        signatures = [minhash_signature(text) for text in texts]
+        if any(signature is None for signature in signatures):
+            return None, None
+        result, similarity = cache.get_similar(make_scope(prompt_type, lang, model, PROMPT_VERSION), signatures,
+                                               current_app.config.get('AI_CACHE_SIMILARITY_THRESHOLD', 0.9))
+    except Exception as e:
+        current_app.logger.warning(f"Near-duplicate cache lookup failed: {e}")
+        return None, None
+    if result:
+        current_app.logger.info(f"Returning approximate cached {prompt_type} result "
+                                f"(inputs estimated {similarity:.0%} similar)")
+    return result, signatures
+
+def get_openrouter_ledger():
+    """Return the LLM call ledger, or None when disabled"""
+    if not current_app.config.get('LLM_LEDGER_ENABLED', False):
+        return None
+    return get_call_ledger(
+        current_app.config['LLM_LEDGER_PATH'],
+        flush_interval=current_app.config.get('LLM_LEDGER_FLUSH_INTERVAL', 5.0),
+        batch_size=current_app.config.get('LLM_LEDGER_BATCH_SIZE', 200),
+        retention=current_app.config.get('LLM_LEDGER_RETENTION', 30 * 24 * 3600),
+        logger=current_app.logger,
+    )
+
+def _start_call(prompt_type, lang, streamed=False):
+    """Begin the ledger record of an analysis request"""
+    return LLMCall(prompt_type, lang, model=current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct'),
+                   streamed=streamed)
+
+def _finish_call(call):
+    """Hand a finished analysis request's record to the call ledger"""
+    try:
+        ledger = get_openrouter_ledger()
+        if ledger is not None:
+            ledger.record(call)
+    except Exception as e:
+        current_app.logger.warning(f"LLM call ledger unavailable: {e}")
+
+def _pack_document(profile, model, limit_key, default_chars, budget_share=1.0):
+    """Document payload for a single-document prompt, packed to a share of the model's token budget"""
+    if not current_app.config.get('PROMPT_PACKING_ENABLED', False):
+        return profile.text[:current_app.config.get(limit_key, default_chars)]
+    packed = pack_text(profile, int(prompt_token_budget(model) * budget_share))
+    current_app.logger.info(f"Packed text into {packed['tokens']} tokens (dropped: {packed['dropped'] or 'none'})")
+    return packed['text']
+
+def _pack_cv_and_jd(cv_profile, jd_profile, model):
+    """CV and JD payloads for a matching prompt, packed to the model's token budget"""
+    if not current_app.config.get('PROMPT_PACKING_ENABLED', False):
+        return (cv_profile.text[:current_app.config.get('PROMPT_CV_MAX_CHARS', 5000)],
+                jd_profile.text[:current_app.config.get('PROMPT_JD_MAX_CHARS', 3000)])
+    packed = pack_cv_and_jd(cv_profile, jd_profile, prompt_token_budget(model),
+                            matcher=get_jd_keyword_matcher(jd_profile))
+    current_app.logger.info(
+        f"Packed CV into {packed['cv_tokens']} and JD into {packed['jd_tokens']} of {packed['budget']} tokens "
+        f"(dropped CV: {packed['cv_dropped'] or 'none'}, JD: {packed['jd_dropped'] or 'none'})"
+    )
+    return packed['cv_text'], packed['jd_text']
+
+def _client_options():
+    """Retry and timeout settings shared by the sync and async OpenRouter clients"""
+    return {
+        'connect_timeout': current_app.config.get('OPENROUTER_CONNECT_TIMEOUT', 5),
+        'max_retries': current_app.config.get('OPENROUTER_MAX_RETRIES', 3),
+        'backoff_base': current_app.config.get('OPENROUTER_BACKOFF_BASE', 0.5),
+        'backoff_max': current_app.config.get('OPENROUTER_BACKOFF_MAX', 8),
+    }
+
+def get_openrouter_breaker():
+    """Return the shared OpenRouter circuit breaker, or None when disabled"""
+    if not current_app.config.get('CIRCUIT_BREAKER_ENABLED', False):
+        return None
+    return get_circuit_breaker(
+        current_app.config['CIRCUIT_BREAKER_PATH'],
+        window=current_app.config.get('CIRCUIT_BREAKER_WINDOW', 60),
+        min_calls=current_app.config.get('CIRCUIT_BREAKER_MIN_CALLS', 10),
+        error_threshold=current_app.config.get('CIRCUIT_BREAKER_ERROR_THRESHOLD', 0.5),
+        timeout_threshold=current_app.config.get('CIRCUIT_BREAKER_TIMEOUT_THRESHOLD', 0.3),
+        open_seconds=current_app.config.get('CIRCUIT_BREAKER_OPEN_SECONDS', 30),
+    )
+
+def _record_outcome(outcome):
+    """Report an upstream call's outcome ('ok', 'error' or 'timeout') to the circuit breaker"""
+    try:
+        breaker = get_openrouter_breaker()
+        if breaker is not None and breaker.record(outcome) == 'open' and outcome != 'ok':
+            current_app.logger.warning(f"OpenRouter circuit open: {breaker.snapshot()['reason']}")
+    except Exception as e:
+        current_app.logger.warning(f"Circuit breaker unavailable: {e}")
+
+def _response_outcome(response):
+    """Circuit breaker outcome of an upstream response; client errors are not upstream failures"""
+    if response.status_code in (408, 504):
+        return 'timeout'
+    if response.status_code in RETRY_STATUSES:
+        return 'error'
+    return 'ok'
+
+def _fail_fast(request):
+    """
+    The degraded result while the circuit breaker is open
+    
+    Returns:
+        str or None: The mock analysis when the call must not go upstream,
+                     otherwise None
+    """
+    try:
+        breaker = get_openrouter_breaker()
+        if breaker is None or breaker.allow():
+            return None
+    except Exception as e:
+        current_app.logger.warning(f"Circuit breaker unavailable: {e}")
+        return None
+    current_app.logger.warning(f"OpenRouter circuit open; returning fallback {request['label']} result")
+    request['call'].fallback('circuit_open')
+    return get_mock_analysis(request['fallback_type'], request['lang'])
+
+def _post_openrouter(request, stream=False):
+    """POST to OpenRouter over the pooled keep-alive client, retrying transient errors"""
+    client = get_http_client(
+        pool_connections=current_app.config.get('OPENROUTER_POOL_CONNECTIONS', 4),
+        pool_maxsize=current_app.config.get('OPENROUTER_POOL_MAXSIZE', 16),
+        **_client_options()
+    )
+    request['sent_at'] = time.monotonic()
+    try:
+        response = client.post_json(request['api_url'], request['payload'], headers=request['headers'],
+                                    deadline=request['deadline'], logger=current_app.logger, stream=stream)
+    except requests.Timeout:
+        _record_outcome('timeout')
+        raise
+    except Exception:
+        _record_outcome('error')
+        raise
+    _record_outcome(_response_outcome(response))
+    return response
+
+async def _post_openrouter_async(request):
+    """POST to OpenRouter from the running event loop, within the concurrency limit"""
+    client = get_async_http_client(
+        concurrency=current_app.config.get('OPENROUTER_ASYNC_CONCURRENCY', 32),
+        max_connections=current_app.config.get('OPENROUTER_POOL_MAXSIZE', 16),
+        **_client_options()
+    )
+    request['sent_at'] = time.monotonic()
+    # The circuit breaker writes to SQLite, which must not block the event loop
+    try:
+        response = await client.post_json(request['api_url'], request['payload'], headers=request['headers'],
+                                          deadline=request['deadline'], logger=current_app.logger)
+    except httpx.TimeoutException:
+        await asyncio.to_thread(_record_outcome, 'timeout')
+        raise
+    except Exception:
+        await asyncio.to_thread(_record_outcome, 'error')
+        raise
+    await asyncio.to_thread(_record_outcome, _response_outcome(response))
+    return response
+
+def get_openrouter_router():
+    """Return the model router, or None when routing is disabled"""
+    if not current_app.config.get('MODEL_ROUTING_ENABLED', False):
+        return None
+    return get_model_router(
+        window=current_app.config.get('MODEL_ROUTER_WINDOW', 200),
+        max_age=current_app.config.get('MODEL_ROUTER_MAX_AGE', 300),
+        min_samples=current_app.config.get('MODEL_ROUTER_MIN_SAMPLES', 20),
+        max_error_rate=current_app.config.get('MODEL_ROUTER_MAX_ERROR_RATE', 0.5),
+        default_fraction=current_app.config.get('MODEL_HEDGE_DEFAULT_FRACTION', 0.5),
+        min_delay=current_app.config.get('MODEL_HEDGE_MIN_DELAY', 1.0),
+    )
+
+def _for_model(request, model):
+    """The same request addressed to another model"""
+    if model == request['payload']['model']:
+        return request
+    return dict(request, payload=dict(request['payload'], model=model))
+
+def _route(request):
+    """
+    Address a request to the healthiest configured model
+    
+    Returns:
+        tuple: (router, primary request, hedge request) - router is None
+               when routing is disabled, hedge is None when there is no
+               second model or hedging is disabled
+    """
+    router = get_openrouter_router()
+    if router is None:
+        return None, request, None
+    models = [request['payload']['model']] + list(current_app.config.get('FALLBACK_MODELS', []))
+    primary, hedge = router.route(models)
+    if hedge is None or not current_app.config.get('MODEL_HEDGING_ENABLED', False):
+        return router, _for_model(request, primary), None
+    return router, _for_model(request, primary), _for_model(request, hedge)
+
+def _record_route(router, request, ok):
+    """Report a routed request's outcome and its time since it was sent to the model router"""
+    router.record(request['payload']['model'], time.monotonic() - request['sent_at'], ok, request['fallback_type'])
+
+def _release(response):
+    """Close a response nobody will read, returning its connection to the pool"""
+    if response is not None and hasattr(response, 'close'):
+        response.close()
+
+def _post_routed(request):
+    """
+    Send a request to the routed model, hedging when it is slow
+    
+    The primary model gets until its recent p95 latency (or until it
+    fails) to answer; then the same request goes to the hedge model and
+    the first successful response wins. A losing call that has not
+    started is cancelled; one already in flight cannot be interrupted, so
+    its response is discarded when it arrives.
+    
+    Returns:
+        tuple: (request that was answered, response) - when no call
+               succeeds, the primary's response
+    
+    Raises:
+        requests.RequestException: When no call succeeded and the primary failed to connect
+    """
+    # 0 until a response arrives
+    request['call'].status = 0
+    router, primary, hedge = _route(request)
+    if router is None:
+        return request, _post_openrouter(request)
+    app = current_app._get_current_object()
+    end = time.monotonic() + request['deadline']
+    
+    def attempt(req):
+        with app.app_context():
+            start = time.monotonic()
             try:
-                cv_sections = extract_cv_sections(text)
-                if cv_sections:
-                    structured_context = "\nCV Structure Analysis:\n"
-                    for section_name, section_data in cv_sections.items():
-                        structured_context += f"- Section: {section_data['header']}\n"
+                response = _post_openrouter(req)
+            except Exception:
+                router.record(req['payload']['model'], time.monotonic() - start, False, req['fallback_type'])
+                raise
+            router.record(req['payload']['model'], time.monotonic() - start, response.status_code == 200,
+                          req['fallback_type'])
+            return response
+    
+    if hedge is None:
+        return primary, attempt(primary)
+    
+    executor = get_hedge_executor(current_app.config.get('MODEL_HEDGE_WORKERS', 32))
+    delay = router.hedge_delay(primary['payload']['model'], request['fallback_type'], request['deadline'])
+    futures = {executor.submit(attempt, primary): primary}
+    failures = []
+    hedged = False
+    while futures:
+        done, _ = wait(futures, timeout=None if hedged else delay, return_when=FIRST_COMPLETED)
+        for future in done:
+            req = futures.pop(future)
+            try:
+                response = future.result()
             except Exception as e:
-                current_app.logger.warning(f"Error extracting CV structure: {e}")
+                failures.append((req, None, e))
+                continue
+            if response.status_code == 200:
+                for loser in futures:
+                    if not loser.cancel():
+                        loser.add_done_callback(lambda f: f.exception() is None and _release(f.result()))
+                for _, failed, _ in failures:
+                    _release(failed)
+                if hedged:
+                    current_app.logger.info(f"{req['payload']['model']} answered the hedged {request['label']} request")
+                return req, response
+            failures.append((req, response, None))
+        remaining = end - time.monotonic()
+        if not hedged and remaining > 0:
+            hedged = request['call'].hedged = True
+            reason = "failed" if failures else f"has not answered in {delay:.1f}s"
+            current_app.logger.warning(f"{primary['payload']['model']} {reason}; "
+                                       f"hedging {request['label']} request with {hedge['payload']['model']}")
+            # The submitted copy is the one that records sent_at, so map it too
+            hedge = dict(hedge, deadline=remaining)
+            futures[executor.submit(attempt, hedge)] = hedge
+    
+    # Nothing succeeded; report the primary's outcome
+    req, response, error = failures[0]
+    for _, failed, _ in failures[1:]:
+        _release(failed)
+    if error is not None:
+        raise error
+    return req, response
+
+async def _post_routed_async(request):
+    """
+    Async counterpart of _post_routed; the losing call is cancelled outright
+    
+    Returns:
+        tuple: (request that was answered, response)
+    """
+    request['call'].status = 0
+    router, primary, hedge = _route(request)
+    if router is None:
+        return request, await _post_openrouter_async(request)
+    end = time.monotonic() + request['deadline']
+    
+    async def attempt(req):
+        start = time.monotonic()
+        try:
+            response = await _post_openrouter_async(req)
+        except Exception:
+            router.record(req['payload']['model'], time.monotonic() - start, False, req['fallback_type'])
+            raise
+        router.record(req['payload']['model'], time.monotonic() - start, response.status_code == 200,
+                      req['fallback_type'])
+        return response
+    
+    if hedge is None:
+        return primary, await attempt(primary)
+    
+    delay = router.hedge_delay(primary['payload']['model'], request['fallback_type'], request['deadline'])
+    tasks = {asyncio.ensure_future(attempt(primary)): primary}
+    failures = []
+    hedged = False
+    try:
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=None if hedged else delay, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                req = tasks.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    failures.append((req, None, e))
+                    continue
+                if response.status_code == 200:
+                    if hedged:
+                        current_app.logger.info(f"{req['payload']['model']} answered the hedged {request['label']} request")
+                    return req, response
+                failures.append((req, response, None))
+            remaining = end - time.monotonic()
+            if not hedged and remaining > 0:
+                hedged = request['call'].hedged = True
+                reason = "failed" if failures else f"has not answered in {delay:.1f}s"
+                current_app.logger.warning(f"{primary['payload']['model']} {reason}; "
+                                           f"hedging {request['label']} request with {hedge['payload']['model']}")
+                hedge = dict(hedge, deadline=remaining)
+                tasks[asyncio.ensure_future(attempt(hedge))] = hedge
+    finally:
+        # Cancel the loser (or everything, if the caller was cancelled)
+        for task in tasks:
+            task.cancel()
+    
+    req, response, error = failures[0]
+    if error is not None:
+        raise error
+    return req, response
+
+def _log_prompt_tokens(payload, result=None, prefix=None):
+    """Log the estimated prompt tokens sent and, once known, the provider's count"""
+    estimated = sum(estimate_tokens(message_text(message)) for message in payload['messages'])
+    if result is None:
+        current_app.logger.info(f"Sending ~{estimated} prompt tokens to {payload['model']}")
+        return
+    usage = result.get('usage') or {}
+    current_app.logger.info(f"Prompt tokens for {payload['model']}: ~{estimated} estimated, "
+                            f"{usage.get('prompt_tokens', 'unknown')} counted by provider")
+    if prefix is not None:
+        cached = record_prefix_usage(prefix, usage)
+        current_app.logger.info(f"Prompt prefix {prefix.lang}/v{prefix.version}: "
+                                f"{cached} of {prefix.tokens} tokens served from provider cache")
+
+def _api_request(payload, title, fallback_type, lang, deadline, prefix, cache, cache_key, label, call, signatures=None):
+    """
+    Bundle an OpenRouter call with what is needed to handle its response
+    
+    call is the request's LLMCall ledger record. signatures are the
+    MinHash signatures of the inputs, stored with the cached result for
+    near-duplicate lookups.
+
+    Returns:
+        tuple: (None, request dict), or (mock analysis, None) when the API
+               key is missing
+    """
+    api_url = current_app.config.get('OPENROUTER_API_URL', 'https://openrouter.ai/api/v1/chat/completions')
+    api_key = current_app.config.get('OPENROUTER_API_KEY', '')
+    
+    if not api_key:
+        current_app.logger.error("OpenRouter API key is missing")
+        call.fallback('missing_api_key')
+        return get_mock_analysis(fallback_type, lang), None
+    
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}",
+        "HTTP-Referer": "https://appop-demo.com",  # You should update this to your domain
+        "X-Title": title
+    }
+    return None, {
+        'api_url': api_url,
+        'headers': headers,
+        'payload': payload,
+        'deadline': deadline,
+        'prefix': prefix,
+        'cache': cache,
+        'cache_key': cache_key,
+        # Lookups use the key of the requested model, not a routed one
+        'cache_model': payload['model'],
+        'signatures': signatures,
+        'fallback_type': fallback_type,
+        'lang': lang,
+        'label': label,
+        'call': call,
+    }
+
+def _cache_result(request, content, usage=None):
+    """
+    Cache an analysis if the cache is available, with what producing it cost
+    
+    Args:
+        request: Request dict from _api_request
+        content: Analysis text
+        usage (dict): Token usage reported by the provider, if any
+    """
+    if not request['cache'] or not content:
+        return
+    model = request['payload']['model']
+    if model != request['cache_model']:
+        # Lookups only use the requested model's key; another model's answer
+        # stored under it would be served as the requested model's
+        current_app.logger.info(f"Not caching the {request['label']} result answered by {model}")
+        return
+    usage = usage or {}
+    try:
+        request['cache'].set(
+            request['cache_key'], content,
+            model=model,
+            prompt_type=request['fallback_type'],
+            lang=request['lang'],
+            prompt_version=PROMPT_VERSION,
+            prompt_tokens=usage.get('prompt_tokens'),
+            completion_tokens=usage.get('completion_tokens'),
+            # OpenRouter reports the charge in credits when usage accounting is on
+            cost=usage.get('cost'),
+            latency_ms=request['call'].latency_ms,
+            scope=make_scope(request['fallback_type'], request['lang'], model, PROMPT_VERSION),
+            signatures=request['signatures'],
+        )
+    except Exception as e:
+        current_app.logger.warning(f"Could not cache {request['label']} result: {e}")
+
+def _handle_response(request, response):
+    """
+    Turn an OpenRouter response into the analysis text, caching it on
+    success and falling back to the mock analysis otherwise
+    """
+    call = request['call']
+    call.model = request['payload']['model']
+    call.status = response.status_code
+    call.latency_ms = (time.monotonic() - request['sent_at']) * 1000
+    # requests measures until the response headers arrive; httpx measures the whole exchange
+    if isinstance(response, requests.Response):
+        call.ttfb_ms = response.elapsed.total_seconds() * 1000
+    
+    # Check if the request was successful
+    if response.status_code == 200:
+        result = response.json()
+        _log_prompt_tokens(request['payload'], result, request['prefix'])
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        current_app.logger.info(f"Received {request['label']} response: {len(content)} chars")
+        call.set_usage(result.get('usage'))
         
-        # Select template based on language
-        template = FULL_PROMPT_TEMPLATE_FR if lang == "fr" else FULL_PROMPT_TEMPLATE_EN
-            
-        # Determine which prompt to use based on prompt_type
-        if prompt_type == "ats_cv_analysis":
-            # For CV-only analysis, use the same template but with a placeholder JD
-            placeholder_jd = "This is a general CV analysis without a specific job description."
-            prompt = template.format(
-                cv_text=text[:5000],
-                jd_text=placeholder_jd
-            )
-            # Add structured context if available
-            if structured_context:
-                prompt += f"\n\nAdditional Context: {structured_context}"
+        _cache_result(request, content, result.get('usage'))
+        return content
+    else:
+        current_app.logger.error(f"API request failed with status code {response.status_code}: {response.text}")
+        call.fallback(f"http_{response.status_code}")
+        # Fall back to mock service when API request fails
+        return get_mock_analysis(request['fallback_type'], request['lang'])
+
+def _flight_key(request):
+    """Identity of an upstream request: a digest of the exact payload sent"""
+    body = json.dumps(request['payload'], sort_keys=True)
+    return "openrouter:" + hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+def _join_flight(request):
+    """
+    Lead an upstream request or wait for an identical one already in flight
+    
+    Returns:
+        tuple: (flight, token, result) - when token is None, result comes
+               from the identical request; otherwise the caller sends the
+               request and publishes (or abandons) the token. flight is
+               None when coalescing is disabled.
+    """
+    if not current_app.config.get('SINGLE_FLIGHT_ENABLED', False):
+        return None, None, None
+    flight = get_single_flight(
+        current_app.config['SINGLE_FLIGHT_PATH'],
+        result_ttl=current_app.config.get('SINGLE_FLIGHT_RESULT_TTL', 10),
+        poll_interval=current_app.config.get('SINGLE_FLIGHT_POLL_INTERVAL', 0.25),
+    )
+    # Wait as long as the leader may take, plus time to publish its result
+    token, result = flight.join(_flight_key(request), timeout=request['deadline'] + 10)
+    if token is None:
+        current_app.logger.info(f"Reusing the {request['label']} result of an identical in-flight request")
+        request['call'].cache = 'coalesced'
+    return flight, token, result
+
+def _call_openrouter(request):
+    """
+    Send a prepared request and handle its response, coalescing identical
+    in-flight requests and failing fast while the circuit breaker is open
+    """
+    flight, token, result = _join_flight(request)
+    if flight is not None and token is None:
+        return result
+    try:
+        # Checked only by a caller that will send the request, so a
+        # half-open breaker's probe is never taken by a coalesced one
+        result = _fail_fast(request)
+        if result is None:
+            result = _handle_response(*_post_routed(request))
+    except BaseException:
+        if token is not None:
+            flight.abandon(token)
+        raise
+    if token is not None:
+        # A fallback answer is this caller's alone; waiters send their own request
+        if request['call'].fallback_reason is None:
+            flight.publish(token, result)
         else:
-            # For any other analysis, use a more generic prompt
-            prompt = f"Analyze the following text: {text[:7500]}"
-        
-        # OpenRouter API endpoint and parameters
-        api_url = current_app.config.get('OPENROUTER_API_URL', 'https://openrouter.ai/api/v1/chat/completions')
-        api_key = current_app.config.get('OPENROUTER_API_KEY', '')
-        
-        if not api_key:
-            current_app.logger.error("OpenRouter API key is missing")
-            return get_mock_analysis(prompt_type, lang)
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "https://appop-demo.com",  # You should update this to your domain
-            "X-Title": "AppOp CV Analysis"
-        }
+            flight.abandon(token)
+    return result
+
+async def _call_openrouter_async(request):
+    """Async counterpart of _call_openrouter, without cross-request coalescing"""
+    result = await asyncio.to_thread(_fail_fast, request)
+    if result is not None:
+        return result
+    # Caching the result writes to SQLite, which must not block the event loop
+    return await asyncio.to_thread(_handle_response, *await _post_routed_async(request))
+
+def _prepare_query(text, prompt_type, lang, call):
+    """
+    Everything query_openrouter does before calling the API
+    
+    Notes the cache outcome and any fallback reason on call, the
+    request's LLMCall ledger record.
+
+    Returns:
+        tuple: (result, request) - result is the final answer (mock, cached
+               or error message) when no API call is needed, otherwise
+               request describes the call to make
+    """
+    profile = get_document_profile(text)
+    text = profile.text
+    current_app.logger.info(f"Performing {prompt_type} analysis on text ({len(text)} chars)")
+    
+    # Check for empty text
+    if not text or len(text) < 10:
+        current_app.logger.error("Text is too short for analysis")
+        call.fallback('text_too_short')
+        return "Error: The provided text is too short for meaningful analysis.", None
+    
+    # Check if we should use mock service (based on config or environment)
+    use_mock = current_app.config.get('USE_MOCK_AI', False)
+    
+    if use_mock:
+        call.fallback('mock_mode')
+        return get_mock_analysis(prompt_type, lang), None
         
-        payload = {
-            "model": current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct'),
-            "messages": [
-                {"role": "system", "content": "You are an expert CV analyst specializing in ATS optimization."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
+    model = current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct')
+    
+    # Check cache for existing result
+    cache = _get_result_cache()
+    cache_key = signatures = None
+    if cache:
+        cache_key = get_cache_key(text, prompt_type, lang, model)
+        cached_result = _cached_result(cache, cache_key)
+        if cached_result:
+            current_app.logger.info(f"Returning cached analysis result")
+            call.cache = 'hit'
+            return cached_result, None
+        cached_result, signatures = _near_duplicate_result(cache, (text,), prompt_type, lang, model)
+        if cached_result:
+            call.cache = 'near_hit'
+            return cached_result, None
+        call.cache = 'miss'
+    
+    # Enhance analysis with document structure extraction if feature is enabled
+    structured_context = ""
+    if prompt_type == "ats_cv_analysis" and current_app.config.get('FEATURE_ADVANCED_CV_PARSING', False):
+        try:
+            cv_sections = extract_cv_sections(profile)
+            if cv_sections:
+                structured_context = "\nCV Structure Analysis:\n"
+                for section_name, section_data in cv_sections.items():
+                    structured_context += f"- Section: {section_data['header']}\n"
+        except Exception as e:
+            current_app.logger.warning(f"Error extracting CV structure: {e}")
+    
+    prefix = None
         
-        current_app.logger.info(f"Sending request to OpenRouter API with model: {payload['model']}")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=60)
+    # Determine which prompt to use based on prompt_type
+    if prompt_type == "ats_cv_analysis":
+        # For CV-only analysis, use the same instructions but with a placeholder JD
+        placeholder_jd = "This is a general CV analysis without a specific job description."
+        messages, prefix = build_analysis_messages(
+            cv_text=_pack_document(profile, model, 'PROMPT_CV_MAX_CHARS', 5000,
+                                   budget_share=1 - current_app.config.get('PROMPT_JD_TOKEN_SHARE', 0.4)),
+            jd_text=placeholder_jd,
+            lang=lang,
+            # Add structured context if available
+            extra_context=f"Additional Context: {structured_context}" if structured_context else "",
+            cache_hint=current_app.config.get('PROMPT_CACHE_HINTS', False)
+        )
+    else:
+        # For any other analysis, use a more generic prompt
+        prompt = f"Analyze the following text: {_pack_document(profile, model, 'PROMPT_TEXT_MAX_CHARS', 7500)}"
+        messages = [
+            {"role": "system", "content": "You are an expert CV analyst specializing in ATS optimization."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 2000
+    }
+    
+    current_app.logger.info(f"Sending request to OpenRouter API with model: {payload['model']}")
+    _log_prompt_tokens(payload)
+    return _api_request(payload, "AppOp CV Analysis", prompt_type, lang, 60,
+                        prefix, cache, cache_key, "OpenRouter API", call, signatures)
+
+def query_openrouter(text, prompt_type="ats_cv_analysis", lang="en"):
+    """
+    Query the OpenRouter API for AI analysis
+    
+    Args:
+        text: Text to analyze (str or DocumentProfile)
+        prompt_type: Type of analysis to perform
+        lang: Language for analysis (en/fr)
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            current_app.logger.info(f"Received response from OpenRouter API: {len(content)} chars")
+    Returns:
+        str: Analysis result
+    """
+    call = _start_call(prompt_type, lang)
+    try:
+        result, request = _prepare_query(text, prompt_type, lang, call)
+        if request is None:
+            return result
+        return _call_openrouter(request)
             
-            # Cache the result if cache is available
-            if cache and content:
-                cache.set(cache_key, content, timeout=current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300))
-                
-            return content
-        else:
-            current_app.logger.error(f"API request failed with status code {response.status_code}: {response.text}")
-            # Fall back to mock service when API request fails
-            return get_mock_analysis(prompt_type, lang)
+    except Exception as e:
+        current_app.logger.error(f"Error querying OpenRouter API: {e}")
+        call.fallback(f"error: {type(e).__name__}")
+        # Fall back to mock service on exception
+        return get_mock_analysis(prompt_type, lang)
+    finally:
+        _finish_call(call)
+
+async def query_openrouter_async(text, prompt_type="ats_cv_analysis", lang="en"):
+    """
+    Async counterpart of query_openrouter, for running many calls from one event loop
+
+    Must be awaited inside an app context. At most OPENROUTER_ASYNC_CONCURRENCY
+    calls are in flight per event loop; the rest wait for a free slot.
+    
+    Args:
+        text: Text to analyze (str or DocumentProfile)
+        prompt_type: Type of analysis to perform
+        lang: Language for analysis (en/fr)
+        
+    Returns:
+        str: Analysis result
+    """
+    call = _start_call(prompt_type, lang)
+    try:
+        # Cache lookups hit SQLite; run them off the event loop
+        result, request = await asyncio.to_thread(_prepare_query, text, prompt_type, lang, call)
+        if request is None:
+            return result
+        return await _call_openrouter_async(request)
             
     except Exception as e:
         current_app.logger.error(f"Error querying OpenRouter API: {e}")
+        call.fallback(f"error: {type(e).__name__}")
         # Fall back to mock service on exception
         return get_mock_analysis(prompt_type, lang)
+    finally:
+        _finish_call(call)
+
+def _prepare_cv_jd_analysis(cv_text, jd_text, lang, call):
+    """
+    Everything analyze_cv_with_jd does before calling the API (see _prepare_query)
+
+    Returns:
+        tuple: (result, request) as for _prepare_query
+    """
+    cv_profile = get_document_profile(cv_text)
+    jd_profile = get_document_profile(jd_text)
+    cv_text, jd_text = cv_profile.text, jd_profile.text
+    current_app.logger.info(f"Starting CV-JD analysis in {lang}")
+    
+    # Check if we should use mock service (based on config or environment)
+    use_mock = current_app.config.get('USE_MOCK_AI', False)
+    
+    if use_mock:
+        call.fallback('mock_mode')
+        return get_mock_analysis("cv_jd_match", lang), None
+        
+    model = current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct')
+    
+    # Check cache for existing result
+    cache = _get_result_cache()
+    cache_key = signatures = None
+    if cache:
+        # Create a unique key based on the full CV and JD content
+        cache_key = get_cache_key((cv_text, jd_text), "cv_jd_match", lang, model)
+        cached_result = _cached_result(cache, cache_key)
+        if cached_result:
+            current_app.logger.info(f"Returning cached CV-JD analysis result")
+            call.cache = 'hit'
+            return cached_result, None
+        cached_result, signatures = _near_duplicate_result(cache, (cv_text, jd_text), "cv_jd_match", lang, model)
+        if cached_result:
+            call.cache = 'near_hit'
+            return cached_result, None
+        call.cache = 'miss'
+    
+    # Enhanced analysis with document structure extraction if feature is enabled
+    enhanced_context = ""
+    if current_app.config.get('FEATURE_JOB_REQUIREMENTS_EXTRACTION', False):
+        try:
+            # Extract structured JD requirements
+            jd_requirements = extract_jd_requirements(jd_profile)
+            cv_sections = extract_cv_sections(cv_profile)
+            
+            if jd_requirements and any(reqs for reqs in jd_requirements.values()):
+                enhanced_context += "\nStructured Job Requirements:\n"
+                for category, reqs in jd_requirements.items():
+                    if reqs:
+                        enhanced_context += f"- {category.replace('_', ' ').title()}:\n"
+                        for req in reqs[:5]:  # Limit to top 5 items per category
+                            enhanced_context += f"  * {req}\n"
+            
+            if cv_sections:
+                enhanced_context += "\nCV Structure:\n"
+                for section_name, section_data in cv_sections.items():
+                    enhanced_context += f"- Section: {section_data['header']}\n"
+        except Exception as e:
+            current_app.logger.warning(f"Error extracting structured data: {e}")
+    
+    # The fixed instructions for the language go in the system message;
+    # the CV and JD text, packed to fit the model's token budget, go in
+    # the user message
+    packed_cv, packed_jd = _pack_cv_and_jd(cv_profile, jd_profile, model)
+    messages, prefix = build_analysis_messages(
+        packed_cv, packed_jd, lang=lang,
+        # Add enhanced context if available
+        extra_context=f"Additional Structured Analysis:\n{enhanced_context}" if enhanced_context else "",
+        cache_hint=current_app.config.get('PROMPT_CACHE_HINTS', False)
+    )
+    
+    payload = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 4000
+    }
+    
+    current_app.logger.info(f"Sending CV-JD analysis request with {len(packed_cv)} chars CV and {len(packed_jd)} chars JD")
+    _log_prompt_tokens(payload)
+    return _api_request(payload, "AppOp CV-JD Analysis", "cv_jd_match", lang, 120,
+                        prefix, cache, cache_key, "CV-JD analysis", call, signatures)
 
 def analyze_cv_with_jd(cv_text, jd_text, lang="en"):
     """
     Analyze CV against job description using AI
     
     Args:
-        cv_text: CV text content
-        jd_text: Job description text content
+        cv_text: CV text content (str or DocumentProfile)
+        jd_text: Job description text content (str or DocumentProfile)
         lang: Language for analysis (en/fr)
         
     Returns:
         str: Analysis result comparing CV to job description
     """
+    call = _start_call("cv_jd_match", lang)
     try:
-        current_app.logger.info(f"Starting CV-JD analysis in {lang}")
-        
-        # Check if we should use mock service (based on config or environment)
-        use_mock = current_app.config.get('USE_MOCK_AI', False)
-        
-        if use_mock:
-            return get_mock_analysis("cv_jd_match", lang)
+        result, request = _prepare_cv_jd_analysis(cv_text, jd_text, lang, call)
+        if request is None:
+            return result
+        return _call_openrouter(request)
             
-        # Check cache for existing result
-        cache = current_app.extensions.get('cache')
-        if cache:
-            # Create a unique key based on both CV and JD content
-            combined_text = f"{cv_text[:1000]}{jd_text[:1000]}"
-            cache_key = get_cache_key(combined_text, "cv_jd_match", lang)
-            cached_result = cache.get(cache_key)
-            if cached_result:
-                current_app.logger.info(f"Returning cached CV-JD analysis result")
-                return cached_result
+    except Exception as e:
+        current_app.logger.error(f"Error in CV-JD analysis: {e}")
+        call.fallback(f"error: {type(e).__name__}")
+        # Fall back to mock service on exception
+        return get_mock_analysis("cv_jd_match", lang)
+    finally:
+        _finish_call(call)
+
+async def analyze_cv_with_jd_async(cv_text, jd_text, lang="en"):
+    """
+    Async counterpart of analyze_cv_with_jd (see query_openrouter_async)
+    
+    Args:
+        cv_text: CV text content (str or DocumentProfile)
+        jd_text: Job description text content (str or DocumentProfile)
+        lang: Language for analysis (en/fr)
         
-        # Enhanced analysis with document structure extraction if feature is enabled
-        enhanced_context = ""
-        if current_app.config.get('FEATURE_JOB_REQUIREMENTS_EXTRACTION', False):
-            try:
-                # Extract structured JD requirements
-                jd_requirements = extract_jd_requirements(jd_text)
-                cv_sections = extract_cv_sections(cv_text)
-                
-                if jd_requirements and any(reqs for reqs in jd_requirements.values()):
-                    enhanced_context += "\nStructured Job Requirements:\n"
-                    for category, reqs in jd_requirements.items():
-                        if reqs:
-                            enhanced_context += f"- {category.replace('_', ' ').title()}:\n"
-                            for req in reqs[:5]:  # Limit to top 5 items per category
-                                enhanced_context += f"  * {req}\n"
-                
-                if cv_sections:
-                    enhanced_context += "\nCV Structure:\n"
-                    for section_name, section_data in cv_sections.items():
-                        enhanced_context += f"- Section: {section_data['header']}\n"
-            except Exception as e:
-                current_app.logger.warning(f"Error extracting structured data: {e}")
+    Returns:
+        str: Analysis result comparing CV to job description
+    """
+    call = _start_call("cv_jd_match", lang)
+    try:
+        # Cache lookups hit SQLite; run them off the event loop
+        result, request = await asyncio.to_thread(_prepare_cv_jd_analysis, cv_text, jd_text, lang, call)
+        if request is None:
+            return result
+        return await _call_openrouter_async(request)
+            
+    except Exception as e:
+        current_app.logger.error(f"Error in CV-JD analysis: {e}")
+        call.fallback(f"error: {type(e).__name__}")
+        # Fall back to mock service on exception
+        return get_mock_analysis("cv_jd_match", lang)
+    finally:
+        _finish_call(call)
+
+def _stream_deltas(response, usage):
+    """
+    Yield the content deltas of an OpenRouter server-sent event stream
+
+    Args:
+        response: Streamed requests.Response
+        usage (dict): Filled with the token usage if the stream reports it
+    """
+    # Event streams rarely declare a charset; OpenRouter sends UTF-8
+    response.encoding = 'utf-8'
+    # chunk_size=None hands over each chunk as it arrives instead of filling a buffer first
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        # Blank lines separate events; lines starting with ':' are keep-alive comments
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            break
+        chunk = json.loads(data)
+        if chunk.get('error'):
+            raise RuntimeError(f"Stream error: {chunk['error'].get('message', chunk['error'])}")
+        if chunk.get('usage'):
+            usage.update(chunk['usage'])
+        delta = (chunk.get('choices') or [{}])[0].get('delta', {}).get('content')
+        if delta:
+            yield delta
+
+def stream_cv_jd_analysis(cv_text, jd_text, lang="en"):
+    """
+    Analyze CV against job description, yielding the analysis as it is generated
+    
+    Requests a streamed completion and yields each piece of text as it
+    arrives. Mock and cached results are yielded whole. The complete text
+    is cached like analyze_cv_with_jd's, so the two share cache entries.
+    
+    Args:
+        cv_text: CV text content (str or DocumentProfile)
+        jd_text: Job description text content (str or DocumentProfile)
+        lang: Language for analysis (en/fr)
         
-        # Select template based on language
-        template = FULL_PROMPT_TEMPLATE_FR if lang == "fr" else FULL_PROMPT_TEMPLATE_EN
+    Yields:
+        str: Successive pieces of the analysis
         
-        # Format the prompt with CV and JD text
-        # Truncate texts to avoid exceeding token limits
-        prompt = template.format(
-            cv_text=cv_text[:5000],
-            jd_text=jd_text[:3000]
-        )
+    Raises:
+        Exception: The stream failed after part of the analysis was yielded,
+                   so what was yielded is incomplete
+    """
+    streamed = False
+    response = request = router = None
+    flight = token = None
+    call = _start_call("cv_jd_match", lang, streamed=True)
+    try:
+        result, request = _prepare_cv_jd_analysis(cv_text, jd_text, lang, call)
+        if request is None:
+            yield result
+            return
         
-        # Add enhanced context if available
-        if enhanced_context:
-            prompt += f"\n\nAdditional Structured Analysis:\n{enhanced_context}"
+        # An identical analysis already in flight is waited for and sent whole
+        flight, token, result = _join_flight(request)
+        if flight is not None and token is None:
+            yield result
+            return
         
-        # OpenRouter API endpoint and parameters
-        api_url = current_app.config.get('OPENROUTER_API_URL', 'https://openrouter.ai/api/v1/chat/completions')
-        api_key = current_app.config.get('OPENROUTER_API_KEY', '')
+        # The fail-fast result is not shared; the token is abandoned below
+        result = _fail_fast(request)
+        if result is not None:
+            yield result
+            return
         
-        if not api_key:
-            current_app.logger.error("OpenRouter API key is missing")
-            return get_mock_analysis("cv_jd_match", lang)
+        # Streams are routed but not hedged: two streams cannot be merged
+        router, request, _ = _route(request)
+        request['payload']['stream'] = True
+        end = time.monotonic() + request['deadline']
+        call.status = 0
+        response = _post_openrouter(request, stream=True)
+        if response.status_code != 200:
+            if router is not None:
+                _record_route(router, request, False)
+                router = None
+            # The mock fallback is not shared; the token is abandoned below
+            yield _handle_response(request, response)
+            return
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "HTTP-Referer": "https://appop-demo.com",  # Update to your domain
-            "X-Title": "AppOp CV-JD Analysis"
-        }
+        call.model = request['payload']['model']
+        call.status = response.status_code
+        parts = []
+        usage = {}
+        for delta in _stream_deltas(response, usage):
+            if time.monotonic() > end:
+                raise TimeoutError(f"Stream exceeded {request['deadline']}s")
+            if not streamed:
+                call.ttfb_ms = (time.monotonic() - request['sent_at']) * 1000
+            parts.append(delta)
+            streamed = True
+            yield delta
+        call.set_usage(usage)
+        call.latency_ms = (time.monotonic() - request['sent_at']) * 1000
+        if router is not None:
+            _record_route(router, request, True)
+            router = None
         
-        payload = {
-            "model": current_app.config.get('DEFAULT_MODEL', 'meta-llama/llama-3-8b-instruct'),
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.7,
-            "max_tokens": 4000
-        }
+        content = "".join(parts)
+        # Prefix cache counters need the provider's usage, which not every stream reports
+        _log_prompt_tokens(request['payload'], {'usage': usage}, request['prefix'] if usage else None)
+        current_app.logger.info(f"Streamed {request['label']} response: {len(content)} chars")
+        _cache_result(request, content, usage)
+        if token is not None:
+            flight.publish(token, content)
+            token = None
         
-        current_app.logger.info(f"Sending CV-JD analysis request with {len(cv_text)} chars CV and {len(jd_text)} chars JD")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=120)
+    except Exception as e:
+        current_app.logger.error(f"Error in streamed CV-JD analysis: {e}")
+        # A stream that broke off counts against its model
+        if router is not None and 'sent_at' in request:
+            _record_route(router, request, False)
+        # Fall back to mock service unless part of the analysis was already
+        # sent; then the caller must not take the partial text as complete
+        if streamed:
+            call.fallback(f"stream_interrupted: {type(e).__name__}")
+            raise
+        else:
+            call.fallback(f"error: {type(e).__name__}")
+            yield get_mock_analysis("cv_jd_match", lang)
+    finally:
+        _finish_call(call)
+        if response is not None:
+            response.close()
+        # A stream that failed or was closed early has no result to share
+        if token is not None:
+            flight.abandon(token)
+
+def analyze_cv_batch(pairs, lang="en"):
+    """
+    Analyze many CV/JD pairs concurrently from one event loop
+
+    Must be called inside an app context and outside any running event loop
+    (e.g. from a batch job or worker thread).
+
+    Args:
+        pairs (list): (cv_text, jd_text) tuples
+        lang: Language for analysis (en/fr)
+
+    Returns:
+        list: Analysis results in the order of pairs
+    """
+    async def run_all():
+        try:
+            return await asyncio.gather(*(analyze_cv_with_jd_async(cv, jd, lang) for cv, jd in pairs))
+        finally:
+            await close_async_http_client()
+    return asyncio.run(run_all())
+
+def extract_jd_keywords(jd_text, categories=None):
+    """
+    Build the keyword list used for CV matching from a job description
+    
+    Args:
+        jd_text: Job description text content (str or DocumentProfile)
+        categories: Requirement categories to take keywords from
+                    (default: every category except 'other')
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-            current_app.logger.info(f"Received CV-JD analysis response: {len(content)} chars")
-            
-            # Cache the result if cache is available
-            if cache and content:
-                cache.set(cache_key, content, timeout=current_app.config.get('CACHE_DEFAULT_TIMEOUT', 300))
+    Returns:
+        list: Sorted unique keywords (single words and two-word terms)
+    """
+    # Extract requirements from job description
+    jd_requirements = extract_jd_requirements(jd_text)
+    
+    # Generic requirements are skipped unless asked for
+    categories = categories or [category for category in jd_requirements if category != 'other']
+    
+    # Create a list of all keywords from requirements
+    all_keywords = []
+    for category, requirements in jd_requirements.items():
+        if category in categories:
+            for req in requirements:
+                # Split requirement into individual words and filter out common words
+                words = [w for w, _, _ in tokenize(req) if len(w) > 3 and w not in COMMON_WORDS]
+                all_keywords.extend(words)
                 
-            return content
-        else:
-            current_app.logger.error(f"API request failed with status code {response.status_code}: {response.text}")
-            # Fall back to mock service when API request fails
-            return get_mock_analysis("cv_jd_match", lang)
-            
-    except Exception as e:
-        current_app.logger.error(f"Error in CV-JD analysis: {e}")
-        # Fall back to mock service on exception
-        return get_mock_analysis("cv_jd_match", lang)
+                # Also add multi-word technical terms
+                # This is a simplistic approach; more advanced NLP would be better
+                for i in range(len(words) - 1):
+                    all_keywords.append(f"{words[i]} {words[i+1]}")
+    
+    # Remove duplicates and sort
+    return sorted(set(all_keywords))
 
-def get_keyword_match_score(cv_text, jd_text):
+def get_jd_keyword_matcher(jd_text, categories=None):
+    """
+    Return the keyword matcher for a job description
+    
+    The automaton is built once per JD and kept on its document profile,
+    so scoring many CVs against the same posting only pays for one pass
+    per CV.
+    
+    Args:
+        jd_text: Job description text content (str or DocumentProfile)
+        categories: Requirement categories to match (see extract_jd_keywords)
+        
+    Returns:
+        KeywordMatcher: Matcher over the JD keywords
+    """
+    categories = tuple(categories) if categories else None
+    return get_document_profile(jd_text).memoize(
+        ('keyword_matcher', categories),
+        lambda profile: KeywordMatcher(extract_jd_keywords(profile, categories)))
+
+def get_keyword_match_score(cv_text, jd_text, matcher=None):
     """
     Calculate a simple keyword match score between CV and job description
     
     Args:
-        cv_text: CV text content
-        jd_text: Job description text content
+        cv_text: CV text content (str or DocumentProfile)
+        jd_text: Job description text content (str or DocumentProfile)
+        matcher: Optional prebuilt KeywordMatcher for jd_text (see get_jd_keyword_matcher)
         
     Returns:
-        dict: Match score data including percentage and matched keywords
+        dict: Match score data including percentage, matched keywords and,
+              per matched keyword, its count and (start, end) positions in the CV
     """
     try:
-        # Extract requirements from job description
-        jd_requirements = extract_jd_requirements(jd_text)
+        if matcher is None:
+            matcher = get_jd_keyword_matcher(jd_text)
+        all_keywords = matcher.keywords
         
-        # Create a list of all keywords from requirements
-        all_keywords = []
-        for category, requirements in jd_requirements.items():
-            if category != 'other':  # Skip generic requirements
-                for req in requirements:
-                    # Split requirement into individual words and filter out common words
-                    words = [w.lower() for w in req.split() if len(w) > 3 and w.lower() not in COMMON_WORDS]
-                    all_keywords.extend(words)
-                    
-                    # Also add multi-word technical terms
-                    # This is a simplistic approach; more advanced NLP would be better
-                    for i in range(len(words) - 1):
-                        all_keywords.append(f"{words[i]} {words[i+1]}")
-        
-        # Remove duplicates and sort
-        all_keywords = sorted(list(set(all_keywords)))
-        
-        # Count matches in CV
-        matched_keywords = []
-        cv_text_lower = cv_text.lower()
-        
-        for keyword in all_keywords:
-            if keyword in cv_text_lower:
-                matched_keywords.append(keyword)
+        # Find all keywords in the CV in a single pass (whole words only)
+        cv_profile = get_document_profile(cv_text)
+        matches = matcher.match(cv_profile.text, cv_profile.tokens)
+        matched_keywords = [keyword for keyword in all_keywords if keyword in matches]
         
         # Calculate match percentage
         match_percentage = 0
@@ -300,7 +1148,9 @@ def get_keyword_match_score(cv_text, jd_text):
             'match_percentage': match_percentage,
             'matched_keywords': matched_keywords,
             'total_keywords': len(all_keywords),
-            'matches_found': len(matched_keywords)
+            'matches_found': len(matched_keywords),
+            'keyword_counts': {keyword: matches[keyword]['count'] for keyword in matched_keywords},
+            'keyword_positions': {keyword: matches[keyword]['positions'] for keyword in matched_keywords}
         }
     
     except Exception as e:
@@ -310,9 +1160,61 @@ def get_keyword_match_score(cv_text, jd_text):
             'matched_keywords': [],
             'total_keywords': 0,
             'matches_found': 0,
+            'keyword_counts': {},
+            'keyword_positions': {},
             'error': str(e)
         }
 
+def _terms(text):
+    """Token strings of a text or DocumentProfile, without caching new profiles"""
+    tokens = text.tokens if isinstance(text, DocumentProfile) else tokenize(text or "")
+    return [token for token, _, _ in tokens]
+
+def get_batch_match_scores(cv_texts, jd_texts, method=None):
+    """
+    Score many CVs against many job descriptions at once
+    
+    All documents share one sparse term matrix and are scored with a
+    single matrix product (see services.batch_scoring), which is what to
+    use for ranking a pool of applicants instead of calling
+    get_keyword_match_score per pair.
+    
+    Args:
+        cv_texts: List of CV texts (str or DocumentProfile), M entries
+        jd_texts: List of job description texts (str or DocumentProfile), N entries
+        method: 'bm25' or 'tfidf' (defaults to BATCH_SCORING_METHOD)
+        
+    Returns:
+        numpy.ndarray: M x N match scores between 0 and 100, rows following
+                       cv_texts and columns following jd_texts
+    """
+    method = method or current_app.config.get('BATCH_SCORING_METHOD', 'bm25')
+    try:
+        current_app.logger.info(f"Scoring {len(cv_texts)} CVs against {len(jd_texts)} job descriptions ({method})")
+        return score_matrix([_terms(text) for text in cv_texts],
+                            [_terms(text) for text in jd_texts],
+                            method=method, stop_words=COMMON_WORDS).round(1)
+    except Exception as e:
+        current_app.logger.error(f"Error calculating batch match scores: {e}")
+        return np.zeros((len(cv_texts), len(jd_texts)))
+
+def rank_cvs_for_job(cv_texts, jd_text, method=None, top_k=None):
+    """
+    Rank CVs by how well they match one job description
+    
+    Args:
+        cv_texts: List of CV texts (str or DocumentProfile)
+        jd_text: Job description text (str or DocumentProfile)
+        method: 'bm25' or 'tfidf' (defaults to BATCH_SCORING_METHOD)
+        top_k: Only return the best top_k CVs
+        
+    Returns:
+        list: (cv index, score) tuples, best match first
+    """
+    scores = get_batch_match_scores(cv_texts, [jd_text], method=method)[:, 0]
+    order = np.argsort(-scores, kind='stable')[:top_k]
+    return [(int(index), float(scores[index])) for index in order]
+
 # List of common words to exclude from keyword matching
 COMMON_WORDS = {
     'the', 'and', 'that', 'have', 'for', 'not', 'with', 'you', 'this',
@@ -321,5 +1223,9 @@ COMMON_WORDS = {
     'these', 'some', 'such', 'what', 'when', 'make', 'like', 'time', 'just',
     'year', 'only', 'also', 'work', 'over', 'very', 'even', 'most', 'take',
     'experience', 'role', 'team', 'position', 'candidate', 'job', 'company',
-    'responsibilities', 'requirements'
+    'responsibilities', 'requirements',
+    # Qualifiers that surround requirements rather than name them
+    'years', 'strong', 'knowledge', 'familiarity', 'understanding', 'ability',
+    'proven', 'solid', 'good', 'excellent', 'working', 'degree', 'related',
+    'field', 'equivalent', 'preferred', 'required', 'including', 'must'
 }
\ No newline at end of file
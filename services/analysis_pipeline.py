@@ -0,0 +1,208 @@
+"""
+Analysis pipeline helpers shared by the upload views.
+"""
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from services.pdf_service import extract_pdf_document, extraction_budget, extract_jd_requirements
+from services.ai_service import analyze_cv_with_jd, stream_cv_jd_analysis
+from services.job_queue import get_job
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Narratives being generated (or recently finished) in this process
+_narratives = OrderedDict()
+_narratives_lock = threading.Lock()
+
+def get_executor():
+    """Return the bounded thread pool used to run pipeline stages concurrently"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('ANALYSIS_EXECUTOR_WORKERS', 4),
+                thread_name_prefix='analysis'
+            )
+        return _executor
+
+def _process_resume(app, resume_data):
+    """Extract the resume and its CV sections"""
+    with app.app_context():
+        document = extract_pdf_document(resume_data, **extraction_budget())
+        return {'text': document['text'], 'sections': document['sections']}
+
+def _process_job_description(app, job_data):
+    """Extract the job description and parse its requirements"""
+    with app.app_context():
+        document = extract_pdf_document(job_data, **extraction_budget())
+        return {'text': document['text'], 'requirements': extract_jd_requirements(document['text'])}
+
+def extract_documents(resume_data, job_data):
+    """
+    Extract and parse the resume and job description concurrently
+
+    Each document is extracted and then immediately parsed in its own task,
+    so structural parsing of one document overlaps extraction of the other
+    and the total time approaches that of the slower document.
+
+    Args:
+        resume_data: Raw resume PDF bytes (see pdf_service.read_upload)
+        job_data: Raw job description PDF bytes
+
+    Returns:
+        dict: {'resume': {'text', 'sections'}, 'job': {'text', 'requirements'}}
+    """
+    app = current_app._get_current_object()
+    executor = get_executor()
+    resume_future = executor.submit(_process_resume, app, resume_data)
+    job_future = executor.submit(_process_job_description, app, job_data)
+    return {'resume': resume_future.result(), 'job': job_future.result()}
+
+class _Narrative:
+    """A report's LLM narrative, readable while it is still being generated"""
+
+    def __init__(self):
+        self.chunks = []
+        self.status = 'pending'
+        self.condition = threading.Condition()
+
+    def append(self, text):
+        with self.condition:
+            self.chunks.append(text)
+            self.condition.notify_all()
+
+    def finish(self, status):
+        with self.condition:
+            self.status = status
+            self.condition.notify_all()
+
+    def snapshot(self, start=0, timeout=None):
+        """
+        Chunks from index start onwards and the current status, waiting up to
+        timeout seconds for new text or completion if there is none yet
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.chunks) > start or self.status != 'pending', timeout)
+            return self.chunks[start:], self.status
+
+def _generate_narrative(app, narrative, report_id, cv_text, jd_text, lang):
+    with app.app_context():
+        try:
+            if current_app.config.get('NARRATIVE_STREAMING_ENABLED', True):
+                for chunk in stream_cv_jd_analysis(cv_text, jd_text, lang=lang):
+                    narrative.append(chunk)
+            else:
+                narrative.append(analyze_cv_with_jd(cv_text, jd_text, lang=lang))
+        except Exception as e:
+            current_app.logger.error(f"Narrative for report {report_id} failed: {e}")
+            narrative.finish('error')
+            return
+        narrative.finish('done')
+
+def run_narrative(report_id, cv_text, jd_text, lang="en"):
+    """
+    Generate the LLM analysis for a report in the calling thread
+    
+    Readers can follow the narrative with get_narrative / follow_narrative
+    while it is generated. The caller stores the finished text with its
+    job's result, where other workers read it back.
+    
+    Args:
+        report_id: Report the narrative belongs to
+        cv_text: CV text content
+        jd_text: Job description text content
+        lang: Language for analysis (en/fr)
+        
+    Returns:
+        tuple: (status, markdown) with status 'done' or 'error'; markdown
+               is only set when done
+    """
+    narrative = _Narrative()
+    with _narratives_lock:
+        _narratives[report_id] = narrative
+        while len(_narratives) > current_app.config.get('NARRATIVE_STORE_SIZE', 512):
+            _narratives.popitem(last=False)
+    _generate_narrative(current_app._get_current_object(), narrative, report_id, cv_text, jd_text, lang)
+    return narrative.status, ("".join(narrative.chunks) if narrative.status == 'done' else None)
+
+def _saved_narrative(report_id):
+    """Narrative stored with a finished analysis job, possibly by another worker"""
+    job = get_job(report_id)
+    if job is None:
+        return None
+    return (job['result'] or {}).get('narrative')
+
+def _generating_elsewhere(report_id):
+    """Whether the report's analysis job is still working towards its narrative in some process"""
+    job = get_job(report_id)
+    if job is None or job['status'] not in ('queued', 'running'):
+        return False
+    return job['stages'].get('narrative', {}).get('status') in ('pending', 'running')
+
+def get_narrative(report_id):
+    """
+    Look up the background LLM analysis for a report
+    
+    Narratives being generated are held in the process running their job;
+    finished ones are also read back from the job's result, and one
+    still being generated by another process is reported as pending.
+    
+    Args:
+        report_id: Report ID passed to start_narrative
+        
+    Returns:
+        tuple: (status, markdown) with status 'pending', 'done', 'error'
+               or 'unavailable'; markdown is only set when done
+    """
+    with _narratives_lock:
+        narrative = _narratives.get(report_id)
+    if narrative is None:
+        saved = _saved_narrative(report_id)
+        if saved is not None:
+            return 'done', saved
+        return ('pending', None) if _generating_elsewhere(report_id) else ('unavailable', None)
+    chunks, status = narrative.snapshot(timeout=0)
+    return status, ("".join(chunks) if status == 'done' else None)
+
+def follow_narrative(report_id, heartbeat=15):
+    """
+    Follow a report's LLM analysis as it is generated
+    
+    Args:
+        report_id: Report ID passed to start_narrative
+        heartbeat: Seconds to wait for new text before yielding a 'ping'
+        
+    Yields:
+        tuple: ('delta', text) for each new piece of the narrative, ('ping', None)
+               while waiting, then a final ('done' | 'error' | 'unavailable', None)
+    """
+    with _narratives_lock:
+        narrative = _narratives.get(report_id)
+    if narrative is None:
+        # Generated by another process: wait for it to be stored with the job
+        while True:
+            saved = _saved_narrative(report_id)
+            if saved is not None:
+                yield 'delta', saved
+                yield 'done', None
+                return
+            if not _generating_elsewhere(report_id):
+                yield 'unavailable', None
+                return
+            yield 'ping', None
+            time.sleep(min(heartbeat, 2))
+    
+    sent = 0
+    while True:
+        chunks, status = narrative.snapshot(sent, timeout=heartbeat)
+        sent += len(chunks)
+        if chunks:
+            yield 'delta', "".join(chunks)
+        if status != 'pending':
+            yield status, None
+            return
+        if not chunks:
+            yield 'ping', None
@@ -0,0 +1,137 @@
+"""
+Vectorized CV-vs-JD scoring for ranking many applicants at once.
+
+Documents are turned into sparse document-term matrices over one shared
+vocabulary and every CV is scored against every job description with a
+single sparse matrix product, so scoring M CVs against N JDs costs one
+pass over the tokens rather than M x N pairwise comparisons.
+"""
+import numpy as np
+from scipy import sparse
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def term_matrix(token_lists, stop_words=(), min_length=3):
+    """
+    Build a sparse document-term count matrix over a shared vocabulary
+
+    Args:
+        token_lists (list): One list of lowercase tokens per document
+        stop_words: Tokens to leave out of the vocabulary
+        min_length (int): Shortest token kept
+
+    Returns:
+        tuple: (csr_matrix of shape documents x terms, list of terms by column)
+    """
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    vocabulary = {}
+    term_ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary))
+                            for tokens in token_lists for token in tokens),
+                           dtype=np.int64, count=int(lengths.sum()))
+    doc_ids = np.repeat(np.arange(len(token_lists)), lengths)
+    terms = list(vocabulary)
+
+    # Drop stop words and short tokens by column, then renumber the rest
+    stop_words = set(stop_words)
+    keep = np.fromiter((len(term) >= min_length and term not in stop_words for term in terms),
+                       dtype=bool, count=len(terms))
+    new_ids = np.cumsum(keep) - 1
+    kept = keep[term_ids]
+
+    counts = sparse.csr_matrix(
+        (np.ones(int(kept.sum()), dtype=np.float64), (doc_ids[kept], new_ids[term_ids[kept]])),
+        shape=(len(token_lists), int(keep.sum()))
+    )
+    counts.sum_duplicates()
+    return counts, [term for term, kept_term in zip(terms, keep) if kept_term]
+
+def bm25_scores(cv_counts, jd_counts, k1=BM25_K1, b=BM25_B):
+    """
+    Score CVs against JDs with BM25, each JD's distinct terms being the query
+
+    IDF is taken over the CV collection. Scores are divided by the best
+    score achievable for each JD (every query term present with saturated
+    frequency), giving 0-100 values comparable across job descriptions.
+
+    Args:
+        cv_counts: csr_matrix of CV term counts (M x V)
+        jd_counts: csr_matrix of JD term counts (N x V), same vocabulary
+
+    Returns:
+        numpy.ndarray: M x N scores between 0 and 100
+    """
+    n_cvs = cv_counts.shape[0]
+    doc_freq = np.asarray((cv_counts > 0).sum(axis=0)).ravel()
+    idf = np.log1p((n_cvs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    lengths = np.asarray(cv_counts.sum(axis=1)).ravel()
+    avg_length = lengths.mean() if n_cvs and lengths.mean() else 1.0
+    norm = k1 * (1 - b + b * lengths / avg_length)
+
+    # Saturate term frequencies on the stored entries only
+    weights = cv_counts.tocsr(copy=True)
+    row_norm = np.repeat(norm, np.diff(weights.indptr))
+    weights.data = weights.data * (k1 + 1) / (weights.data + row_norm)
+    weights = weights.multiply(idf).tocsr()
+
+    query = (jd_counts > 0).astype(np.float64)
+    scores = np.asarray((weights @ query.T).todense())
+    best = np.asarray(query.multiply(idf).sum(axis=1)).ravel() * (k1 + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(best > 0, scores / best, 0.0)
+    return scores * 100
+
+def tfidf_scores(cv_counts, jd_counts):
+    """
+    Cosine similarity of TF-IDF vectors for every CV/JD pair
+
+    IDF is smoothed and taken over all CVs and JDs together.
+
+    Args:
+        cv_counts: csr_matrix of CV term counts (M x V)
+        jd_counts: csr_matrix of JD term counts (N x V), same vocabulary
+
+    Returns:
+        numpy.ndarray: M x N scores between 0 and 100
+    """
+    n_docs = cv_counts.shape[0] + jd_counts.shape[0]
+    doc_freq = (np.asarray((cv_counts > 0).sum(axis=0)).ravel() +
+                np.asarray((jd_counts > 0).sum(axis=0)).ravel())
+    idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+
+    def normalized(counts):
+        weighted = counts.multiply(idf).tocsr()
+        row_norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        row_norms[row_norms == 0] = 1.0
+        return sparse.diags(1 / row_norms) @ weighted
+
+    return np.asarray((normalized(cv_counts) @ normalized(jd_counts).T).todense()) * 100
+
+SCORERS = {
+    'bm25': bm25_scores,
+    'tfidf': tfidf_scores,
+}
+
+def score_matrix(cv_tokens, jd_tokens, method='bm25', stop_words=()):
+    """
+    Score every CV against every job description
+
+    Args:
+        cv_tokens (list): One token list per CV (M)
+        jd_tokens (list): One token list per job description (N)
+        method (str): 'bm25' or 'tfidf'
+        stop_words: Tokens to ignore
+
+    Returns:
+        numpy.ndarray: M x N scores between 0 and 100
+    """
+    if method not in SCORERS:
+        raise ValueError(f"Unknown scoring method: {method}")
+    if not cv_tokens or not jd_tokens:
+        return np.zeros((len(cv_tokens), len(jd_tokens)))
+
+    counts, _ = term_matrix(list(cv_tokens) + list(jd_tokens), stop_words=stop_words)
+    cv_counts, jd_counts = counts[:len(cv_tokens)], counts[len(cv_tokens):]
+    return SCORERS[method](cv_counts, jd_counts)
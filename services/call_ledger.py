@@ -0,0 +1,269 @@
+"""
+Ledger of LLM calls for latency, token and cache telemetry.
+
+Each analysis request produces one LLMCall record: the model that
+answered, analysis type and language, token usage, time to first byte,
+upstream latency (from sending the request to its last byte), end-to-end
+time, how the cache served it and, when the fallback analysis was
+returned, why. Records are buffered in memory and written to a local
+SQLite file in batches by a background thread, so the request path never
+waits on the disk. Aggregate queries over the file answer questions such
+as p95 latency per model, tokens per analysis and cache hit ratio.
+"""
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from services.sqlite_store import SQLiteStore, get_store
+
+# Cache outcomes: exact hit, approximate (near-duplicate) hit, miss, or the
+# result of an identical request already in flight
+CACHE_OUTCOMES = ('hit', 'near_hit', 'miss', 'coalesced')
+
+COLUMNS = ('at', 'model', 'prompt_type', 'lang', 'streamed', 'cache', 'status', 'prompt_tokens',
+           'completion_tokens', 'ttfb_ms', 'latency_ms', 'total_ms', 'hedged', 'fallback_reason')
+
+class LLMCall:
+    """
+    Telemetry of one analysis request, filled in as the request proceeds
+
+    Args:
+        prompt_type (str): Type of analysis
+        lang (str): Language for analysis (en/fr)
+        model (str): Model requested; replaced by the model that answered
+        streamed (bool): Whether the analysis was streamed
+    """
+
+    def __init__(self, prompt_type, lang, model=None, streamed=False):
+        self.at = time.time()
+        self.started = time.monotonic()
+        self.prompt_type = prompt_type
+        self.lang = lang
+        self.model = model
+        self.streamed = streamed
+        self.cache = None
+        self.status = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.ttfb_ms = None
+        # Upstream latency of the answering call, set when its response ends
+        self.latency_ms = None
+        self.total_ms = None
+        self.hedged = False
+        self.fallback_reason = None
+
+    def fallback(self, reason):
+        """Note why the fallback analysis was returned (the first reason wins)"""
+        if self.fallback_reason is None:
+            self.fallback_reason = reason
+
+    def set_usage(self, usage):
+        """Take the token counts from a provider usage report"""
+        if usage:
+            self.prompt_tokens = usage.get('prompt_tokens')
+            self.completion_tokens = usage.get('completion_tokens')
+
+    def finish(self):
+        """Stop the end-to-end clock and return the record as a ledger row"""
+        if self.total_ms is None:
+            self.total_ms = (time.monotonic() - self.started) * 1000
+        return tuple(getattr(self, column) for column in COLUMNS)
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list, or None"""
+    if not values:
+        return None
+    return round(values[min(int(fraction * len(values)), len(values) - 1)], 1)
+
+class CallLedger(SQLiteStore):
+    """
+    Buffered SQLite store of LLM call records
+
+    Args:
+        path (str): SQLite file
+        flush_interval (float): Seconds between background writes
+        batch_size (int): Buffered records that trigger an early write
+        retention (float): Seconds records are kept
+        logger: Logger for write failures
+    """
+
+    def __init__(self, path, flush_interval=5.0, batch_size=200, retention=30 * 24 * 3600, logger=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.logger = logger
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._last_purge = 0.0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    at REAL NOT NULL,
+                    model TEXT,
+                    prompt_type TEXT,
+                    lang TEXT,
+                    streamed INTEGER NOT NULL DEFAULT 0,
+                    cache TEXT,
+                    status INTEGER,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    ttfb_ms REAL,
+                    latency_ms REAL,
+                    total_ms REAL,
+                    hedged INTEGER NOT NULL DEFAULT 0,
+                    fallback_reason TEXT
+                )
+            """)
+            # Ledgers written before total_ms was recorded
+            if 'total_ms' not in [row[1] for row in conn.execute("PRAGMA table_info(llm_calls)")]:
+                conn.execute("ALTER TABLE llm_calls ADD COLUMN total_ms REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_calls_at ON llm_calls (at)")
+        atexit.register(self.flush)
+
+    def record(self, call):
+        """Buffer a finished LLMCall for the next write"""
+        row = call.finish()
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+            # Threads do not survive a fork; a forked worker starts its own writer
+            if self._thread is None or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='llm-ledger', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write buffered records now"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        f"INSERT INTO llm_calls ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows
+                    )
+                    if time.monotonic() - self._last_purge > 3600:
+                        self._last_purge = time.monotonic()
+                        conn.execute("DELETE FROM llm_calls WHERE at < ?", (time.time() - self.retention,))
+            except sqlite3.Error as e:
+                # Telemetry must never break analyses; the batch is dropped
+                if self.logger:
+                    self.logger.warning(f"Could not write {len(rows)} LLM call records: {e}")
+
+    def summary(self, since=None):
+        """
+        Aggregate the calls recorded since a time
+
+        Args:
+            since (float): Unix time to start from (defaults to 24 hours ago)
+
+        Returns:
+            dict: {'since', 'calls', 'cache': {outcome: count, 'hit_ratio'},
+                   'fallbacks': {reason: count}, 'models': {model: {...}},
+                   'prompt_types': {prompt_type: {...}}}
+        """
+        since = time.time() - 24 * 3600 if since is None else since
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT model, prompt_type, cache, status, prompt_tokens, completion_tokens, ttfb_ms, latency_ms, "
+                "total_ms, hedged, fallback_reason FROM llm_calls WHERE at >= ?", (since,)
+            ).fetchall()
+
+        cache = dict.fromkeys(CACHE_OUTCOMES, 0)
+        fallbacks = {}
+        models = {}
+        prompt_types = {}
+        for (model, prompt_type, outcome, status, prompt_tokens, completion_tokens, ttfb, latency, total,
+             hedged, reason) in rows:
+            if outcome in cache:
+                cache[outcome] += 1
+            if reason:
+                fallbacks[reason] = fallbacks.get(reason, 0) + 1
+            per_type = prompt_types.setdefault(prompt_type, {'calls': 0, 'tokens': [], 'total': []})
+            per_type['calls'] += 1
+            if total is not None:
+                per_type['total'].append(total)
+            if prompt_tokens is not None or completion_tokens is not None:
+                per_type['tokens'].append((prompt_tokens or 0) + (completion_tokens or 0))
+            # Model figures describe upstream calls only
+            if status is None:
+                continue
+            per_model = models.setdefault(model, {'calls': 0, 'errors': 0, 'hedged': 0, 'latency': [], 'ttfb': [],
+                                                  'prompt_tokens': [], 'completion_tokens': []})
+            per_model['calls'] += 1
+            per_model['errors'] += status != 200
+            per_model['hedged'] += bool(hedged)
+            for key, value in (('latency', latency), ('ttfb', ttfb), ('prompt_tokens', prompt_tokens),
+                               ('completion_tokens', completion_tokens)):
+                if value is not None:
+                    per_model[key].append(value)
+
+        looked_up = sum(cache.values())
+        served = cache['hit'] + cache['near_hit'] + cache['coalesced']
+        return {
+            'since': since,
+            'calls': len(rows),
+            'cache': dict(cache, hit_ratio=round(served / looked_up, 3) if looked_up else None),
+            'fallbacks': dict(sorted(fallbacks.items(), key=lambda item: -item[1])),
+            'models': {model: self._model_summary(figures) for model, figures in models.items()},
+            'prompt_types': {
+                prompt_type: {
+                    'calls': figures['calls'],
+                    'avg_tokens': round(sum(figures['tokens']) / len(figures['tokens'])) if figures['tokens'] else None,
+                    'total_p50_ms': _percentile(sorted(figures['total']), 0.5),
+                    'total_p95_ms': _percentile(sorted(figures['total']), 0.95),
+                }
+                for prompt_type, figures in prompt_types.items()
+            },
+        }
+
+    @staticmethod
+    def _model_summary(figures):
+        latency = sorted(figures['latency'])
+        ttfb = sorted(figures['ttfb'])
+        average = lambda values: round(sum(values) / len(values)) if values else None
+        return {
+            'calls': figures['calls'],
+            'error_rate': round(figures['errors'] / figures['calls'], 3),
+            'hedged': figures['hedged'],
+            'latency_p50_ms': _percentile(latency, 0.5),
+            'latency_p95_ms': _percentile(latency, 0.95),
+            'ttfb_p50_ms': _percentile(ttfb, 0.5),
+            'ttfb_p95_ms': _percentile(ttfb, 0.95),
+            'avg_prompt_tokens': average(figures['prompt_tokens']),
+            'avg_completion_tokens': average(figures['completion_tokens']),
+        }
+
+    def recent(self, limit=50):
+        """
+        Most recent call records, newest first
+
+        Returns:
+            list: dicts keyed by column name
+        """
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM llm_calls ORDER BY at DESC LIMIT ?",
+                                (limit,)).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+def get_call_ledger(path, **options):
+    """Return the process-wide CallLedger for a given file path"""
+    return get_store(CallLedger, path, path, **options)
@@ -0,0 +1,197 @@
+"""
+Circuit breaker for the upstream LLM API, shared by all worker processes.
+
+While the upstream is healthy the circuit is closed and calls go through.
+When too many recent calls fail or time out, the circuit opens: calls
+fail fast to the degraded path instead of each waiting out its deadline
+and tying up a worker. After a cool-down the circuit is half-open and
+lets a single probe call through; its success closes the circuit, its
+failure opens it again. State and recent outcomes live in a small SQLite
+file so every worker sees the same circuit.
+"""
+import os
+import time
+from services.sqlite_store import SQLiteStore, get_store
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+OUTCOMES = ('ok', 'error', 'timeout')
+
+class CircuitBreaker(SQLiteStore):
+    """
+    Closed / open / half-open breaker driven by error and timeout rates
+
+    Args:
+        path (str): SQLite file shared by all workers
+        name (str): Circuit name (one per upstream)
+        window (float): Seconds of call outcomes the rates are computed over
+        min_calls (int): Calls in the window before the circuit may open
+        error_threshold (float): Share of failed calls (errors and timeouts)
+                                 that opens the circuit
+        timeout_threshold (float): Share of timed-out calls that opens the
+                                   circuit on its own
+        open_seconds (float): Cool-down before a probe is let through
+        probe_timeout (float): Seconds a probe may take before another
+                               worker may probe instead
+    """
+
+    def __init__(self, path, name='openrouter', window=60, min_calls=10, error_threshold=0.5,
+                 timeout_threshold=0.3, open_seconds=30, probe_timeout=120):
+        self.path = path
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.timeout_threshold = timeout_threshold
+        self.open_seconds = open_seconds
+        self.probe_timeout = probe_timeout
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS circuits (
+                    name TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    changed_at REAL NOT NULL,
+                    probe_until REAL,
+                    reason TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS circuit_calls (
+                    name TEXT NOT NULL,
+                    at REAL NOT NULL,
+                    outcome TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_circuit_calls ON circuit_calls (name, at)")
+            conn.execute("INSERT OR IGNORE INTO circuits (name, state, changed_at) VALUES (?, ?, ?)",
+                         (name, CLOSED, time.time()))
+
+    def _set_state(self, conn, state, reason=None, probe_until=None):
+        conn.execute("UPDATE circuits SET state = ?, changed_at = ?, probe_until = ?, reason = ? WHERE name = ?",
+                     (state, time.time(), probe_until, reason, self.name))
+        if state == CLOSED:
+            # Start the closed circuit with a clean slate
+            conn.execute("DELETE FROM circuit_calls WHERE name = ?", (self.name,))
+
+    def allow(self):
+        """
+        Decide whether a call may go upstream
+
+        Returns:
+            bool: True when the circuit is closed, or when this call is the
+                  half-open probe; False when the caller should fail fast
+        """
+        now = time.time()
+        with self._connect() as conn:
+            state, changed_at, probe_until = conn.execute(
+                "SELECT state, changed_at, probe_until FROM circuits WHERE name = ?", (self.name,)
+            ).fetchone()
+            if state == CLOSED:
+                return True
+            if state == OPEN and now < changed_at + self.open_seconds:
+                return False
+            if state == HALF_OPEN and probe_until is not None and now < probe_until:
+                return False
+            # Claim the probe; re-check under the write lock so only one worker gets it
+            conn.execute("BEGIN IMMEDIATE")
+            state, changed_at, probe_until = conn.execute(
+                "SELECT state, changed_at, probe_until FROM circuits WHERE name = ?", (self.name,)
+            ).fetchone()
+            if state == CLOSED:
+                return True
+            if (state == OPEN and now < changed_at + self.open_seconds) or \
+                    (state == HALF_OPEN and probe_until is not None and now < probe_until):
+                return False
+            self._set_state(conn, HALF_OPEN, reason="Probing for recovery", probe_until=now + self.probe_timeout)
+            return True
+
+    def record(self, outcome):
+        """
+        Record how an upstream call went
+
+        Args:
+            outcome (str): 'ok', 'error' or 'timeout'
+
+        Returns:
+            str: The circuit state after the call
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            state = conn.execute("SELECT state FROM circuits WHERE name = ?", (self.name,)).fetchone()[0]
+            if state == HALF_OPEN:
+                if outcome == 'ok':
+                    self._set_state(conn, CLOSED)
+                    return CLOSED
+                self._set_state(conn, OPEN, reason=f"Probe failed ({outcome})")
+                return OPEN
+            if state == OPEN:
+                # A call let through before the circuit opened; it says nothing new
+                return OPEN
+            conn.execute("INSERT INTO circuit_calls (name, at, outcome) VALUES (?, ?, ?)", (self.name, now, outcome))
+            conn.execute("DELETE FROM circuit_calls WHERE name = ? AND at < ?", (self.name, now - self.window))
+            counts = self._counts(conn, now)
+            calls = sum(counts.values())
+            if calls < self.min_calls:
+                return CLOSED
+            failed = (counts['error'] + counts['timeout']) / calls
+            timed_out = counts['timeout'] / calls
+            if failed >= self.error_threshold or timed_out >= self.timeout_threshold:
+                self._set_state(conn, OPEN, reason=f"{failed:.0%} of {calls} calls failed, "
+                                                   f"{timed_out:.0%} timed out in the last {self.window}s")
+                return OPEN
+            return CLOSED
+
+    def _counts(self, conn, now):
+        counts = dict.fromkeys(OUTCOMES, 0)
+        counts.update(conn.execute(
+            "SELECT outcome, COUNT(*) FROM circuit_calls WHERE name = ? AND at >= ? GROUP BY outcome",
+            (self.name, now - self.window)
+        ).fetchall())
+        return counts
+
+    def snapshot(self):
+        """
+        Current state for monitoring
+
+        Returns:
+            dict: {'name', 'state', 'since', 'reason', 'retry_at', 'window',
+                   'calls', 'errors', 'timeouts', 'error_rate', 'timeout_rate'}
+        """
+        now = time.time()
+        with self._connect() as conn:
+            state, changed_at, probe_until, reason = conn.execute(
+                "SELECT state, changed_at, probe_until, reason FROM circuits WHERE name = ?", (self.name,)
+            ).fetchone()
+            counts = self._counts(conn, now)
+        calls = sum(counts.values())
+        retry_at = None
+        if state == OPEN:
+            retry_at = changed_at + self.open_seconds
+        elif state == HALF_OPEN:
+            retry_at = probe_until
+        return {
+            'name': self.name,
+            'state': state,
+            'since': changed_at,
+            'reason': reason,
+            'retry_at': retry_at,
+            'window': self.window,
+            'calls': calls,
+            'errors': counts['error'],
+            'timeouts': counts['timeout'],
+            'error_rate': round((counts['error'] + counts['timeout']) / calls, 3) if calls else 0.0,
+            'timeout_rate': round(counts['timeout'] / calls, 3) if calls else 0.0,
+        }
+
+    def reset(self):
+        """Close the circuit by hand, e.g. once the upstream is known to be back"""
+        with self._connect() as conn:
+            self._set_state(conn, CLOSED, reason="Reset by an administrator")
+
+def get_circuit_breaker(path, name='openrouter', **options):
+    """Return the process-wide CircuitBreaker for a file path and circuit name"""
+    return get_store(CircuitBreaker, (path, name), path, name, **options)
@@ -0,0 +1,152 @@
+"""
+Content-addressed cache for PDF extraction results.
+
+Entries are keyed by a SHA-256 of the raw upload bytes plus the extraction
+options and extractor version, and stored in a small SQLite file so every
+worker process shares them and they survive restarts. The cache is bounded
+by total stored size and evicts least recently used entries first.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from services.sqlite_store import SQLiteStore, get_store
+
+def make_cache_key(data, preserve_layout, extractor_version, budget=None):
+    """
+    Build the content-addressed key for an extraction result
+
+    Args:
+        data: Raw PDF bytes
+        preserve_layout: Layout flag passed to the extractor
+        extractor_version: Version string of the extraction code
+        budget: Optional (max_chars, max_pages) of a budgeted extraction,
+            so partial results never stand in for full ones
+
+    Returns:
+        str: Cache key
+    """
+    digest = hashlib.sha256(bytes(data)).hexdigest()
+    key = f"{extractor_version}:{int(bool(preserve_layout))}:{digest}"
+    if budget and any(budget):
+        key += ":budget=" + ",".join(str(limit or '') for limit in budget)
+    return key
+
+class ExtractionCache(SQLiteStore):
+    """Disk-backed, size-bounded LRU cache of extracted text and sections"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extraction_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    sections TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_access ON extraction_cache (last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extraction_cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    def _bump(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO extraction_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def get(self, key):
+        """
+        Look up an extraction result
+
+        Args:
+            key: Key from make_cache_key
+
+        Returns:
+            dict or None: {'text': str, 'sections': dict} on a hit, None on a miss
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT text, sections FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump(conn, 'misses')
+                return None
+            conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._bump(conn, 'hits')
+        return {'text': row[0], 'sections': json.loads(row[1])}
+
+    def set(self, key, text, sections):
+        """
+        Store an extraction result and evict old entries if over budget
+
+        Args:
+            key: Key from make_cache_key
+            text: Extracted text
+            sections: Section data (JSON-serialisable)
+        """
+        sections_json = json.dumps(sections)
+        size = len(text.encode('utf-8')) + len(sections_json.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, text, sections, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text, sections_json, size, now, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM extraction_cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._bump(conn, 'evictions', evicted)
+
+    def stats(self):
+        """
+        Return cache counters
+
+        Returns:
+            dict: hits, misses, evictions, entries and total stored bytes
+        """
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM extraction_cache_stats").fetchall())
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()
+        return {
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'size_bytes': total,
+            'max_bytes': self.max_bytes
+        }
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM extraction_cache")
+            conn.execute("DELETE FROM extraction_cache_stats")
+
+def get_extraction_cache(path, max_bytes):
+    """Return the process-wide ExtractionCache for a given file path"""
+    return get_store(ExtractionCache, path, path, max_bytes)
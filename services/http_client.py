@@ -0,0 +1,265 @@
+"""
+Pooled HTTP client for the upstream LLM API.
+
+Each worker process keeps one requests.Session whose connection pool holds
+keep-alive connections to the API host, so consecutive calls reuse an open
+TCP/TLS connection instead of paying for a new handshake. Transient
+failures (rate limiting, 5xx, dropped connections) are retried with
+jittered exponential backoff, honoring Retry-After, within a total
+deadline per call.
+
+AsyncHttpClient is the asyncio counterpart: one httpx client per event
+loop, with a semaphore bounding how many calls are in flight at once so a
+batch can overlap many network waits without a thread per request.
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import importlib.util
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: timeouts, rate limiting and upstream/gateway errors
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# httpx negotiates HTTP/2 only when the h2 package is installed
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+def retry_after_seconds(response):
+    """
+    Delay requested by a response's Retry-After header
+
+    Args:
+        response: requests.Response or httpx.Response
+
+    Returns:
+        float: Seconds to wait, or None when the header is absent or invalid
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class HttpClient:
+    """
+    Keep-alive session with a sized connection pool and retrying POSTs
+
+    Args:
+        pool_connections (int): Number of hosts to keep pools for
+        pool_maxsize (int): Connections kept alive per host; size it to the
+                            number of threads making concurrent calls
+        connect_timeout (float): Seconds allowed to open a connection
+        max_retries (int): Retries after the first attempt
+        backoff_base (float): First backoff ceiling in seconds
+        backoff_max (float): Largest backoff ceiling in seconds
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, connect_timeout=5,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        # Retries are handled here, where Retry-After and the deadline are known
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post_json(self, url, payload, headers=None, deadline=60, logger=None, stream=False):
+        """
+        POST a JSON payload, retrying transient failures until the deadline
+
+        Args:
+            url (str): Endpoint
+            payload (dict): JSON body
+            headers (dict): Request headers
+            deadline (float): Total seconds for all attempts and waits
+            logger: Logger for retry warnings
+            stream (bool): Return as soon as the headers arrive and leave the
+                           body to be read incrementally; only failures before
+                           the body starts are retried
+
+        Returns:
+            requests.Response: The first non-retryable response, or the last
+            retryable one when retries or time run out
+
+        Raises:
+            requests.RequestException: When the last attempt failed to connect
+            or timed out
+        """
+        end = time.monotonic() + deadline
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            response, error = None, None
+            try:
+                response = self.session.post(url, headers=headers, json=payload, stream=stream,
+                                             timeout=(min(self.connect_timeout, remaining), remaining))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+
+            if attempt >= self.max_retries:
+                break
+            delay = retry_after_seconds(response) if response is not None else None
+            if delay is None:
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            # Give up when the wait would leave no time for another attempt
+            if time.monotonic() + delay >= end - self.connect_timeout:
+                break
+            if logger:
+                reason = f"status {response.status_code}" if response is not None else type(error).__name__
+                logger.warning(f"Retrying {url} after {reason} in {delay:.1f}s "
+                               f"(attempt {attempt + 2} of {self.max_retries + 1})")
+            if response is not None:
+                # Drain and release the connection back to the pool
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+        if response is not None:
+            return response
+        raise error
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_http_client(**options):
+    """Return the process-wide client, creating it on first use"""
+    global _client, _client_pid
+    with _client_lock:
+        # A forked web worker must not share its parent's sockets
+        if _client is None or _client_pid != os.getpid():
+            _client = HttpClient(**options)
+            _client_pid = os.getpid()
+        return _client
+
+class AsyncHttpClient:
+    """
+    asyncio HTTP client with a bounded number of in-flight requests
+
+    Bound to the event loop it is created in. Retries follow the same
+    rules as HttpClient.
+
+    Args:
+        concurrency (int): Most requests in flight at once; further calls
+                           wait for a slot before their deadline starts
+        max_connections (int): Connections kept open to the API host
+        connect_timeout (float): Seconds allowed to open a connection
+        max_retries (int): Retries after the first attempt
+        backoff_base (float): First backoff ceiling in seconds
+        backoff_max (float): Largest backoff ceiling in seconds
+    """
+
+    def __init__(self, concurrency=32, max_connections=16, connect_timeout=5,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            http2=HTTP2_AVAILABLE,
+        )
+
+    async def post_json(self, url, payload, headers=None, deadline=60, logger=None):
+        """
+        POST a JSON payload, retrying transient failures until the deadline
+
+        Args:
+            url (str): Endpoint
+            payload (dict): JSON body
+            headers (dict): Request headers
+            deadline (float): Total seconds for all attempts and waits,
+                              counted once a concurrency slot is free
+            logger: Logger for retry warnings
+
+        Returns:
+            httpx.Response: The first non-retryable response, or the last
+            retryable one when retries or time run out
+
+        Raises:
+            httpx.TransportError: When the last attempt failed to connect
+            or timed out
+        """
+        async with self.semaphore:
+            end = time.monotonic() + deadline
+            attempt = 0
+            while True:
+                remaining = end - time.monotonic()
+                response, error = None, None
+                try:
+                    response = await self.client.post(
+                        url, headers=headers, json=payload,
+                        timeout=httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining)))
+                except httpx.TransportError as e:
+                    error = e
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        return response
+
+                if attempt >= self.max_retries:
+                    break
+                delay = retry_after_seconds(response) if response is not None else None
+                if delay is None:
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                if time.monotonic() + delay >= end - self.connect_timeout:
+                    break
+                if logger:
+                    reason = f"status {response.status_code}" if response is not None else type(error).__name__
+                    logger.warning(f"Retrying {url} after {reason} in {delay:.1f}s "
+                                   f"(attempt {attempt + 2} of {self.max_retries + 1})")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+            if response is not None:
+                return response
+            raise error
+
+    async def close(self):
+        await self.client.aclose()
+
+# One async client per event loop; dropped with the loop
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_http_client(**options):
+    """Return the client for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncHttpClient(**options)
+    return client
+
+async def close_async_http_client():
+    """Close the running event loop's client, e.g. before the loop ends"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -0,0 +1,349 @@
+"""
+Durable background job queue backed by SQLite.
+
+Jobs and their input files are stored in a small SQLite file shared by all
+worker processes, so a job survives the request that created it and a
+process restart. Each process runs a pool of worker threads that claim
+queued jobs with a lease; a job whose worker died is claimed again once
+its lease runs out, up to a fixed number of attempts. Handlers report
+progress per stage, which the status endpoint reads back.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from flask import current_app
+from services.sqlite_store import SQLiteStore
+
+# Handlers by job kind: func(job) run inside an app context
+JOB_HANDLERS = {}
+
+def register_job_handler(kind, func):
+    """Register the function that runs jobs of a kind"""
+    JOB_HANDLERS[kind] = func
+
+class Job:
+    """A claimed job, as seen by its handler"""
+
+    def __init__(self, queue, job_id, kind, payload, files, attempts):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.files = files
+        self.attempts = attempts
+
+    def stage(self, name, status, **details):
+        """Record a stage's status ('running', 'done', ...) and renew the lease"""
+        self.queue.update_stage(self.id, name, status, **details)
+
+    def set_result(self, result):
+        """Store the job's (possibly partial) result for the status endpoint"""
+        self.queue.set_result(self.id, result)
+
+class JobQueue(SQLiteStore):
+    """
+    SQLite job store shared by all worker processes
+
+    Args:
+        path (str): SQLite file
+        lease_seconds (float): How long a claimed job stays with its worker
+                               without a progress update before it is retried
+        max_attempts (int): Claims allowed per job (crash recovery)
+    """
+
+    def __init__(self, path, lease_seconds=300, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    stages TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (job_id, name)
+                )
+            """)
+
+    def enqueue(self, kind, payload, files=None, stages=()):
+        """
+        Add a job to the queue
+
+        Args:
+            kind (str): Job kind, selecting its handler
+            payload (dict): JSON-serialisable job arguments
+            files (dict): name -> bytes inputs, deleted once the job ends
+            stages: Stage names, reported as 'pending' until the handler starts them
+
+        Returns:
+            str: Job ID
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        stage_map = {name: {'status': 'pending'} for name in stages}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, stages, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), json.dumps(stage_map), now, now)
+            )
+            conn.executemany("INSERT INTO job_files (job_id, name, data) VALUES (?, ?, ?)",
+                             [(job_id, name, sqlite3.Binary(data)) for name, data in (files or {}).items()])
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest queued job, or one whose worker's lease expired
+
+        Returns:
+            Job or None
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    conn.commit()
+                    return None
+                job_id, kind, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    self._end(conn, job_id, 'failed', error="Worker stopped before the job finished")
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                    "WHERE id = ?", (now + self.lease_seconds, now, job_id)
+                )
+                files = dict(conn.execute("SELECT name, data FROM job_files WHERE job_id = ?", (job_id,)).fetchall())
+                conn.commit()
+                return Job(self, job_id, kind, json.loads(payload), files, attempts + 1)
+        finally:
+            conn.close()
+
+    def update_stage(self, job_id, name, status, **details):
+        """Set one stage's status and details, renewing the job's lease"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0])
+            stage = stages.setdefault(name, {})
+            stage.update(details, status=status)
+            stage['started_at' if status == 'running' else 'finished_at'] = now
+            conn.execute("UPDATE jobs SET stages = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps(stages), now + self.lease_seconds, now, job_id))
+
+    def set_result(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET result = ?, updated_at = ? WHERE id = ?",
+                         (json.dumps(result), time.time(), job_id))
+
+    def _end(self, conn, job_id, status, error=None):
+        conn.execute("UPDATE jobs SET status = ?, error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                     (status, error, time.time(), job_id))
+        conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+
+    def complete(self, job_id):
+        """Mark a job done and drop its input files"""
+        with self._connect() as conn:
+            self._end(conn, job_id, 'done')
+
+    def fail(self, job_id, error):
+        """Mark a job failed and drop its input files"""
+        with self._connect() as conn:
+            self._end(conn, job_id, 'failed', error=error)
+
+    def get(self, job_id):
+        """
+        Look up a job
+
+        Returns:
+            dict or None: {'id', 'kind', 'status', 'stages', 'result', 'error',
+                           'attempts', 'created_at', 'updated_at'}
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, stages, result, error, attempts, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'stages': json.loads(row[3]),
+            'result': json.loads(row[4]) if row[4] else None,
+            'error': row[5],
+            'attempts': row[6],
+            'created_at': row[7],
+            'updated_at': row[8],
+        }
+
+    def purge(self, max_age):
+        """Delete finished jobs last updated more than max_age seconds ago"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                         (time.time() - max_age,))
+
+class JobWorkerPool:
+    """
+    Threads in this process that claim and run queued jobs
+
+    Args:
+        app: Flask application the handlers run in
+        queue (JobQueue): Queue to work on
+        workers (int): Number of threads
+        poll_interval (float): Seconds between checks for jobs queued by
+                               other processes or left behind by a crash
+        retention (float): Seconds finished jobs are kept
+    """
+
+    def __init__(self, app, queue, workers=8, poll_interval=2.0, retention=7 * 24 * 3600):
+        self.app = app
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._wake = threading.Event()
+        self._last_purge = 0.0
+        self._threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        """Wake idle workers after a job was queued in this process"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                self.app.logger.error(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._purge_old_jobs()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                self._execute(job)
+            except sqlite3.Error as e:
+                # The job's lease runs out and it is claimed again
+                self.app.logger.error(f"Could not record the outcome of job {job.id}: {e}")
+
+    def _execute(self, job):
+        with self.app.app_context():
+            handler = JOB_HANDLERS.get(job.kind)
+            if handler is None:
+                current_app.logger.error(f"No handler for job {job.id} of kind {job.kind}")
+                self.queue.fail(job.id, f"Unknown job kind: {job.kind}")
+                return
+            start = time.perf_counter()
+            try:
+                handler(job)
+            except Exception as e:
+                current_app.logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+                self.queue.fail(job.id, str(e))
+                return
+            self.queue.complete(job.id)
+            current_app.logger.info(f"Job {job.id} ({job.kind}) finished in {time.perf_counter() - start:.1f}s")
+
+    def _purge_old_jobs(self):
+        now = time.monotonic()
+        if now - self._last_purge < 3600:
+            return
+        self._last_purge = now
+        try:
+            self.queue.purge(self.retention)
+        except sqlite3.Error as e:
+            self.app.logger.warning(f"Could not purge old jobs: {e}")
+
+_queue = None
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the process-wide JobQueue"""
+    global _queue
+    with _pool_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                current_app.config['JOB_QUEUE_PATH'],
+                lease_seconds=current_app.config.get('JOB_LEASE_SECONDS', 300),
+                max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 3),
+            )
+        return _queue
+
+def init_job_workers(app):
+    """
+    Start this process's job workers, resuming jobs left queued by earlier runs
+
+    Threads do not survive a fork, so a web worker forked after startup
+    starts its own pool on first use. Child processes (PDF workers
+    re-importing the app as __mp_main__) start none and get None.
+    """
+    global _pool, _pool_pid
+    if multiprocessing.parent_process() is not None:
+        return None
+    with app.app_context():
+        queue = get_job_queue()
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = JobWorkerPool(
+                    app, queue,
+                    workers=app.config.get('JOB_WORKERS', 8),
+                    poll_interval=app.config.get('JOB_POLL_INTERVAL', 2.0),
+                    retention=app.config.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600),
+                )
+                _pool_pid = os.getpid()
+            return _pool
+
+def enqueue_job(kind, payload, files=None, stages=()):
+    """
+    Queue a job and wake this process's workers
+
+    Args: see JobQueue.enqueue
+
+    Returns:
+        str: Job ID
+    """
+    job_id = get_job_queue().enqueue(kind, payload, files=files, stages=stages)
+    pool = init_job_workers(current_app._get_current_object())
+    if pool is not None:
+        pool.notify()
+    return job_id
+
+def get_job(job_id):
+    """Look up a job's status, stages and result (see JobQueue.get)"""
+    return get_job_queue().get(job_id)
@@ -0,0 +1,111 @@
+"""
+Multi-keyword matcher built on an Aho-Corasick automaton over word tokens.
+
+Text is split into word tokens and every keyword phrase is compiled into
+one automaton, so all keywords are found in a single pass over a document
+and only ever match whole words ('java' does not match inside
+'javascript'). A matcher is built once per keyword list, e.g. per job
+description, and can then be run against any number of CVs.
+"""
+import re
+from collections import deque
+
+# A token is a run of word characters, allowing inner . + # / - so that
+# terms like 'node.js', 'c++', 'c#' and 'ci/cd' stay whole. A leading . or #
+# at the start of a word is kept too, so '.net' is not matched by 'net'
+TOKEN_RE = re.compile(r"(?:(?<![\w.#])[.#])?\w(?:[\w.+#/\-]*[\w+#])?")
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: (token, start, end) tuples with character offsets into text
+    """
+    return [(match.group().lower(), match.start(), match.end()) for match in TOKEN_RE.finditer(text)]
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over word tokens for a fixed set of keyword phrases
+
+    Args:
+        keywords: Iterable of keyword phrases (single words or multi-word terms)
+    """
+
+    def __init__(self, keywords):
+        self.keywords = sorted({keyword for keyword in keywords if keyword})
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword in self.keywords:
+            tokens = [token for token, _, _ in tokenize(keyword)]
+            if not tokens:
+                continue
+            state = 0
+            for token in tokens:
+                next_state = self._goto[state].get(token)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][token] = next_state
+                state = next_state
+            self._output[state].append((keyword, len(tokens)))
+
+        # Breadth-first pass to set failure links and merge outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def finditer(self, text, tokens=None):
+        """
+        Yield every keyword occurrence in text in a single pass
+
+        Args:
+            text (str): Text to search
+            tokens (list): tokenize(text), if already computed
+
+        Yields:
+            tuple: (keyword, start, end) character offsets into text
+        """
+        if tokens is None:
+            tokens = tokenize(text)
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for index, (token, _, end) in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for keyword, length in output[state]:
+                yield keyword, tokens[index - length + 1][1], end
+
+    def match(self, text, tokens=None):
+        """
+        Find all keywords in text
+
+        Args:
+            text (str): Text to search, e.g. a CV
+            tokens (list): tokenize(text), if already computed
+
+        Returns:
+            dict: keyword -> {'count': int, 'positions': [(start, end), ...]}
+                  for each keyword that occurs at least once
+        """
+        matches = {}
+        for keyword, start, end in self.finditer(text, tokens):
+            entry = matches.setdefault(keyword, {'count': 0, 'positions': []})
+            entry['count'] += 1
+            entry['positions'].append((start, end))
+        return matches
@@ -0,0 +1,204 @@
+"""
+Deterministic CV-vs-JD match scoring computed locally, without the LLM.
+
+Builds on the parsed document profiles (sections, metrics, requirements)
+and the JD keyword matchers, so it costs a few regex passes over text that
+has already been extracted and is available as soon as extraction ends.
+"""
+import re
+import time
+from datetime import datetime
+from flask import current_app
+from services.pdf_service import (get_document_profile, extract_cv_sections, extract_cv_metrics,
+                                  extract_jd_requirements)
+from services.ai_service import get_keyword_match_score, extract_jd_keywords
+
+# Weight of each component in the overall score
+SCORE_WEIGHTS = {
+    'keyword_match': 0.3,
+    'skill_match': 0.3,
+    'experience_match': 0.25,
+    'education_match': 0.15,
+}
+
+# Score given to a component the job description says nothing about:
+# full marks if the CV has the matching section, half otherwise
+UNSTATED_MATCH_WITH_SECTION = 100
+UNSTATED_MATCH_WITHOUT_SECTION = 50
+
+YEARS_REQUIRED_RE = re.compile(
+    r'(\d{1,2})\s*\+?\s*(?:-|to|à)?\s*(?:\d{1,2}\s*)?\+?\s*(?:years?|yrs?|ans|années)\b', re.IGNORECASE)
+DATE_RANGE_RE = re.compile(
+    r"\b((?:19|20)\d{2})\s*(?:-|–|—|to|à|au)\s*((?:19|20)\d{2}|present|current|now|today|"
+    r"aujourd'hui|présent|actuel)\b", re.IGNORECASE)
+
+# Degree levels, from doctorate (4) down to associate degree or diploma (1)
+DEGREE_LEVELS = [
+    (4, re.compile(r'\b(?:ph\.?\s?d|doctorate|doctorat)\b', re.IGNORECASE)),
+    (3, re.compile(r"\b(?:master(?:'?s)?|msc|m\.sc|mba|meng|mastère)\b", re.IGNORECASE)),
+    (2, re.compile(r"\b(?:bachelor(?:'?s)?|bsc|b\.sc|beng|licence|undergraduate\s+degree)\b", re.IGNORECASE)),
+    (1, re.compile(r"\b(?:associate(?:'?s)?\s+degree|diploma|diplôme|bts|dut|hnd)\b", re.IGNORECASE)),
+]
+
+def _degree_levels(text):
+    """All degree levels mentioned in a text"""
+    return {level for level, pattern in DEGREE_LEVELS if pattern.search(text)}
+
+def _category_keywords(jd_profile, categories):
+    """JD keywords of some requirement categories, memoized on the JD profile"""
+    return jd_profile.memoize(('keywords', categories),
+                              lambda profile: extract_jd_keywords(profile, categories))
+
+def _coverage(jd_profile, matched, categories):
+    """
+    Share of a category's JD keywords found in the CV, or None when the
+    category has no keywords. The CV is matched once against all JD
+    keywords; categories are subsets of that result.
+    """
+    keywords = _category_keywords(jd_profile, categories)
+    if not keywords:
+        return None
+    return sum(1 for keyword in keywords if keyword in matched) / len(keywords)
+
+def _cv_years(cv_text, experience_text):
+    """
+    Estimate years of experience from date ranges in the experience section,
+    or from an explicit 'N years of experience' statement, whichever is larger
+    """
+    this_year = datetime.now().year
+    spans = []
+    for start, end in DATE_RANGE_RE.findall(experience_text):
+        end_year = int(end) if end.isdigit() else this_year
+        if int(start) <= end_year <= this_year:
+            spans.append((int(start), end_year))
+
+    # Merge overlapping roles so parallel positions are not counted twice
+    years = 0
+    current = None
+    for start, end in sorted(spans):
+        if current and start <= current[1]:
+            current[1] = max(current[1], end)
+        else:
+            if current:
+                years += current[1] - current[0]
+            current = [start, end]
+    if current:
+        years += current[1] - current[0]
+
+    stated = [int(n) for n in YEARS_REQUIRED_RE.findall(cv_text) if int(n) <= 50]
+    return max([years] + stated)
+
+def _experience_match(cv_profile, jd_profile, matched, cv_sections, requirements):
+    required_years = [int(n) for item in requirements['experience'] + requirements['required_skills']
+                      for n in YEARS_REQUIRED_RE.findall(item)]
+    required = max(required_years) if required_years else None
+    experience_text = cv_sections.get('experience', {}).get('content') or cv_profile.text
+    cv_years = _cv_years(cv_profile.text, experience_text)
+    coverage = _coverage(jd_profile, matched, ('experience',))
+
+    years_ratio = min(cv_years / required, 1.0) if required else None
+    if years_ratio is not None and coverage is not None:
+        score = 0.6 * years_ratio + 0.4 * coverage
+    elif years_ratio is not None:
+        score = years_ratio
+    elif coverage is not None:
+        score = coverage
+    else:
+        score = (UNSTATED_MATCH_WITH_SECTION if 'experience' in cv_sections
+                 else UNSTATED_MATCH_WITHOUT_SECTION) / 100
+    return round(score * 100), {'required_years': required, 'cv_years': cv_years}
+
+def _education_match(cv_profile, jd_profile, matched, cv_sections, requirements):
+    jd_levels = _degree_levels("\n".join(requirements['education']) or jd_profile.text)
+    required = min(jd_levels) if jd_levels else None
+    education_text = cv_sections.get('education', {}).get('content') or cv_profile.text
+    cv_levels = _degree_levels(education_text)
+    cv_level = max(cv_levels) if cv_levels else 0
+    coverage = _coverage(jd_profile, matched, ('education',))
+
+    level_ratio = min(cv_level / required, 1.0) if required else None
+    if level_ratio is not None and coverage is not None:
+        score = 0.7 * level_ratio + 0.3 * coverage
+    elif level_ratio is not None:
+        score = level_ratio
+    elif coverage is not None:
+        score = coverage
+    else:
+        score = (UNSTATED_MATCH_WITH_SECTION if 'education' in cv_sections or cv_level
+                 else UNSTATED_MATCH_WITHOUT_SECTION) / 100
+    return round(score * 100), {'required_level': required, 'cv_level': cv_level}
+
+def _skill_match(jd_profile, matched, keyword_result):
+    required = _category_keywords(jd_profile, ('required_skills',))
+    preferred = _category_keywords(jd_profile, ('preferred_skills',))
+
+    # Preferred skills count half as much as required ones
+    total = len(required) + 0.5 * len(preferred)
+    if total:
+        found = (sum(1 for keyword in required if keyword in matched) +
+                 0.5 * sum(1 for keyword in preferred if keyword in matched))
+        score = found / total
+    else:
+        score = keyword_result['match_percentage'] / 100
+    missing = [keyword for keyword in required if ' ' not in keyword and keyword not in matched]
+    return round(score * 100), {'missing': missing}
+
+def compute_match_scores(cv_text, jd_text, cv_sections=None):
+    """
+    Score a CV against a job description without calling the LLM
+
+    Args:
+        cv_text: CV text content (str or DocumentProfile)
+        jd_text: Job description text content (str or DocumentProfile)
+        cv_sections: CV sections if already extracted (e.g. from the PDF
+                     layout); found with extract_cv_sections otherwise
+
+    Returns:
+        dict: {
+            'score': overall 0-100 score,
+            'stats': {'keyword_match', 'skill_match', 'experience_match', 'education_match'},
+            'keywords': {'matched', 'missing', 'total'},
+            'skills': {'missing'},
+            'experience': {'required_years', 'cv_years'},
+            'education': {'required_level', 'cv_level'},
+            'metrics': extract_cv_metrics result,
+            'sections_found': CV section names,
+            'elapsed_ms': time taken
+        }
+    """
+    start = time.perf_counter()
+    cv_profile = get_document_profile(cv_text)
+    jd_profile = get_document_profile(jd_text)
+    cv_sections = cv_sections or extract_cv_sections(cv_profile)
+    requirements = extract_jd_requirements(jd_profile)
+
+    keyword_result = get_keyword_match_score(cv_profile, jd_profile)
+    matched = set(keyword_result['matched_keywords'])
+    skill_match, skills = _skill_match(jd_profile, matched, keyword_result)
+    experience_match, experience = _experience_match(cv_profile, jd_profile, matched, cv_sections, requirements)
+    education_match, education = _education_match(cv_profile, jd_profile, matched, cv_sections, requirements)
+
+    stats = {
+        'keyword_match': round(keyword_result['match_percentage']),
+        'skill_match': skill_match,
+        'experience_match': experience_match,
+        'education_match': education_match,
+    }
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    current_app.logger.info(f"Computed local match scores in {elapsed_ms} ms")
+
+    return {
+        'score': round(sum(stats[name] * weight for name, weight in SCORE_WEIGHTS.items())),
+        'stats': stats,
+        'keywords': {
+            'matched': keyword_result['matched_keywords'],
+            'missing': [keyword for keyword in _category_keywords(jd_profile, None) if keyword not in matched],
+            'total': keyword_result['total_keywords'],
+        },
+        'skills': skills,
+        'experience': experience,
+        'education': education,
+        'metrics': extract_cv_metrics(cv_profile),
+        'sections_found': list(cv_sections),
+        'elapsed_ms': elapsed_ms,
+    }
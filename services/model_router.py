@@ -0,0 +1,187 @@
+"""
+Latency-aware routing between LLM models.
+
+The router keeps a rolling window of recent calls per model and kind of
+call (latency and whether the call succeeded) in each worker process. It
+picks the first configured model whose recent error rate is acceptable as
+the primary, and the next one as the hedge: when the primary has not
+answered within its recent p95 latency for that kind of call, a second
+request goes to the hedge model and
+the first good answer wins. This bounds tail latency at the cost of a
+few duplicate calls (about 5% when the primary behaves as usual).
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class ModelStats:
+    """Rolling window of one model's recent calls of one kind"""
+
+    def __init__(self, window, max_age):
+        self.max_age = max_age
+        self._calls = deque(maxlen=window)
+
+    def record(self, latency, ok):
+        self._calls.append((time.monotonic(), latency, ok))
+
+    @property
+    def calls(self):
+        """(latency, ok) of the calls still in the window"""
+        # Old calls age out, so a model that was failing gets tried again
+        horizon = time.monotonic() - self.max_age
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+        return [(latency, ok) for _, latency, ok in self._calls]
+
+    def percentile(self, fraction):
+        """Latency below which `fraction` of recent successful calls finished, or None"""
+        latencies = sorted(latency for latency, ok in self.calls if ok)
+        if not latencies:
+            return None
+        return latencies[min(int(fraction * len(latencies)), len(latencies) - 1)]
+
+class ModelRouter:
+    """
+    Per-process latency and error tracking for choosing and hedging models
+
+    Latency is tracked per model and kind of call (e.g. the analysis type),
+    since a short query and a full CV/JD analysis on the same model take
+    very different times; health is judged per model across all kinds.
+
+    Args:
+        window (int): Calls remembered per model and kind
+        max_age (float): Seconds a call is remembered
+        min_samples (int): Successful calls needed before a model's own p95
+                           for a kind replaces the default hedge delay
+        max_error_rate (float): Error rate above which a model is only used
+                                when no healthier one is configured
+        default_fraction (float): Share of a call's deadline waited before
+                                  hedging while samples are scarce
+        min_delay (float): Shortest hedge delay in seconds, so a fast p95
+                           does not double every call
+    """
+
+    def __init__(self, window=200, max_age=300, min_samples=20, max_error_rate=0.5, default_fraction=0.5,
+                 min_delay=1.0):
+        self.window = window
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.default_fraction = default_fraction
+        self.min_delay = min_delay
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, latency, ok, kind=None):
+        """
+        Record a finished call
+
+        Args:
+            model (str): Model called
+            latency (float): Seconds until the response (or failure)
+            ok (bool): Whether the call produced a usable answer
+            kind (str): Kind of call, e.g. the analysis type
+        """
+        with self._lock:
+            stats = self._stats.get((model, kind))
+            if stats is None:
+                stats = self._stats[(model, kind)] = ModelStats(self.window, self.max_age)
+            stats.record(latency, ok)
+
+    def _model_calls(self, model):
+        """(latency, ok) of a model's recent calls of every kind"""
+        return [call for (name, _), stats in self._stats.items() if name == model for call in stats.calls]
+
+    def _healthy(self, model):
+        calls = self._model_calls(model)
+        # Judge error rates only once a few calls have been seen
+        if len(calls) < min(self.min_samples, self.window):
+            return True
+        return sum(1 for _, ok in calls if not ok) / len(calls) <= self.max_error_rate
+
+    def route(self, models):
+        """
+        Choose the primary and hedge model
+
+        Args:
+            models (list): Candidate models in order of preference
+
+        Returns:
+            tuple: (primary, hedge) - hedge is None when only one model is configured
+        """
+        models = list(dict.fromkeys(models))
+        with self._lock:
+            # Healthy models keep their configured order, ahead of unhealthy ones
+            ranked = sorted(models, key=lambda model: not self._healthy(model))
+        return ranked[0], (ranked[1] if len(ranked) > 1 else None)
+
+    def hedge_delay(self, model, kind, deadline):
+        """
+        Seconds to wait for a model before hedging
+
+        Args:
+            model (str): Primary model
+            kind (str): Kind of call, as passed to record()
+            deadline (float): The call's deadline in seconds
+
+        Returns:
+            float: The model's recent p95 latency for this kind of call, or
+                   default_fraction of the deadline while samples are scarce
+        """
+        with self._lock:
+            stats = self._stats.get((model, kind))
+            samples = sum(1 for _, ok in stats.calls if ok) if stats else 0
+            p95 = stats.percentile(0.95) if samples >= self.min_samples else None
+        return max(p95 if p95 is not None else deadline * self.default_fraction, self.min_delay)
+
+    def snapshot(self):
+        """
+        Current per-model figures
+
+        Returns:
+            dict: model -> {'calls', 'error_rate', 'healthy',
+                            'kinds': {kind: {'calls', 'p50', 'p95'}}}
+        """
+        with self._lock:
+            models = {}
+            for (model, kind), stats in self._stats.items():
+                if model not in models:
+                    calls = self._model_calls(model)
+                    models[model] = {
+                        'calls': len(calls),
+                        'error_rate': round(sum(1 for _, ok in calls if not ok) / len(calls), 3) if calls else 0.0,
+                        'healthy': self._healthy(model),
+                        'kinds': {},
+                    }
+                models[model]['kinds'][kind] = {
+                    'calls': len(stats.calls),
+                    'p50': stats.percentile(0.5),
+                    'p95': stats.percentile(0.95),
+                }
+            return models
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_model_router(**options):
+    """Return the process-wide router, creating it on first use"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(**options)
+        return _router
+
+_executor = None
+_executor_pid = None
+
+def get_hedge_executor(workers=32):
+    """Return the thread pool that runs routed calls while the caller waits for a winner"""
+    global _executor, _executor_pid
+    with _router_lock:
+        # Threads do not survive a fork
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-call')
+            _executor_pid = os.getpid()
+        return _executor
@@ -0,0 +1,100 @@
+"""
+MinHash fingerprints for finding near-duplicate documents.
+
+A document is reduced to the set of its word 3-grams (shingles) and then
+to a fixed-size MinHash signature: for each of NUM_PERMUTATIONS hash
+functions, the smallest hash over all shingles. The share of equal
+positions in two signatures estimates the Jaccard similarity of their
+shingle sets, so a CV resubmitted with a new phone number or one edited
+word still scores close to 1.
+
+Signatures are split into bands for locality-sensitive hashing: two
+documents share at least one band bucket with high probability when they
+are similar, so candidates can be found by bucket lookup instead of
+comparing against every stored signature.
+"""
+import re
+import hashlib
+import unicodedata
+import numpy as np
+
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity usually share a bucket
+LSH_BANDS = 16
+SHINGLE_WORDS = 3
+
+WORD_RE = re.compile(r"\w+")
+
+# Largest prime below 2^32; with 32-bit hashes and coefficients the
+# universal hash a*x + b stays within uint64
+_PRIME = np.uint64(4294967291)
+# Fixed seed: signatures are compared across processes and restarts
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, 2 ** 32 - 5, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 5, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+def shingles(text):
+    """
+    Word 3-grams of a normalized, lowercased text
+
+    Args:
+        text (str): Document text
+
+    Returns:
+        set: Shingle strings (single words for texts shorter than a shingle)
+    """
+    words = WORD_RE.findall(unicodedata.normalize('NFC', text).lower())
+    if len(words) < SHINGLE_WORDS:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash_signature(text):
+    """
+    MinHash signature of a document
+
+    Args:
+        text (str): Document text
+
+    Returns:
+        numpy.ndarray: NUM_PERMUTATIONS uint32 values, or None for a text
+                       without words
+    """
+    pieces = shingles(text)
+    if not pieces:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(piece.encode('utf-8'), digest_size=4).digest(), 'little')
+         for piece in pieces),
+        dtype=np.uint64, count=len(pieces)
+    )
+    permuted = (hashes[:, None] * _A + _B) % _PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity of the documents behind two signatures"""
+    return float(np.mean(signature == other))
+
+def pack_signatures(signatures):
+    """Serialize one signature per input text for storage"""
+    return np.stack(signatures).astype('<u4').tobytes()
+
+def unpack_signatures(data):
+    """Inverse of pack_signatures"""
+    return np.frombuffer(data, dtype='<u4').reshape(-1, NUM_PERMUTATIONS)
+
+def band_buckets(signature, bands=LSH_BANDS):
+    """
+    LSH bucket ids of a signature, one per band
+
+    Args:
+        signature (numpy.ndarray): MinHash signature
+        bands (int): Number of bands the signature is split into
+
+    Returns:
+        list: Hex digests identifying (band, band values)
+    """
+    buckets = []
+    for index, band in enumerate(np.split(signature.astype('<u4'), bands)):
+        digest = hashlib.blake2b(band.tobytes(), digest_size=8, person=index.to_bytes(2, 'little'))
+        buckets.append(digest.hexdigest())
+    return buckets
@@ -0,0 +1,248 @@
+"""
+Isolated worker pool for running PDF extraction jobs.
+
+Each worker is a long-lived process that receives one job at a time over a
+pipe. The parent enforces a per-job wall-clock timeout and an RSS cap by
+watching the worker while it runs; a worker that exceeds either limit, or
+dies, is killed and replaced, so only the offending job fails. Workers are
+also recycled after a fixed number of jobs to bound slow leaks in the PDF
+library.
+
+Workers are started through a fork server (or spawned where fork servers
+are unavailable), never forked from the calling process: by the time a
+worker is replaced the web process runs several threads, and a plain fork
+could copy a lock another thread holds into the child.
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+class SandboxError(RuntimeError):
+    """Base class for jobs that failed because of a sandbox limit"""
+
+class SandboxTimeout(SandboxError):
+    """The job did not finish within its wall-clock limit"""
+
+class SandboxMemoryExceeded(SandboxError):
+    """The worker's resident memory grew past the configured cap"""
+
+class SandboxWorkerDied(SandboxError):
+    """The worker process exited while running the job"""
+
+class SandboxJobError(RuntimeError):
+    """The job itself raised an exception inside the worker"""
+
+def _worker_main(conn):
+    """Worker loop: run (func, args) jobs until told to stop"""
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        func, args = job
+        try:
+            conn.send(('ok', func(*args)))
+        except BaseException as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+    conn.close()
+
+def _rss_bytes(pid):
+    """Resident set size of a process, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+class _Worker:
+    """One worker process and its end of the job pipe"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def run(self, func, args, timeout, max_rss_bytes, poll_interval):
+        self.jobs += 1
+        try:
+            self.conn.send((func, args))
+        except (OSError, ValueError):
+            raise SandboxWorkerDied("PDF worker is not accepting jobs")
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            wait = poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SandboxTimeout(f"PDF job exceeded {timeout:.1f}s")
+                wait = min(wait, remaining)
+            if self.conn.poll(wait):
+                try:
+                    status, value = self.conn.recv()
+                except (EOFError, OSError):
+                    raise SandboxWorkerDied("PDF worker exited during job")
+                if status == 'error':
+                    raise SandboxJobError(value)
+                return value
+            if not self.process.is_alive():
+                raise SandboxWorkerDied(f"PDF worker exited with code {self.process.exitcode}")
+            if max_rss_bytes:
+                rss = _rss_bytes(self.process.pid)
+                if rss is not None and rss > max_rss_bytes:
+                    raise SandboxMemoryExceeded(f"PDF worker RSS {rss // (1024 * 1024)}MB exceeded cap")
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+def start_context():
+    """Multiprocessing context that starts PDF worker processes without forking the caller"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # Import the extraction code once in the server, not in every new worker
+        context.set_forkserver_preload(['services.pdf_service'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+class ExtractionSandbox:
+    """
+    Pool of isolated worker processes with per-job time and memory limits
+
+    Args:
+        size: Number of worker processes
+        timeout: Default wall-clock limit per job, in seconds
+        max_rss_bytes: Kill a worker whose RSS grows past this (None disables)
+        max_jobs_per_worker: Replace a worker after this many jobs
+        poll_interval: How often a running job is checked, in seconds
+    """
+
+    def __init__(self, size=2, timeout=30, max_rss_bytes=512 * 1024 * 1024,
+                 max_jobs_per_worker=50, poll_interval=0.05):
+        self.size = size
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.poll_interval = poll_interval
+        self._context = start_context()
+        self._idle = queue.Queue()
+        self._dispatch = ThreadPoolExecutor(max_workers=size)
+        self.stats = {'jobs': 0, 'timeouts': 0, 'memory_kills': 0, 'crashes': 0, 'recycled': 0}
+        self._stats_lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(_Worker(self._context))
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _checkout(self, timeout):
+        """Take an idle worker, starting one for a slot whose worker was lost"""
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            self._count('timeouts')
+            raise SandboxTimeout(f"No PDF worker became free within {timeout}s")
+        if worker is None:
+            try:
+                worker = _Worker(self._context)
+            except Exception as e:
+                # Keep the slot, so the pool recovers once workers start again
+                self._idle.put(None)
+                self._count('crashes')
+                raise SandboxWorkerDied(f"Could not start a PDF worker: {e}")
+        return worker
+
+    def run(self, func, *args, timeout=None):
+        """
+        Run func(*args) in an idle worker, waiting for one if all are busy
+
+        func and args must be picklable (module-level function, plain data).
+        The time spent waiting for a free worker counts towards the timeout.
+
+        Returns:
+            The function's return value
+
+        Raises:
+            SandboxError: The job hit a limit or no worker was free in time;
+                          a worker that hit a limit is replaced
+            SandboxJobError: The job raised inside the worker
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        worker = self._checkout(timeout)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._idle.put(worker)
+            self._count('timeouts')
+            raise SandboxTimeout(f"PDF job exceeded {timeout}s waiting for a worker")
+        try:
+            self._count('jobs')
+            return worker.run(func, args, remaining, self.max_rss_bytes, self.poll_interval)
+        except SandboxError as e:
+            self._count({SandboxTimeout: 'timeouts', SandboxMemoryExceeded: 'memory_kills'}.get(type(e), 'crashes'))
+            worker.kill()
+            # The slot gets a new worker when it is next taken
+            worker = None
+            raise
+        finally:
+            if worker is not None and worker.jobs >= self.max_jobs_per_worker:
+                worker.stop()
+                worker = None
+                self._count('recycled')
+            self._idle.put(worker)
+
+    def map(self, func, arg_tuples, timeout=None):
+        """Run several jobs concurrently across the pool, returning results in order"""
+        futures = [self._dispatch.submit(self.run, func, *args, timeout=timeout) for args in arg_tuples]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        """Stop all idle workers"""
+        self._dispatch.shutdown(wait=False)
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.stop()
+
+_sandbox = None
+_sandbox_pid = None
+_sandbox_lock = threading.Lock()
+
+def get_extraction_sandbox(size=2, timeout=30, max_rss_bytes=512 * 1024 * 1024, max_jobs_per_worker=50):
+    """
+    Return the process-wide sandbox, starting its workers on first use
+
+    Returns None inside a child process (a sandbox or page pool worker
+    re-importing the app as __mp_main__), which must not start workers
+    of its own.
+    """
+    global _sandbox, _sandbox_pid
+    if multiprocessing.parent_process() is not None:
+        return None
+    with _sandbox_lock:
+        # A forked web worker must not share its parent's pipes
+        if _sandbox is None or _sandbox_pid != os.getpid():
+            _sandbox = ExtractionSandbox(size, timeout, max_rss_bytes, max_jobs_per_worker)
+            _sandbox_pid = os.getpid()
+        return _sandbox
@@ -4,131 +4,806 @@ PDF service module for extracting text from PDF files.
 import os
 import fitz  # PyMuPDF
 import re
-from flask import current_app
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+from services.extraction_cache import get_extraction_cache, make_cache_key
+from services.pdf_sandbox import get_extraction_sandbox, start_context
+from services.text_patterns import SectionDetector, IndicatorSet
+from services.keyword_matcher import tokenize
 
-def extract_pdf_text(filepath, preserve_layout=True):
+# Bump whenever extraction output changes so stale cache entries are ignored
+EXTRACTOR_VERSION = "2"
+
+def read_upload(file_storage):
     """
-    Extract text from a PDF file using PyMuPDF (fitz)
+    Read an uploaded PDF without writing it to UPLOAD_FOLDER
+    
+    Uploads are buffered by SpooledRequest (see services/utils.py): small
+    files stay in memory and large ones spill to an anonymous temporary
+    file exactly once. This reads the bytes straight from that buffer.
     
     Args:
-        filepath: Path to the PDF file
-        preserve_layout: Whether to attempt to preserve document layout
+        file_storage: werkzeug FileStorage from request.files
         
     Returns:
-        str: Extracted text from the PDF
+        bytes: Raw content of the uploaded file
+    """
+    stream = file_storage.stream
+    if hasattr(stream, 'seek'):
+        stream.seek(0)
+    return stream.read()
+
+def _open_document(source):
+    """Open a PDF from a filesystem path or from in-memory bytes/stream"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    if hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return fitz.open(stream=source.read(), filetype="pdf")
+    return fitz.open(source)
+
+def _describe_source(source):
+    """Short description of a PDF source for log messages"""
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return f"<in-memory upload, {len(source)} bytes>"
+    return "<upload stream>"
+
+# Common section titles in CVs - expanded with more variations
+CV_SECTION_PATTERNS = {
+    'summary': r'(?:professional\s+)?summary|profile|objective|about\s+me|personal\s+statement',
+    'experience': r'(?:work|professional|career)\s+experience|employment(?:\s+history)?|work\s+history',
+    'education': r'education(?:al)?\s+(?:background|history|qualifications)?',
+    'skills': r'(?:technical|key|core)?\s*skills|competencies|expertise|proficiencies',
+    'projects': r'projects|portfolio|key\s+achievements',
+    'certifications': r'certifications?|accreditations?|licenses|qualifications',
+    'languages': r'languages?|language\s+proficiency',
+    'references': r'references|testimonials',
+    'publications': r'publications|papers|research|articles',
+    'awards': r'awards|honors|achievements|recognition',
+    'volunteer': r'volunteer(?:ing)?|community\s+service',
+    'interests': r'interests|hobbies|activities',
+    'personal': r'personal\s+details|personal\s+information'
+}
+
+# Matches a CV section header line; headers might be followed by colon,
+# all caps, underlined with dashes, etc. The leading newline is a lookbehind
+# so back-to-back headers are all found in one scan.
+CV_SECTION_DETECTOR = SectionDetector(
+    CV_SECTION_PATTERNS,
+    prefix=r'(?:^|(?<=\n))(?:[^a-z\n]*)?(?:\s*)',
+    suffix=r'(?:\s*:|\s*\n|$)',
+    flags=re.IGNORECASE
+)
+
+# A whole header line from a structured layout, per section (see _classify_header)
+CV_HEADER_LINE_RES = {section_name: re.compile(r'(?:' + pattern + r')\s*')
+                      for section_name, pattern in CV_SECTION_PATTERNS.items()}
+
+# Section headings counted by extract_cv_metrics. These are plain literals
+# that re scans fastest one at a time, so they stay separate patterns.
+CV_METRIC_SECTION_RES = [re.compile(r'\b' + pattern + r'\b') for pattern in [
+    r'summary|profile|objective',
+    r'experience|employment',
+    r'education',
+    r'skills|competencies',
+    r'projects|portfolio',
+    r'certifications',
+    r'languages',
+    r'references'
+]]
+
+# Common section indicators in job descriptions
+JD_SECTION_PATTERNS = {
+    'required_skills': r'required(?:\s+skills)?|requirements|qualifications|you\s+(?:should|must)\s+have',
+    'preferred_skills': r'preferred(?:\s+skills)?|nice\s+to\s+have|desirable|plus|bonus',
+    'experience': r'experience|background|history',
+    'education': r'education|degree|academic|qualification',
+    'responsibilities': r'responsibilities|duties|you\s+will|role|job\s+description|position\s+description|what\s+you\'ll\s+do'
+}
+
+JD_SECTION_DETECTOR = SectionDetector(
+    JD_SECTION_PATTERNS,
+    prefix=r'(?:^|(?<=\n))\s*',
+    suffix=r'(?:\s*:|\s*\n)'
+)
+
+# CV/Resume indicators
+CV_INDICATORS = [
+    r'\b(?:curriculum\s+vitae|resume|cv)\b',
+    r'\b(?:work\s+experience|employment\s+history|professional\s+experience)\b',
+    r'\b(?:education|qualifications|academic\s+background)\b',
+    r'\b(?:skills|competencies|expertise)\b',
+    r'\b(?:references|referees)\b',
+    r'\b(?:personal\s+details|personal\s+information)\b',
+    r'\bemail\b(?=.{0,20}@)',  # Looks for email addresses
+    r'\b(?:phone|tel|mobile)\b(?=.{0,20}\d{3,})',  # Looks for phone numbers
+]
+
+# Job description indicators
+JD_INDICATORS = [
+    r'\b(?:job\s+description|position\s+description|role\s+description)\b',
+    r'\b(?:we\s+are\s+looking\s+for|we\s+seek|seeking\s+a)\b',
+    r'\b(?:responsibilities|duties|you\s+will\s+be\s+responsible)\b',
+    r'\b(?:qualifications|requirements|the\s+ideal\s+candidate)\b',
+    r'\b(?:we\s+offer|benefits|package|salary)\b',
+    r'\b(?:apply|application|to\s+apply|send\s+your)\b',
+    r'\b(?:company|organization|firm)\s+(?:is|are|description|overview)\b',
+    r'\b(?:position|opportunity|opening|vacancy)\b',
+]
+
+DOCUMENT_TYPE_INDICATORS = IndicatorSet(
+    {**{f'cv_{i}': p for i, p in enumerate(CV_INDICATORS)},
+     **{f'jd_{i}': p for i, p in enumerate(JD_INDICATORS)}}
+)
+
+BULLET_ITEM_RE = re.compile(r'(?:^|\n)(?:\s*[\•\-\*\★\✓\➢\+\d+\.]+\s*)([^\n]+)')
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+SENTENCE_END_RE = re.compile(r'[.!?]+')
+
+# PyMuPDF span flag bit set for bold text
+BOLD_FLAG = 1 << 4
+
+def _layout_page(page, page_num=0, structured=False):
+    """
+    Single pass over page.get_text("dict") for layout-preserving extraction
+    
+    Text is assembled with a list builder instead of repeated string
+    concatenation. When structured is True the same pass also records each
+    block and line with its font size, bold flag and page number, which
+    get_text("dict") has already computed.
+    
+    Returns:
+        tuple: (page text, list of blocks or None)
+    """
+    parts = []
+    blocks = [] if structured else None
+    
+    for block in page.get_text("dict").get("blocks", []):
+        block_lines = []
+        for line in block.get("lines", ()):
+            spans = line.get("spans", ())
+            line_parts = [span.get("text", "") for span in spans]
+            for span_text in line_parts:
+                parts.append(span_text)
+                parts.append(" ")
+            parts.append("\n")  # Line break after each line
+            
+            if structured:
+                line_text = "".join(line_parts).strip()
+                if line_text:
+                    text_spans = [span for span in spans if span.get("text", "").strip()]
+                    block_lines.append({
+                        'text': line_text,
+                        'size': round(max(span.get("size", 0) for span in text_spans), 1),
+                        'bold': all(span.get("flags", 0) & BOLD_FLAG or 'bold' in span.get("font", "").lower()
+                                    for span in text_spans),
+                        'bbox': list(line.get("bbox", ())),
+                    })
+        parts.append("\n")  # Extra line break between blocks for better separation
+        
+        if block_lines:
+            blocks.append({'page': page_num, 'bbox': list(block.get("bbox", ())), 'lines': block_lines})
+    
+    return "".join(parts), blocks
+
+def _extract_page_text(page, preserve_layout=True):
+    """Extract the text of a single PyMuPDF page"""
+    if not preserve_layout:
+        # Simple text extraction
+        return page.get_text()
+    
+    # Extract text with layout preservation (better for CVs and structured documents)
+    return _layout_page(page)[0]
+
+def _extract_pages(doc, start, end, preserve_layout, structured=False, max_chars=None):
+    """
+    Extract pages [start, end) of an open document in page order
+    
+    With max_chars set, stops as soon as the character budget is met so
+    the remaining pages are never parsed.
+    
+    Returns:
+        tuple: (text, blocks or None, number of pages read)
+    """
+    texts = []
+    blocks = [] if structured else None
+    extracted = 0
+    pages_read = 0
+    for page_num in range(start, end):
+        page = doc.load_page(page_num)
+        if structured:
+            page_text, page_blocks = _layout_page(page, page_num, structured=True)
+            blocks.extend(page_blocks)
+        else:
+            page_text = _extract_page_text(page, preserve_layout)
+        texts.append(page_text)
+        pages_read += 1
+        extracted += len(page_text)
+        if max_chars and extracted >= max_chars:
+            break
+    return "".join(texts), blocks, pages_read
+
+def _extract_page_range(source, start, end, preserve_layout, structured=False, max_chars=None, max_pages=None):
+    """
+    Worker entry point for the process pool and the extraction sandbox:
+    open the document independently and extract pages [start, end)
+    
+    end=None means up to the last page (or max_pages).
+    
+    Returns:
+        tuple: (text, blocks or None, pages read, document page count)
+    """
+    doc = _open_document(source)
+    try:
+        page_count = len(doc)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        end = page_count if end is None else min(end, page_count)
+        return _extract_pages(doc, start, end, preserve_layout, structured, max_chars) + (page_count,)
+    finally:
+        doc.close()
+
+def _count_pages(source):
+    """Sandbox job: number of pages in a document"""
+    doc = _open_document(source)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+def _source_bytes(source):
+    """Paths are passed through as-is; streams and buffers become bytes for pickling"""
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source.read()
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    return source
+
+def _join_ranges(results, structured, max_chars=None):
+    """
+    Reassemble per-range worker results in page order
+    
+    With max_chars set, ranges are kept up to and including the one in
+    which the character budget is met; later ranges are dropped.
+    
+    Returns:
+        tuple: (text, blocks or None, number of pages read)
+    """
+    texts = []
+    blocks = [] if structured else None
+    extracted = 0
+    pages_read = 0
+    for result in results:
+        texts.append(result[0])
+        if structured:
+            blocks.extend(result[1])
+        pages_read += result[2]
+        extracted += len(result[0])
+        if max_chars and extracted >= max_chars:
+            break
+    return "".join(texts), blocks, pages_read
+
+def _page_ranges(page_count, workers):
+    """Split pages into one contiguous (start, end) range per worker"""
+    chunk = -(-page_count // workers)  # ceil division
+    return [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+
+_page_pool = None
+_page_pool_pid = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+def _get_page_pool():
+    """Lazily create the process pool shared by parallel extractions"""
+    global _page_pool, _page_pool_pid, _page_pool_workers
+    with _page_pool_lock:
+        # A forked web worker must not use its parent's pool; the pool's own
+        # workers come from a fork server, as this process runs other threads
+        if _page_pool is None or _page_pool_pid != os.getpid():
+            _page_pool_workers = current_app.config.get('PDF_PARALLEL_WORKERS') or os.cpu_count() or 2
+            _page_pool = ProcessPoolExecutor(max_workers=_page_pool_workers, mp_context=start_context())
+            _page_pool_pid = os.getpid()
+        return _page_pool
+
+def _extract_pages_parallel(source, page_count, preserve_layout, structured=False, max_chars=None):
+    """
+    Fan page ranges out to the process pool and join them in page order
+    
+    Each range stops at max_chars on its own, so no worker parses past the
+    budget; see _join_ranges for how the budget applies to the result.
+    
+    Returns:
+        tuple: (text, blocks or None, number of pages read)
+    """
+    global _page_pool
+    pool = _get_page_pool()
+    source = _source_bytes(source)
+    try:
+        futures = [pool.submit(_extract_page_range, source, start, end, preserve_layout, structured, max_chars)
+                   for start, end in _page_ranges(page_count, _page_pool_workers)]
+        results = [future.result() for future in futures]
+    except BrokenProcessPool:
+        # A worker died; drop the pool so the next call starts a fresh one
+        with _page_pool_lock:
+            _page_pool = None
+        raise
+    return _join_ranges(results, structured, max_chars)
+
+def _get_sandbox():
+    """The extraction sandbox configured from the app config"""
+    config = current_app.config
+    return get_extraction_sandbox(
+        size=config.get('PDF_SANDBOX_WORKERS', 2),
+        timeout=config.get('PDF_SANDBOX_TIMEOUT', 30),
+        max_rss_bytes=config.get('PDF_SANDBOX_MAX_RSS_BYTES'),
+        max_jobs_per_worker=config.get('PDF_SANDBOX_MAX_JOBS_PER_WORKER', 50)
+    )
+
+def _use_parallel(parallel, page_count):
+    """Resolve the parallel=None default from config for a given page count"""
+    if parallel is None:
+        return (current_app.config.get('PDF_PARALLEL_EXTRACTION', False) and
+                page_count >= current_app.config.get('PDF_PARALLEL_PAGE_THRESHOLD', 20))
+    return parallel
+
+def _extract_sandboxed(sandbox, source, preserve_layout, parallel, structured, max_chars, max_pages):
+    """
+    Run an extraction inside the isolated worker pool
+    
+    The document is never opened in the web worker. Large documents are
+    split into page ranges across sandbox workers, like the process pool
+    path; everything else runs as a single job.
+    
+    Returns:
+        tuple: (text, blocks or None, pages read, page count)
+    """
+    source = _source_bytes(source)
+    
+    if parallel is not False and current_app.config.get('PDF_PARALLEL_EXTRACTION', False):
+        page_count = sandbox.run(_count_pages, source)
+        if max_pages:
+            page_count = min(page_count, max_pages)
+        if page_count > 1 and _use_parallel(parallel, page_count):
+            results = sandbox.map(_extract_page_range,
+                                  [(source, start, end, preserve_layout, structured, max_chars)
+                                   for start, end in _page_ranges(page_count, sandbox.size)])
+            return _join_ranges(results, structured, max_chars) + (page_count,)
+    
+    return sandbox.run(_extract_page_range, source, 0, None, preserve_layout, structured, max_chars, max_pages)
+
+def _extract(source, preserve_layout=True, parallel=None, structured=False, max_chars=None, max_pages=None):
+    """
+    Shared implementation of extract_pdf_text and extract_pdf_layout
+    
+    With max_chars set, pages are loaded in order and extraction stops as
+    soon as the character budget is met, so the remaining pages are never
+    parsed. Parallel extraction applies the budget per page range and
+    keeps ranges up to the one that meets it. max_pages caps how many pages are read at all. When
+    PDF_SANDBOX_ENABLED is set the work runs in the isolated worker pool,
+    whose workers start on the first extraction.
+    
+    Returns:
+        tuple: (text, blocks, page_count); blocks is None unless structured
     """
     try:
         # Check if file exists
-        if not os.path.exists(filepath):
-            current_app.logger.error(f"PDF file not found: {filepath}")
-            return ""
+        if isinstance(source, (str, os.PathLike)) and not os.path.exists(source):
+            current_app.logger.error(f"PDF file not found: {source}")
+            return "", [] if structured else None, 0
             
-        current_app.logger.info(f"Opening PDF file: {filepath}")
-        
-        # Open the PDF
-        doc = fitz.open(filepath)
+        current_app.logger.info(f"Opening PDF file: {_describe_source(source)}")
         
-        # Extract text from each page
-        text = ""
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
+        sandbox = _get_sandbox() if current_app.config.get('PDF_SANDBOX_ENABLED', False) else None
+        if sandbox is not None:
+            text, blocks, pages_read, page_count = _extract_sandboxed(
+                sandbox, source, preserve_layout, parallel, structured, max_chars, max_pages)
+        else:
+            # Open the PDF
+            doc = _open_document(source)
             
-            if preserve_layout:
-                # Extract text with layout preservation (better for CVs and structured documents)
-                page_text = page.get_text("dict")
-                blocks = page_text.get("blocks", [])
-                
-                # Process each block of text
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            if "spans" in line:
-                                for span in line["spans"]:
-                                    text += span.get("text", "") + " "
-                            text += "\n"  # Line break after each line
-                    text += "\n"  # Extra line break between blocks for better separation
-            else:
-                # Simple text extraction
-                page_text = page.get_text()
-                text += page_text
+            page_count = len(doc)
+            if max_pages:
+                page_count = min(page_count, max_pages)
+            
+            result = None
+            if page_count > 1 and _use_parallel(parallel, page_count):
+                try:
+                    result = _extract_pages_parallel(source, page_count, preserve_layout, structured, max_chars)
+                except Exception as e:
+                    current_app.logger.warning(f"Parallel extraction failed, falling back to serial: {e}")
+            
+            if result is None:
+                # Extract text from each page
+                result = _extract_pages(doc, 0, page_count, preserve_layout, structured, max_chars)
+            text, blocks, pages_read = result
+        
+        if pages_read < page_count:
+            current_app.logger.info(f"Character budget of {max_chars} met after {pages_read} of {page_count} pages")
             
         # Log text extraction metrics
-        current_app.logger.info(f"Extracted {len(text)} characters from {len(doc)} pages")
+        current_app.logger.info(f"Extracted {len(text)} characters from {pages_read} pages")
         
         # Basic validation - check if we actually got text
         if not text or len(text) < 10:
             current_app.logger.warning(f"Very little text extracted from PDF: {len(text)} chars")
             
-        return text
+        return text, blocks, pages_read
         
     except Exception as e:
         current_app.logger.error(f"Error extracting text from PDF: {e}")
-        return f"Error extracting text: {str(e)}"
+        return f"Error extracting text: {str(e)}", [] if structured else None, 0
     finally:
         # Close the document
         if 'doc' in locals():
             doc.close()
 
-def extract_cv_sections(cv_text):
-    """Attempts to identify and extract common sections from a CV.
+def extract_pdf_text(source, preserve_layout=True, parallel=None, max_chars=None, max_pages=None):
+    """
+    Extract text from a PDF file using PyMuPDF (fitz)
     
     Args:
-        cv_text (str): The full text of the CV
+        source: Path to the PDF file, or the raw PDF bytes / a binary stream
+            (e.g. the result of read_upload) so uploads never touch disk
+        preserve_layout: Whether to attempt to preserve document layout
+        parallel: Extract page ranges in a process pool. None (default)
+            decides from PDF_PARALLEL_EXTRACTION and PDF_PARALLEL_PAGE_THRESHOLD
+        max_chars: Stop loading pages once this many characters are extracted
+        max_pages: Read at most this many pages
         
     Returns:
-        dict: A dictionary with key section titles and their content
+        str: Extracted text from the PDF
+    """
+    return _extract(source, preserve_layout, parallel, max_chars=max_chars, max_pages=max_pages)[0]
+
+def extract_pdf_layout(source, parallel=None, max_chars=None, max_pages=None):
+    """
+    Extract a structured, layout-preserving view of a PDF
+    
+    Produces the same text as extract_pdf_text(preserve_layout=True) in the
+    same pass, plus every text block and line with its font metadata so
+    section headers can be found from typography instead of regexes.
+    
+    Args:
+        source: Path to the PDF file, or the raw PDF bytes / a binary stream
+        parallel, max_chars, max_pages: See extract_pdf_text
+        
+    Returns:
+        dict: {'text': str, 'page_count': int, 'body_size': float,
+               'blocks': [{'page', 'bbox', 'lines': [{'text', 'size', 'bold', 'bbox'}]}]}
+    """
+    text, blocks, page_count = _extract(source, True, parallel, structured=True,
+                                        max_chars=max_chars, max_pages=max_pages)
+    return {
+        'text': text,
+        'page_count': page_count,
+        'body_size': _body_font_size(blocks),
+        'blocks': blocks,
+    }
+
+def _body_font_size(blocks):
+    """The font size carrying the most characters, i.e. the body text size"""
+    weights = {}
+    for block in blocks:
+        for line in block['lines']:
+            weights[line['size']] = weights.get(line['size'], 0) + len(line['text'])
+    return max(weights, key=weights.get) if weights else 0.0
+
+def _classify_header(line_text):
+    """Return the CV section name a header line introduces, or None"""
+    # The patterns expect the separator that follows a header in the flat
+    # text (e.g. 'education\s+...'), so keep one trailing space
+    candidate = line_text.lower().strip(' :-–—•*#\t') + ' '
+    for section_name, pattern in CV_HEADER_LINE_RES.items():
+        if pattern.fullmatch(candidate):
+            return section_name
+    return None
+
+def find_section_headers(layout, size_ratio=1.15, max_words=6):
+    """
+    Find CV section headers in a structured layout using font metadata
+    
+    A line is a header candidate when it is short and either set larger
+    than the body text, bold, or all caps; candidates are then mapped to a
+    section name with the CV section patterns.
+    
+    Args:
+        layout (dict): Result of extract_pdf_layout
+        size_ratio (float): Minimum size relative to body text to count as larger
+        max_words (int): Longest line (in words) considered a header
+        
+    Returns:
+        list: (block index, line index, section name, header text) tuples in document order
     """
+    body_size = layout.get('body_size') or 0
+    headers = []
+    for block_index, block in enumerate(layout.get('blocks', [])):
+        for line_index, line in enumerate(block['lines']):
+            text = line['text']
+            if len(text.split()) > max_words:
+                continue
+            emphasised = (line['bold'] or text.isupper() or
+                          (body_size and line['size'] >= body_size * size_ratio))
+            if not emphasised:
+                continue
+            section_name = _classify_header(text)
+            if section_name:
+                headers.append((block_index, line_index, section_name, text))
+    return headers
+
+def extract_cv_sections_from_layout(layout):
+    """
+    Split a structured layout into CV sections using its header lines
+    
+    Args:
+        layout (dict): Result of extract_pdf_layout
+        
+    Returns:
+        dict: Same shape as extract_cv_sections ({section: {'header', 'content'}}),
+              empty if no typographic headers were found
+    """
+    header_at = {(block_index, line_index): (section_name, text)
+                 for block_index, line_index, section_name, text in find_section_headers(layout)}
+    if not header_at:
+        return {}
+    
     sections = {}
+    current = None
+    content = []
+    for block_index, block in enumerate(layout.get('blocks', [])):
+        for line_index, line in enumerate(block['lines']):
+            header = header_at.get((block_index, line_index))
+            if header:
+                if current:
+                    sections[current[0]] = {'header': current[1], 'content': "\n".join(content).strip()}
+                current, content = header, []
+            elif current:
+                content.append(line['text'])
+    if current:
+        sections[current[0]] = {'header': current[1], 'content': "\n".join(content).strip()}
+    return sections
+
+def extraction_budget():
+    """
+    Extraction budget for uploaded documents
     
-    # Common section titles in CVs - expanded with more variations
-    section_patterns = {
-        'summary': r'(?:professional\s+)?summary|profile|objective|about\s+me|personal\s+statement',
-        'experience': r'(?:work|professional|career)\s+experience|employment(?:\s+history)?|work\s+history',
-        'education': r'education(?:al)?\s+(?:background|history|qualifications)?',
-        'skills': r'(?:technical|key|core)?\s*skills|competencies|expertise|proficiencies',
-        'projects': r'projects|portfolio|key\s+achievements',
-        'certifications': r'certifications?|accreditations?|licenses|qualifications',
-        'languages': r'languages?|language\s+proficiency',
-        'references': r'references|testimonials',
-        'publications': r'publications|papers|research|articles',
-        'awards': r'awards|honors|achievements|recognition',
-        'volunteer': r'volunteer(?:ing)?|community\s+service',
-        'interests': r'interests|hobbies|activities',
-        'personal': r'personal\s+details|personal\s+information'
+    The extracted text feeds local scoring as well as the prompt, and the
+    prompt builder trims or packs it separately, so the budget only cuts
+    pathologically long documents short rather than matching the prompt
+    limits.
+        
+    Returns:
+        dict: {'max_chars', 'max_pages'} keyword arguments for
+              extract_pdf_document, both None when budgets are disabled
+    """
+    if not current_app.config.get('PDF_EXTRACTION_BUDGET_ENABLED', False):
+        return {'max_chars': None, 'max_pages': None}
+    return {
+        'max_chars': current_app.config.get('PDF_EXTRACTION_MAX_CHARS'),
+        'max_pages': current_app.config.get('PDF_EXTRACTION_MAX_PAGES')
     }
+
+def extract_pdf_document(source, preserve_layout=True, max_chars=None, max_pages=None):
+    """
+    Extract text and CV sections from a PDF, reusing cached results
+    
+    Results are stored in the content-addressed extraction cache keyed by
+    the hash of the raw PDF bytes, so a document that was uploaded before
+    (the same JD by many candidates, the same CV re-uploaded) skips
+    PyMuPDF entirely.
+    
+    Args:
+        source: Path to the PDF file, or the raw PDF bytes / a binary stream
+        preserve_layout: Whether to attempt to preserve document layout
+        max_chars, max_pages: Optional extraction budget (see extraction_budget)
+        
+    Returns:
+        dict: {'text': str, 'sections': dict, 'cached': bool}
+    """
+    cache = None
+    if current_app.config.get('EXTRACTION_CACHE_ENABLED', False):
+        try:
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, 'rb') as f:
+                    source = f.read()
+            elif hasattr(source, 'read'):
+                source.seek(0)
+                source = source.read()
+            cache = get_extraction_cache(
+                current_app.config['EXTRACTION_CACHE_PATH'],
+                current_app.config.get('EXTRACTION_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+            )
+            cache_key = make_cache_key(source, preserve_layout, EXTRACTOR_VERSION,
+                                       budget=(max_chars, max_pages))
+            cached = cache.get(cache_key)
+            if cached is not None:
+                current_app.logger.info("Returning cached PDF extraction result")
+                cached['cached'] = True
+                return cached
+        except Exception as e:
+            current_app.logger.warning(f"Extraction cache unavailable: {e}")
+            cache = None
     
-    # Convert the text to lowercase for case-insensitive matching but preserve original
-    lower_text = cv_text.lower()
+    if preserve_layout:
+        # Headers come straight from the font metadata; fall back to the
+        # regex scan for documents without typographic headers
+        layout = extract_pdf_layout(source, max_chars=max_chars, max_pages=max_pages)
+        text = layout['text']
+        sections = extract_cv_sections_from_layout(layout)
+    else:
+        text = extract_pdf_text(source, preserve_layout=False, max_chars=max_chars, max_pages=max_pages)
+        sections = {}
+    if text and not sections:
+        sections = extract_cv_sections(text)
+    
+    # Only cache successful extractions
+    if cache and text and not text.startswith("Error extracting text"):
+        try:
+            cache.set(cache_key, text, sections)
+        except Exception as e:
+            current_app.logger.warning(f"Could not store extraction result in cache: {e}")
+    
+    return {'text': text, 'sections': sections, 'cached': False}
+
+class DocumentProfile:
+    """
+    Parsed view of one document's text, shared by the analysis helpers
+    
+    The text is lowercased and tokenized once, and sections, metrics,
+    requirements and document type are each computed on first use and then
+    kept, so the several helpers that look at the same CV or job
+    description during one analysis do not re-parse it. Profiles are
+    obtained through get_document_profile, which memoizes them per text
+    hash. Values are shared between callers and must be treated as
+    read-only.
+    
+    Args:
+        text (str): Document text
+        digest (str): SHA-256 hex digest of the text, if already known
+    """
+    
+    def __init__(self, text, digest=None):
+        self.text = text
+        self.digest = digest or _text_digest(text)
+        self._values = {}
+    
+    def memoize(self, name, factory):
+        """
+        Return a value derived from this document, computing it once
+        
+        Args:
+            name: Key the value is stored under
+            factory: Callable taking the profile and returning the value
+        """
+        try:
+            return self._values[name]
+        except KeyError:
+            # Two threads may race to compute the same value; both results
+            # are equal, so the duplicate work is harmless
+            value = self._values[name] = factory(self)
+            return value
     
-    # Find the positions of each section header with improved regex
+    @property
+    def lower_text(self):
+        return self.memoize('lower_text', lambda profile: profile.text.lower())
+    
+    @property
+    def tokens(self):
+        """(token, start, end) word tokens, see keyword_matcher.tokenize"""
+        return self.memoize('tokens', lambda profile: tokenize(profile.text))
+    
+    @property
+    def cv_section_spans(self):
+        return self.memoize('cv_section_spans', _find_cv_section_spans)
+    
+    @property
+    def cv_sections(self):
+        return self.memoize('cv_sections', _parse_cv_sections)
+    
+    @property
+    def cv_metrics(self):
+        return self.memoize('cv_metrics', _parse_cv_metrics)
+    
+    @property
+    def jd_requirements(self):
+        return self.memoize('jd_requirements', _parse_jd_requirements)
+    
+    @property
+    def document_type(self):
+        return self.memoize('document_type', _detect_document_type)
+
+def _text_digest(text):
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+def get_document_profile(text):
+    """
+    Return the memoized DocumentProfile for a text
+    
+    Profiles live in a bounded per-process LRU cache keyed by the SHA-256
+    of the text (DOCUMENT_PROFILE_CACHE_SIZE entries).
+    
+    Args:
+        text: Document text, or a DocumentProfile which is returned as is
+        
+    Returns:
+        DocumentProfile: Profile for the text
+    """
+    if isinstance(text, DocumentProfile):
+        return text
+    text = text or ""
+    max_size = current_app.config.get('DOCUMENT_PROFILE_CACHE_SIZE', 256) if has_app_context() else 256
+    if not max_size:
+        return DocumentProfile(text)
+    
+    digest = _text_digest(text)
+    with _profiles_lock:
+        profile = _profiles.get(digest)
+        if profile is not None:
+            _profiles.move_to_end(digest)
+            return profile
+        profile = _profiles[digest] = DocumentProfile(text, digest)
+        while len(_profiles) > max_size:
+            _profiles.popitem(last=False)
+    return profile
+
+def extract_cv_sections(cv_text):
+    """Attempts to identify and extract common sections from a CV.
+    
+    Args:
+        cv_text (str or DocumentProfile): The full text of the CV
+        
+    Returns:
+        dict: A dictionary with key section titles and their content
+    """
+    return get_document_profile(cv_text).cv_sections
+
+def find_cv_section_spans(cv_text):
+    """Locate every CV section header, including repeated ones.
+    
+    Args:
+        cv_text (str or DocumentProfile): The full text of the CV
+        
+    Returns:
+        list: (section name, header start, content start, section end)
+              tuples in document order; each section runs to the next header
+    """
+    return get_document_profile(cv_text).cv_section_spans
+
+def _find_cv_section_spans(profile):
+    # Find the positions of all section headers in a single scan
     section_positions = {}
-    for section_name, pattern in section_patterns.items():
-        # Look for section headers with common formatting patterns
-        # This handles headers that might be followed by colon, all caps, underlined with dashes, etc.
-        matches = re.finditer(r'(?:^|\n)(?:[^a-z\n]*)?(?:\s*)(' + pattern + r')(?:\s*:|\s*\n|$)', lower_text, re.IGNORECASE)
-        for match in matches:
-            section_positions[match.start()] = (section_name, match)
+    for section_name, match in CV_SECTION_DETECTOR.finditer(profile.lower_text):
+        section_positions[match.start()] = (section_name, match)
     
     # Sort the positions to maintain the order in the document
     positions = sorted(section_positions.keys())
     
-    # Extract each section's content
+    spans = []
     for i, pos in enumerate(positions):
         section_name, match = section_positions[pos]
-        
+        # Each section ends at the start of the next one (or end of text)
+        end = positions[i + 1] if i < len(positions) - 1 else len(profile.text)
+        spans.append((section_name, match.start(), match.end(), end))
+    return spans
+
+def _parse_cv_sections(profile):
+    sections = {}
+    cv_text = profile.text
+    
+    # Extract each section's content; a repeated section keeps its last occurrence
+    for section_name, header_start, start, end in profile.cv_section_spans:
         # Get the actual header from the original text to preserve case
-        header_start = match.start()
-        header_end = match.end()
-        actual_header = cv_text[header_start:header_end].strip()
-        
-        # Find the actual content start (after the header)
-        start = match.end()
-        
-        # Determine the end position (either the start of the next section or end of text)
-        if i < len(positions) - 1:
-            end = positions[i + 1]
-        else:
-            end = len(lower_text)
+        actual_header = cv_text[header_start:start].strip()
         
         # Extract the section text from the original text (preserving case)
         section_text = cv_text[start:end].strip()
@@ -145,33 +820,25 @@ def extract_cv_metrics(cv_text):
     """Extract basic metrics from a CV.
     
     Args:
-        cv_text (str): The full text of the CV
+        cv_text (str or DocumentProfile): The full text of the CV
         
     Returns:
         dict: A dictionary with various metrics
     """
+    return get_document_profile(cv_text).cv_metrics
+
+def _parse_cv_metrics(profile):
+    cv_text = profile.text
     metrics = {
         'word_count': len(cv_text.split()),
         'character_count': len(cv_text),
-        'sentence_count': len(re.findall(r'[.!?]+', cv_text)),
+        'sentence_count': len(SENTENCE_END_RE.findall(cv_text)),
         'section_count': 0,
     }
     
     # Count potential sections based on common section patterns
-    section_patterns = [
-        r'summary|profile|objective',
-        r'experience|employment',
-        r'education',
-        r'skills|competencies',
-        r'projects|portfolio',
-        r'certifications',
-        r'languages',
-        r'references'
-    ]
-    
-    for pattern in section_patterns:
-        if re.search(r'\b' + pattern + r'\b', cv_text.lower()):
-            metrics['section_count'] += 1
+    lower_text = profile.lower_text
+    metrics['section_count'] = sum(1 for pattern in CV_METRIC_SECTION_RES if pattern.search(lower_text))
     
     return metrics
 
@@ -179,11 +846,15 @@ def extract_jd_requirements(jd_text):
     """Extract potential requirements from a job description.
     
     Args:
-        jd_text (str): The full text of the job description
+        jd_text (str or DocumentProfile): The full text of the job description
         
     Returns:
         dict: A dictionary with categorized requirements
     """
+    return get_document_profile(jd_text).jd_requirements
+
+def _parse_jd_requirements(profile):
+    jd_text = profile.text
     requirements = {
         'required_skills': [],
         'preferred_skills': [],
@@ -193,23 +864,12 @@ def extract_jd_requirements(jd_text):
         'other': []
     }
     
-    # Common section indicators in job descriptions
-    section_indicators = {
-        'required_skills': r'required(?:\s+skills)?|requirements|qualifications|you\s+(?:should|must)\s+have',
-        'preferred_skills': r'preferred(?:\s+skills)?|nice\s+to\s+have|desirable|plus|bonus',
-        'experience': r'experience|background|history',
-        'education': r'education|degree|academic|qualification',
-        'responsibilities': r'responsibilities|duties|you\s+will|role|job\s+description|position\s+description|what\s+you\'ll\s+do'
-    }
-    
     # Find sections in text
-    lower_text = jd_text.lower()
+    lower_text = profile.lower_text
     found_sections = {}
     
-    for category, pattern in section_indicators.items():
-        matches = re.finditer(r'(?:^|\n)\s*(' + pattern + r')(?:\s*:|\s*\n)', lower_text)
-        for match in matches:
-            found_sections[match.start()] = (category, match)
+    for category, match in JD_SECTION_DETECTOR.finditer(lower_text):
+        found_sections[match.start()] = (category, match)
     
     # Sort sections by position
     positions = sorted(found_sections.keys())
@@ -227,13 +887,13 @@ def extract_jd_requirements(jd_text):
         section_text = jd_text[start:end].strip()
         
         # Look for bullet points or numbered items
-        items = re.findall(r'(?:^|\n)(?:\s*[\•\-\*\★\✓\➢\+\d+\.]+\s*)([^\n]+)', section_text)
+        items = BULLET_ITEM_RE.findall(section_text)
         
         if items:
             requirements[category].extend([item.strip() for item in items if len(item.strip()) > 5])
         else:
             # If no bullet points, split by sentences and find relevant ones
-            sentences = re.split(r'(?<=[.!?])\s+', section_text)
+            sentences = SENTENCE_SPLIT_RE.split(section_text)
             for sentence in sentences:
                 sentence = sentence.strip()
                 if len(sentence) > 10 and not sentence.endswith(':'):
@@ -241,7 +901,7 @@ def extract_jd_requirements(jd_text):
     
     # If we couldn't find structured sections, try a more general approach
     if all(len(items) == 0 for items in requirements.values()):
-        general_items = re.findall(r'(?:^|\n)(?:\s*[\•\-\*\★\✓\➢\+\d+\.]+\s*)([^\n]+)', jd_text)
+        general_items = BULLET_ITEM_RE.findall(jd_text)
         
         for item in general_items:
             item = item.strip()
@@ -273,44 +933,24 @@ def detect_document_type(text):
     Attempts to detect if a document is a CV/resume or a job description
     
     Args:
-        text: Text content of the document
+        text: Text content of the document (str or DocumentProfile)
         
     Returns:
         str: 'cv', 'job_description', or 'unknown'
     """
-    text_lower = text.lower()
-    
-    # CV/Resume indicators
-    cv_indicators = [
-        r'\b(?:curriculum\s+vitae|resume|cv)\b',
-        r'\b(?:work\s+experience|employment\s+history|professional\s+experience)\b',
-        r'\b(?:education|qualifications|academic\s+background)\b',
-        r'\b(?:skills|competencies|expertise)\b',
-        r'\b(?:references|referees)\b',
-        r'\b(?:personal\s+details|personal\s+information)\b',
-        r'\bemail\b.{0,20}@',  # Looks for email addresses
-        r'\b(?:phone|tel|mobile)\b.{0,20}\d{3,}',  # Looks for phone numbers
-    ]
-    
-    # Job description indicators
-    jd_indicators = [
-        r'\b(?:job\s+description|position\s+description|role\s+description)\b',
-        r'\b(?:we\s+are\s+looking\s+for|we\s+seek|seeking\s+a)\b',
-        r'\b(?:responsibilities|duties|you\s+will\s+be\s+responsible)\b',
-        r'\b(?:qualifications|requirements|the\s+ideal\s+candidate)\b',
-        r'\b(?:we\s+offer|benefits|package|salary)\b',
-        r'\b(?:apply|application|to\s+apply|send\s+your)\b',
-        r'\b(?:company|organization|firm)\s+(?:is|are|description|overview)\b',
-        r'\b(?:position|opportunity|opening|vacancy)\b',
-    ]
-    
-    # Count matches for each type
-    cv_score = sum(1 for pattern in cv_indicators if re.search(pattern, text_lower))
-    jd_score = sum(1 for pattern in jd_indicators if re.search(pattern, text_lower))
+    return get_document_profile(text).document_type
+
+def _detect_document_type(profile):
+    text_lower = profile.lower_text
+    
+    # Count indicator matches for each type in a single scan
+    found = DOCUMENT_TYPE_INDICATORS.found(text_lower)
+    cv_score = sum(1 for key in found if key.startswith('cv_'))
+    jd_score = len(found) - cv_score
     
     # Normalize scores (percentage of indicators matched)
-    cv_score_norm = cv_score / len(cv_indicators)
-    jd_score_norm = jd_score / len(jd_indicators)
+    cv_score_norm = cv_score / len(CV_INDICATORS)
+    jd_score_norm = jd_score / len(JD_INDICATORS)
     
     # Decision logic based on scores
     if cv_score_norm > 0.3 and cv_score_norm > jd_score_norm:
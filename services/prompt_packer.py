@@ -0,0 +1,238 @@
+"""
+Token-budgeted CV / job description payloads for the LLM prompts.
+
+Instead of cutting documents at a fixed character offset, the packer
+splits them into blocks (CV sections, JD requirement categories), ranks
+the blocks by relevance and keeps the best ones that fit a per-model token
+budget, emitting them in document order. Token counts are estimated
+locally so no tokenizer or API round trip is needed.
+"""
+import re
+from flask import current_app
+from services.pdf_service import get_document_profile, find_cv_section_spans, extract_jd_requirements
+
+TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+MULTISPACE_RE = re.compile(r"[ \t\u00a0]+")
+BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+# How much each CV section is worth before JD keywords are considered
+CV_SECTION_PRIORITY = {
+    'preamble': 3,
+    'skills': 3,
+    'experience': 3,
+    'summary': 2,
+    'education': 2,
+    'certifications': 2,
+    'projects': 2,
+    'languages': 1,
+    'publications': 1,
+    'awards': 1,
+    'volunteer': 0.5,
+    'personal': 0.5,
+    'interests': 0.5,
+    'references': 0.2,
+}
+
+JD_CATEGORY_PRIORITY = {
+    'overview': 3,
+    'required_skills': 3,
+    'experience': 2.5,
+    'education': 2,
+    'preferred_skills': 1.5,
+    'responsibilities': 1.5,
+    'other': 0.5,
+}
+
+JD_CATEGORY_LABELS = {
+    'required_skills': 'Required skills',
+    'preferred_skills': 'Preferred skills',
+    'experience': 'Experience',
+    'education': 'Education',
+    'responsibilities': 'Responsibilities',
+    'other': 'Other',
+}
+
+# A block is only cut to fit when at least this many tokens remain
+MIN_PARTIAL_TOKENS = 40
+# Lines of the JD kept as its title / overview
+JD_OVERVIEW_LINES = 3
+
+def estimate_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text
+
+    BPE tokenizers spend about one token per common word, more for long
+    or rare words, and one per punctuation mark. Each word is counted as
+    one token per six characters (at least one), which slightly
+    overestimates English text and so keeps packed prompts within budget.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return sum((len(piece) + 5) // 6 for piece in TOKEN_PIECE_RE.findall(text))
+
+def clean_text(text):
+    """Collapse runs of spaces and blank lines left by the layout extractor"""
+    lines = (MULTISPACE_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip()
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cut text to at most max_tokens estimated tokens, at a line or word boundary
+
+    Returns:
+        tuple: (text, tokens used)
+    """
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line)
+        if used + cost <= max_tokens:
+            kept.append(line)
+            used += cost
+            continue
+        words = []
+        for word in line.split(" "):
+            cost = estimate_tokens(word)
+            if used + cost > max_tokens:
+                break
+            words.append(word)
+            used += cost
+        if words:
+            kept.append(" ".join(words))
+        break
+    return "\n".join(kept).rstrip(), used
+
+def prompt_token_budget(model=None):
+    """
+    Input token budget for the CV/JD payload of a prompt
+
+    Args:
+        model: Model name (defaults to DEFAULT_MODEL)
+
+    Returns:
+        int: Token budget from PROMPT_TOKEN_BUDGETS, falling back to its 'default' entry
+    """
+    budgets = current_app.config.get('PROMPT_TOKEN_BUDGETS') or {}
+    model = model or current_app.config.get('DEFAULT_MODEL')
+    return budgets.get(model, budgets.get('default', 2000))
+
+def _relevance(text, priority, matcher):
+    """Section priority scaled by how many distinct JD keywords the block contains"""
+    hits = len(matcher.match(text)) if matcher else 0
+    return priority * (1 + hits)
+
+def _pack_blocks(blocks, budget):
+    """
+    Keep the most relevant blocks that fit the budget
+
+    Args:
+        blocks (list): (name, text, relevance) in document order
+        budget (int): Token budget
+
+    Returns:
+        tuple: (packed text, tokens used, kept names, dropped names, truncated flag)
+    """
+    ranked = sorted(range(len(blocks)), key=lambda index: -blocks[index][2])
+    chosen = {}
+    remaining = budget
+    truncated = False
+    for index in ranked:
+        name, text, _ = blocks[index]
+        cost = estimate_tokens(text)
+        if cost <= remaining:
+            chosen[index] = text
+            remaining -= cost
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            chosen[index], used = truncate_to_tokens(text, remaining)
+            remaining -= used
+            truncated = True
+    kept = [blocks[index][0] for index in sorted(chosen)]
+    dropped = [name for index, (name, _, _) in enumerate(blocks) if index not in chosen]
+    packed = "\n\n".join(chosen[index] for index in sorted(chosen))
+    return packed, budget - remaining, kept, dropped, truncated or bool(dropped)
+
+def _cv_blocks(profile, matcher):
+    """Split a CV into its preamble (name, contact) and every detected section"""
+    text = profile.text
+    spans = find_cv_section_spans(profile)
+    blocks = []
+    preamble = clean_text(text[:spans[0][1]] if spans else text)
+    if preamble:
+        blocks.append(('preamble', preamble, _relevance(preamble, CV_SECTION_PRIORITY['preamble'], matcher)))
+    for name, start, _, end in spans:
+        block = clean_text(text[start:end])
+        if block:
+            blocks.append((name, block, _relevance(block, CV_SECTION_PRIORITY.get(name, 1), matcher)))
+    return blocks
+
+def _jd_blocks(profile):
+    """Split a JD into its opening lines and its requirement categories"""
+    requirements = extract_jd_requirements(profile)
+    if not any(requirements.values()):
+        return [('overview', clean_text(profile.text), JD_CATEGORY_PRIORITY['overview'])]
+
+    lines = [line for line in clean_text(profile.text).split("\n") if line.strip()]
+    blocks = [('overview', "\n".join(lines[:JD_OVERVIEW_LINES]), JD_CATEGORY_PRIORITY['overview'])]
+    for category, items in requirements.items():
+        if items:
+            block = f"{JD_CATEGORY_LABELS[category]}:\n" + "\n".join(f"- {clean_text(item)}" for item in items)
+            blocks.append((category, block, JD_CATEGORY_PRIORITY[category]))
+    return blocks
+
+def pack_text(text, budget):
+    """
+    Fit a single document into a token budget, most relevant sections first
+
+    Args:
+        text: Document text (str or DocumentProfile)
+        budget (int): Token budget
+
+    Returns:
+        dict: {'text', 'tokens', 'kept', 'dropped', 'truncated'}
+    """
+    packed, tokens, kept, dropped, truncated = _pack_blocks(_cv_blocks(get_document_profile(text), None), budget)
+    return {'text': packed, 'tokens': tokens, 'kept': kept, 'dropped': dropped, 'truncated': truncated}
+
+def pack_cv_and_jd(cv_text, jd_text, budget, matcher=None):
+    """
+    Fit a CV and a job description into one token budget
+
+    The JD gets up to PROMPT_JD_TOKEN_SHARE of the budget and the CV the
+    rest; budget one document leaves unused goes to the other. CV sections
+    are ranked by section type and by how many JD keywords they contain.
+
+    Args:
+        cv_text: CV text (str or DocumentProfile)
+        jd_text: Job description text (str or DocumentProfile)
+        budget (int): Token budget for both documents together
+        matcher: KeywordMatcher over the JD keywords, used to rank CV sections
+
+    Returns:
+        dict: {'cv_text', 'jd_text', 'cv_tokens', 'jd_tokens', 'tokens',
+               'budget', 'cv_dropped', 'jd_dropped', 'truncated'}
+    """
+    jd_blocks = _jd_blocks(get_document_profile(jd_text))
+    cv_blocks = _cv_blocks(get_document_profile(cv_text), matcher)
+
+    jd_budget = int(budget * current_app.config.get('PROMPT_JD_TOKEN_SHARE', 0.4))
+    jd = _pack_blocks(jd_blocks, jd_budget)
+    cv = _pack_blocks(cv_blocks, budget - jd[1])
+    if jd[4] and cv[1] < budget - jd[1]:
+        # The CV came in under its share; give the JD the rest
+        jd = _pack_blocks(jd_blocks, budget - cv[1])
+
+    return {
+        'cv_text': cv[0],
+        'jd_text': jd[0],
+        'cv_tokens': cv[1],
+        'jd_tokens': jd[1],
+        'tokens': cv[1] + jd[1],
+        'budget': budget,
+        'cv_dropped': cv[3],
+        'jd_dropped': jd[3],
+        'truncated': cv[4] or jd[4],
+    }
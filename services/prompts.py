@@ -0,0 +1,115 @@
+"""
+Prompt assembly for the OpenRouter analysis calls.
+
+The fixed analysis instructions for each language are built once at import
+into a system message whose text never changes between calls, so providers
+that cache prompt prefixes can skip re-processing it; only the user
+message with the CV and job description varies. Prefix cache usage is
+counted from the token usage the provider reports.
+"""
+import threading
+from collections import namedtuple
+from config import (PROMPT_VERSION, PROMPT_INSTRUCTIONS_EN, PROMPT_INSTRUCTIONS_FR,
+                    PROMPT_INPUTS_TEMPLATE_EN, PROMPT_INPUTS_TEMPLATE_FR)
+from services.prompt_packer import estimate_tokens
+
+PromptPrefix = namedtuple('PromptPrefix', ['lang', 'version', 'text', 'tokens'])
+
+PROMPT_PREFIXES = {
+    lang: PromptPrefix(lang, PROMPT_VERSION, text.strip(), estimate_tokens(text))
+    for lang, text in (('en', PROMPT_INSTRUCTIONS_EN), ('fr', PROMPT_INSTRUCTIONS_FR))
+}
+
+INPUTS_TEMPLATES = {
+    'en': PROMPT_INPUTS_TEMPLATE_EN,
+    'fr': PROMPT_INPUTS_TEMPLATE_FR,
+}
+
+_stats = {'requests': 0, 'prefix_tokens': 0, 'cached_prefix_tokens': 0, 'uncached_prefix_tokens': 0}
+_stats_lock = threading.Lock()
+
+def get_prompt_prefix(lang="en"):
+    """Precomputed instructions prefix for a language (English when unknown)"""
+    return PROMPT_PREFIXES.get(lang, PROMPT_PREFIXES['en'])
+
+def system_message(prefix, cache_hint=False):
+    """
+    Build the system message carrying a prompt prefix
+
+    Args:
+        prefix (PromptPrefix): Instructions to send
+        cache_hint (bool): Mark the prefix with an ephemeral cache_control
+                           breakpoint for providers that need one
+
+    Returns:
+        dict: Chat message
+    """
+    if cache_hint:
+        return {"role": "system",
+                "content": [{"type": "text", "text": prefix.text, "cache_control": {"type": "ephemeral"}}]}
+    return {"role": "system", "content": prefix.text}
+
+def build_analysis_messages(cv_text, jd_text, lang="en", extra_context="", cache_hint=False):
+    """
+    Chat messages for an analysis: the fixed instructions, then the inputs
+
+    Args:
+        cv_text (str): CV payload
+        jd_text (str): Job description payload
+        lang (str): Language for analysis (en/fr)
+        extra_context (str): Text appended to the inputs
+        cache_hint (bool): See system_message
+
+    Returns:
+        tuple: (messages list, PromptPrefix used)
+    """
+    prefix = get_prompt_prefix(lang)
+    template = INPUTS_TEMPLATES.get(prefix.lang)
+    user_content = template.format(cv_text=cv_text, jd_text=jd_text).strip()
+    if extra_context:
+        user_content += f"\n\n{extra_context}"
+    return [system_message(prefix, cache_hint), {"role": "user", "content": user_content}], prefix
+
+def message_text(message):
+    """Text of a chat message, whether its content is a string or a list of parts"""
+    content = message['content']
+    if isinstance(content, str):
+        return content
+    return "".join(part.get('text', '') for part in content)
+
+def record_prefix_usage(prefix, usage):
+    """
+    Count how much of a prefix the provider served from its prompt cache
+
+    Args:
+        prefix (PromptPrefix): Prefix that was sent
+        usage (dict): The response's 'usage' object; cached tokens are read
+                      from prompt_tokens_details.cached_tokens (OpenAI style)
+                      or cache_read_input_tokens (Anthropic style)
+
+    Returns:
+        int: Prefix tokens served from cache
+    """
+    usage = usage or {}
+    details = usage.get('prompt_tokens_details') or {}
+    cached = details.get('cached_tokens') or usage.get('cache_read_input_tokens') or 0
+    cached = min(cached, prefix.tokens)
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['prefix_tokens'] += prefix.tokens
+        _stats['cached_prefix_tokens'] += cached
+        _stats['uncached_prefix_tokens'] += prefix.tokens - cached
+    return cached
+
+def get_prefix_cache_stats():
+    """
+    Prefix cache counters for this process
+
+    Returns:
+        dict: {'requests', 'prefix_tokens', 'cached_prefix_tokens',
+               'uncached_prefix_tokens', 'hit_ratio'}
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['hit_ratio'] = round(stats['cached_prefix_tokens'] / stats['prefix_tokens'], 3) if stats['prefix_tokens'] else 0.0
+    return stats
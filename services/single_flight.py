@@ -0,0 +1,162 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When several callers ask for the same result at once, one of them (the
+leader) does the work and the others (followers) wait for its result.
+Within a process, followers wait on an event. Across processes, the
+leader holds a row in a small SQLite file shared by all workers; the
+leader's result is published in that row for a short time so followers in
+other processes can pick it up instead of repeating the work.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from services.sqlite_store import SQLiteStore, get_store
+
+class _Call:
+    """An in-process flight that local followers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.ok = False
+
+class FlightToken:
+    """Proof that the holder leads a flight and must publish or abandon it"""
+
+    def __init__(self, key, call=None, owner=None):
+        self.key = key
+        self.call = call
+        self.owner = owner
+
+class SingleFlight(SQLiteStore):
+    """
+    Coalesce identical work within and across worker processes
+
+    Args:
+        path (str): SQLite file shared by all workers
+        result_ttl (float): Seconds a published result stays readable by
+                            followers that were polling when it arrived
+        poll_interval (float): Seconds between checks of another process's flight
+    """
+
+    def __init__(self, path, result_ttl=10, poll_interval=0.25):
+        self.path = path
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flights (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _try_lead(self, key, owner, lease):
+        """
+        Claim the shared flight for a key
+
+        Returns:
+            tuple: ('leader', None), ('done', result) or ('busy', None)
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status, result, expires_at FROM flights WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[2] >= now:
+                return ('done', json.loads(row[1])) if row[0] == 'done' else ('busy', None)
+            conn.execute(
+                "INSERT OR REPLACE INTO flights (key, owner, status, result, expires_at) "
+                "VALUES (?, ?, 'running', NULL, ?)", (key, owner, now + lease)
+            )
+            # Drop long-expired flights while holding the write lock anyway
+            conn.execute("DELETE FROM flights WHERE expires_at < ?", (now - 3600,))
+        return 'leader', None
+
+    def join(self, key, timeout):
+        """
+        Lead the work for a key, or wait for the current leader's result
+
+        Args:
+            key (str): Identity of the work (e.g. a cache key)
+            timeout (float): Longest wait for another leader; also how long
+                             this caller's lead is honoured by other processes
+
+        Returns:
+            tuple: (FlightToken, None) when the caller should do the work and
+                   then publish or abandon the token, or (None, result)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.event.wait(timeout) and call.ok:
+                return None, call.result
+            # The leader gave up or is too slow; work uncoordinated
+            return FlightToken(key), None
+
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                state, result = self._try_lead(key, owner, timeout)
+                if state == 'leader':
+                    return FlightToken(key, call, owner), None
+                if state == 'done':
+                    self._finish_local(call, key, result, ok=True)
+                    return None, result
+                if time.monotonic() >= deadline:
+                    return FlightToken(key, call), None
+                time.sleep(self.poll_interval)
+        except sqlite3.Error:
+            # The shared store is unavailable; still coalesce in this process
+            return FlightToken(key, call), None
+
+    def _finish_local(self, call, key, result, ok):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.ok = ok
+        call.event.set()
+
+    def publish(self, token, result):
+        """Hand the work's result to every follower"""
+        if token.owner:
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE flights SET status = 'done', result = ?, expires_at = ? WHERE key = ? AND owner = ?",
+                        (json.dumps(result), time.time() + self.result_ttl, token.key, token.owner)
+                    )
+            except sqlite3.Error:
+                pass
+        if token.call:
+            self._finish_local(token.call, token.key, result, ok=True)
+
+    def abandon(self, token):
+        """Release a flight without a result; followers do the work themselves"""
+        if token.owner:
+            try:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM flights WHERE key = ? AND owner = ?", (token.key, token.owner))
+            except sqlite3.Error:
+                pass
+        if token.call:
+            self._finish_local(token.call, token.key, None, ok=False)
+
+def get_single_flight(path, result_ttl=10, poll_interval=0.25):
+    """Return the process-wide SingleFlight for a given file path"""
+    return get_store(SingleFlight, path, path, result_ttl, poll_interval)
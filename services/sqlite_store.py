@@ -0,0 +1,48 @@
+"""
+Shared plumbing of the SQLite files behind the local stores.
+
+The extraction and AI result caches, the job queue, request coalescing,
+the circuit breaker and the LLM call ledger each keep their state in a
+SQLite file shared by every worker process. Each opens a short-lived
+connection per operation in WAL mode, so readers never block the writer,
+and waits for another process's write lock rather than failing at once.
+A process keeps one instance of a store per file.
+"""
+import sqlite3
+import threading
+
+# Seconds a connection waits for another connection's write lock
+BUSY_TIMEOUT = 30
+
+class SQLiteStore:
+    """
+    Base of a store kept in one SQLite file
+
+    Subclasses set self.path, then create their tables in __init__.
+    """
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(cls, key, *args, **kwargs):
+    """
+    Return the process-wide instance of a store, creating it on first use
+
+    Args:
+        cls: SQLiteStore subclass
+        key: What tells the instances apart, usually the file path
+        *args, **kwargs: Constructor arguments, used on first use only
+
+    Returns:
+        SQLiteStore: The cls instance for key
+    """
+    with _stores_lock:
+        store = _stores.get((cls, key))
+        if store is None:
+            store = _stores[(cls, key)] = cls(*args, **kwargs)
+        return store
@@ -0,0 +1,87 @@
+"""
+Precompiled multi-pattern detectors used by the document parsers.
+
+Each detector compiles its patterns once at import into a single
+alternation, so a document is scanned in one pass however many section
+types or indicators are configured.
+"""
+import re
+
+class SectionDetector:
+    """
+    Find section headers of several types in one scan
+
+    Every section pattern becomes a named group of one combined regex. When
+    more than one section pattern matches at the same position, the one
+    listed last wins, as it did when each pattern was scanned separately.
+
+    Args:
+        patterns (dict): Section name -> regex for the header text
+        prefix (str): Regex that must precede the header
+        suffix (str): Regex that must follow the header
+        flags: re flags for the combined pattern
+    """
+
+    def __init__(self, patterns, prefix='', suffix='', flags=0):
+        self.names = list(patterns)
+        alternatives = "|".join(f"(?P<{name}>{patterns[name]})" for name in reversed(self.names))
+        self.regex = re.compile(f"{prefix}(?:{alternatives}){suffix}", flags)
+
+    def finditer(self, text):
+        """Yield (section name, match) for each header in document order"""
+        for match in self.regex.finditer(text):
+            yield match.lastgroup, match
+
+class IndicatorSet:
+    """
+    Report which of several indicator patterns occur anywhere in a text
+
+    A combined alternation of the indicators not yet seen locates the next
+    candidate position; every remaining indicator is tried there, so those
+    that share text (e.g. 'qualifications' counting for both CVs and job
+    descriptions) are all credited. The text is scanned front to back once.
+
+    Args:
+        patterns (dict): Indicator key -> regex
+        flags: re flags for the patterns
+    """
+
+    def __init__(self, patterns, flags=0):
+        self.flags = flags
+        self.sources = dict(patterns)
+        self.patterns = {key: re.compile(pattern, flags) for key, pattern in patterns.items()}
+        self._combined = {}
+
+    def _combined_for(self, keys):
+        """Combined alternation of the given indicators, compiled once per key set"""
+        regex = self._combined.get(keys)
+        if regex is None:
+            if len(self._combined) > 256:
+                self._combined.clear()
+            regex = self._combined[keys] = re.compile(
+                "|".join(f"(?:{self.sources[key]})" for key in keys), self.flags)
+        return regex
+
+    def found(self, text):
+        """
+        Args:
+            text (str): Text to scan
+
+        Returns:
+            set: Keys of the indicators that occur in the text
+        """
+        found = set()
+        remaining = tuple(self.patterns)
+        position = 0
+        while remaining:
+            # Only indicators not yet seen are searched for, so the scan
+            # skips over repeats of ones that were already credited
+            match = self._combined_for(remaining).search(text, position)
+            if match is None:
+                break
+            position = match.start()
+            hits = {key for key in remaining if self.patterns[key].match(text, position)}
+            found |= hits
+            remaining = tuple(key for key in remaining if key not in hits)
+            position += 1
+        return found
@@ -4,9 +4,25 @@ Utility functions for the application.
 import os
 import uuid
 import json
+import tempfile
 from datetime import datetime
+import nh3
+from markdown import markdown
 from config import Config
-from flask import current_app
+from flask import current_app, Request
+
+class SpooledRequest(Request):
+    """
+    Request class that buffers file uploads in a SpooledTemporaryFile
+    
+    Uploads up to UPLOAD_SPOOL_MAX_MEMORY bytes stay in memory; larger ones
+    roll over to an anonymous temporary file once. Combined with
+    pdf_service.read_upload this lets uploaded PDFs be handed straight to
+    PyMuPDF without saving them under UPLOAD_FOLDER.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_memory = current_app.config.get('UPLOAD_SPOOL_MAX_MEMORY', 2 * 1024 * 1024)
+        return tempfile.SpooledTemporaryFile(max_size=max_memory, mode='rb+')
 
 def allowed_file(filename):
     """
@@ -107,6 +123,30 @@ def get_all_reports():
     
     return reports
 
+# Markup the narrative markdown renders to; everything else is dropped
+NARRATIVE_TAGS = {'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'em', 'b', 'i', 'code', 'pre',
+                  'blockquote', 'ul', 'ol', 'li', 'a', 'table', 'thead', 'tbody', 'tr', 'th', 'td'}
+NARRATIVE_ATTRIBUTES = {'a': {'href', 'title'}}
+NARRATIVE_URL_SCHEMES = {'http', 'https', 'mailto'}
+
+def render_narrative(text):
+    """Render an AI narrative's markdown to HTML that is safe to put in a page
+    
+    The model's output can be steered by text in the uploaded documents, and
+    markdown passes raw HTML and javascript: links through, so the rendered
+    HTML is cleaned with an allow-list of tags, attributes and URL schemes.
+    
+    Args:
+        text (str): Narrative markdown
+        
+    Returns:
+        str: Sanitized HTML
+    """
+    if not text:
+        return ""
+    html = markdown(text, extensions=['tables', 'fenced_code'])
+    return nh3.clean(html, tags=NARRATIVE_TAGS, attributes=NARRATIVE_ATTRIBUTES, url_schemes=NARRATIVE_URL_SCHEMES)
+
 def extract_ats_score(analysis_text):
     """Extract the ATS compatibility score from the analysis text.
     